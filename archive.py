@@ -0,0 +1,204 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from message_segment import RECORD_HEADER
+from post_log import fsync_directory
+from search_index import tokenize
+
+# Subdirectory of the data directory holding the board archives
+ARCHIVE_DIR_NAME = 'archive'
+
+# Archive layout (integers big-endian, except the postings):
+#   header     magic, first message ID covered, number of index entries, number of words, directory offset
+#   index      one u64 entry per ID from the first on: the record's offset in the file, 0 for no message
+#   records    u32 id, u32 byte lengths of sender, date, subject and content, then those four UTF-8 fields
+#   postings   for each word, the IDs of the archived posts containing it: ascending little-endian u32s,
+#              4-byte aligned, so a word's postings are searched in place through the memory map
+#   words      the UTF-8 words back to back
+#   directory  one entry per word in byte order: u64 word offset, u32 word length, u64 postings offset,
+#              u32 number of postings
+ARCHIVE_MAGIC = b'BBARCH02'
+HEADER = struct.Struct('!8sIIIQ')
+INDEX_ENTRY = struct.Struct('!Q')
+WORD_ENTRY = struct.Struct('!QIQI')
+
+def archive_name(group_id=None):
+    """
+    Returns the file name of the public board's archive, or of the archive of the group with group_id.
+    """
+    return 'public.archive' if group_id is None else f'group-{group_id}.archive'
+
+def write_archive(path, messages):
+    """
+    Writes messages (dicts in ascending ID order) to an archive at path, replacing any existing one, along
+    with the postings of their words, so the server searches the archive without indexing it on startup.
+    The archive is written to a temporary file and renamed into place, so readers never see it half-written.
+    """
+    first_id = messages[0]['id'] if messages else 1
+    entries = messages[-1]['id'] - first_id + 1 if messages else 0
+    index = bytearray(entries * INDEX_ENTRY.size)
+    offset = HEADER.size + len(index)
+    records = []
+    word_ids = {}  # word -> IDs of the posts containing it, ascending since messages are
+    for message in messages:
+        fields = [message[key].encode('utf-8') for key in ('sender', 'date', 'subject', 'content')]
+        record = RECORD_HEADER.pack(message['id'], *map(len, fields)) + b"".join(fields)
+        INDEX_ENTRY.pack_into(index, (message['id'] - first_id) * INDEX_ENTRY.size, offset)
+        records.append(record)
+        offset += len(record)
+        for word in tokenize(message['subject']) | tokenize(message['content']):
+            word_ids.setdefault(word.encode('utf-8'), array('I')).append(message['id'])
+
+    postings_padding = -offset % 4
+    offset += postings_padding
+    postings = []
+    directory_entries = []
+    words = sorted(word_ids)
+    for word in words:
+        ids = word_ids[word]
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        postings.append(ids.tobytes())
+        directory_entries.append([offset, len(ids)])
+        offset += len(ids) * 4
+    word_offset = offset
+    directory = bytearray()
+    for word, (postings_offset, postings_count) in zip(words, directory_entries):
+        directory += WORD_ENTRY.pack(word_offset, len(word), postings_offset, postings_count)
+        word_offset += len(word)
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as archive_file:
+        archive_file.write(HEADER.pack(ARCHIVE_MAGIC, first_id, entries, len(words), word_offset))
+        archive_file.write(index)
+        archive_file.writelines(records)
+        archive_file.write(bytes(postings_padding))
+        archive_file.writelines(postings)
+        archive_file.writelines(words)
+        archive_file.write(directory)
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+    os.replace(temporary_path, path)
+    fsync_directory(path)
+
+class ArchiveReader:
+    """
+    Read-only access to a board archive through a memory map. A lookup reads one index entry and slices the
+    record out of the map, so no Python object exists for a message until it is requested and the pages of
+    old posts stay in the OS page cache rather than in the server's heap. Searches binary-search the word
+    directory and read a word's postings in place, so opening an archive costs the same whatever its size.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as archive_file:
+            # An empty file can't be mapped; an archive always has at least its header
+            self.view = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.first_id, self.entries, self.words, self.directory = HEADER.unpack_from(self.view, 0)
+        if magic != ARCHIVE_MAGIC:
+            self.view.close()
+            raise ValueError(f"{path} is not a bulletin board archive")
+        self.last_id = self.first_id + self.entries - 1  # Highest ID the archive covers (first_id - 1 if empty)
+
+    def _offset(self, message_id):
+        # Returns the record's offset in the file, or None if the archive has no message with this ID
+        if not self.first_id <= message_id <= self.last_id:
+            return None
+        offset, = INDEX_ENTRY.unpack_from(self.view, HEADER.size + (message_id - self.first_id) * INDEX_ENTRY.size)
+        return offset or None
+
+    def get(self, message_id):
+        """
+        Returns the archived message with the given ID as a dict, or None.
+        """
+        offset = self._offset(message_id)
+        if offset is None:
+            return None
+        _, sender_length, date_length, subject_length, content_length = RECORD_HEADER.unpack_from(self.view, offset)
+        date_start = offset + RECORD_HEADER.size + sender_length
+        subject_start = date_start + date_length
+        content_start = subject_start + subject_length
+        view = self.view
+        return {
+            'id': message_id,
+            'sender': str(view[offset + RECORD_HEADER.size:date_start], 'utf-8'),
+            'date': str(view[date_start:subject_start], 'utf-8'),
+            'subject': str(view[subject_start:content_start], 'utf-8'),
+            'content': str(view[content_start:content_start + content_length], 'utf-8')
+        }
+
+    def __contains__(self, message_id):
+        return self._offset(message_id) is not None
+
+    def postings(self, word):
+        """
+        Returns the IDs of the archived posts containing word (as tokenize() returns it), in ascending order,
+        as a sequence read from the memory map, or None if no archived post contains it.
+        """
+        key = word.encode('utf-8')
+        low, high = 0, self.words
+        while low < high:
+            middle = (low + high) // 2
+            word_offset, word_length, postings_offset, postings_count = WORD_ENTRY.unpack_from(
+                self.view, self.directory + middle * WORD_ENTRY.size)
+            found = self.view[word_offset:word_offset + word_length]
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            elif sys.byteorder == 'big':
+                ids = array('I', self.view[postings_offset:postings_offset + postings_count * 4])
+                ids.byteswap()
+                return ids
+            else:
+                return memoryview(self.view)[postings_offset:postings_offset + postings_count * 4].cast('I')
+        return None
+
+    def __iter__(self):
+        """
+        Yields every archived message as a dict in ID order.
+        """
+        for message_id in range(self.first_id, self.last_id + 1):
+            message = self.get(message_id)
+            if message:
+                yield message
+
+    def close(self):
+        self.view.close()
+
+def page_messages(messages, archive, from_id, count):
+    """
+    Pages through a board's posts like MessageStore.page, reading the IDs up to archive.last_id that the
+    in-memory store doesn't hold from the archive, so archived posts aren't skipped.
+    """
+    if archive is None or from_id > archive.last_id:
+        return messages.page(from_id, count)
+    page = []
+    message_id = max(from_id, 1)
+    while message_id <= archive.last_id and len(page) < count:
+        message = messages.get(message_id) or archive.get(message_id)
+        if message:
+            page.append(message)
+        message_id += 1
+    if len(page) < count:
+        # The archive is done; the rest of the page comes from memory
+        rest, next_id = messages.page(message_id, count - len(page))
+        return page + rest, next_id
+    return page, (message_id if message_id <= max(archive.last_id, messages.last_id) else 0)
+
+class ArchiveSet:
+    """
+    The directory of board archives. Boards open their own archive from it when they are created.
+    """
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+
+    def open(self, group_id=None):
+        """
+        Returns an ArchiveReader for the public board (or the group with group_id), or None if it has no archive.
+        """
+        path = os.path.join(self.archive_dir, archive_name(group_id))
+        if not os.path.exists(path):
+            return None
+        return ArchiveReader(path)
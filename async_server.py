@@ -0,0 +1,203 @@
+import asyncio
+import time
+from socket_protocol import RECV_BUFFER_SIZE, RESPONSE_CHANNEL, SIGNAL_CHANNEL, FrameDecoder, encode_frame
+from socket_protocol import encode_response, parse_client_command
+from signal_outbox import AsyncSignalOutbox
+import socket_server
+from socket_server import client_sessions, broadcast_message, drop_signal_session, execute_command
+from socket_server import SESSION_PAIR_TIMEOUT, outbox_settings, record_command, register_signal_session
+from socket_server import set_session_username
+from metrics import metrics
+from profiler import span_end, span_start
+
+# Command connections by the session token they sent with %session, until their signal connection claims them
+sessions_by_token = {}
+# Signal connections that arrived before their command connection's %session: token -> Future of that connection
+pending_signals = {}
+
+def pair_session(token, client_socket):
+    """
+    Hands a command connection that named its session token to the signal connection waiting on that token,
+    or keeps it for the signal connection that hasn't arrived yet. The two listeners accept independently,
+    so either can come first.
+    """
+    waiter = pending_signals.pop(token, None)
+    if waiter is not None and not waiter.done():
+        waiter.set_result(client_socket)
+    else:
+        sessions_by_token[token] = client_socket
+
+class StreamSocket:
+    """
+    Wraps an asyncio StreamWriter so the shared server code can treat it like a socket.
+    With a channel, responses are tagged with it for a multiplexed connection.
+    """
+    def __init__(self, writer, channel=None):
+        self.writer = writer
+        self.channel = channel
+
+    def sendall(self, data):
+        # The transport buffers the data, so writing never blocks the event loop
+        if self.channel:
+            self.writer.writelines((self.channel, data))
+        else:
+            self.writer.write(data)
+
+    def close(self):
+        self.writer.close()
+
+async def handle_client_async(reader, writer, public_board, private_boards, multiplex=False):
+    """
+    Serves one client's command connection on the event loop.
+    Runs the same command set as the threaded handle_client.
+    With multiplex, the client's signals are sent on this connection instead of a signal connection.
+    """
+    # Initialize client session data; without multiplex, the signal connection pairs with it through %session
+    if multiplex:
+        client_socket = StreamSocket(writer, RESPONSE_CHANNEL)
+        register_signal_session(client_socket, AsyncSignalOutbox(writer, **outbox_settings, channel=SIGNAL_CHANNEL))
+    else:
+        client_socket = StreamSocket(writer)
+    client_sessions[client_socket] = {'username': None}
+    metrics.connection_opened()
+    print(f"[*] Accepted connection from {writer.get_extra_info('peername')}")
+    decoder = FrameDecoder()
+    try:
+        while True:
+            data = await reader.read(RECV_BUFFER_SIZE)
+
+            # An empty read means the client closed the connection
+            if not data:
+                break
+
+            # Each complete frame holds exactly one command; pipelined commands are answered in order
+            exiting = False
+            for frame in decoder.feed(data):
+                started = time.perf_counter()
+                message = frame.decode('utf-8')
+
+                # If we receive an empty message, continue waiting for a valid message
+                if not message.strip():
+                    continue
+
+                span_started = span_start()
+                command, params = parse_client_command(message)
+                span_end('parse', span_started)
+
+                # Run the command against the boards and queue the response once its changes are durable;
+                # the wait suspends only this client while the log's commit thread fsyncs
+                post_log = socket_server.post_log
+                position = socket_server.log_position()
+                response = execute_command(client_socket, command, params, public_board, private_boards)
+                if command == '%session' and not multiplex and 'token' in client_sessions[client_socket]:
+                    pair_session(client_sessions[client_socket]['token'], client_socket)
+                if post_log and post_log.last_seq != position:
+                    if not await post_log.wait_committed_async(post_log.last_seq):
+                        response = "Error: The change could not be saved."
+                encoded = encode_response(response)
+                client_socket.sendall(encoded)
+                record_command(command, started, frame, encoded, response)
+
+                # Exit command terminates the client session
+                if command == '%exit':
+                    exiting = True
+                    break
+
+            await writer.drain()
+            if exiting:
+                break
+
+    except ValueError as ve:
+        print(f"ValueError encountered: {ve}")
+        response = "Error: Invalid parameters."
+        client_socket.sendall(encode_frame(response))
+    except (ConnectionError, OSError) as se:
+        print(f"Socket error: {se}")
+    except Exception as e:
+        print(f"Unexpected error handling client: {e}")
+    finally:
+        metrics.connection_closed()
+        # Notify others that the user has disconnected
+        username = client_sessions[client_socket].get('username')
+        if username:
+            broadcast_message(client_socket, 'LEAVE_SIGNAL', username=username)
+
+        # Clean up session data
+        token = client_sessions[client_socket].get('token')
+        if sessions_by_token.get(token) is client_socket:
+            del sessions_by_token[token]
+        set_session_username(client_socket, None)
+        del client_sessions[client_socket]
+        if multiplex:
+            drop_signal_session(client_socket)
+        client_socket.close()
+        print("Client disconnected.")
+
+async def handle_signal_client_async(reader, writer):
+    """
+    Pairs a signal connection with its command connection through the session token the client sends first
+    (SESSION <token>), then keeps it open for broadcasts. A signal connection accepted before its command
+    connection sent %session waits for it; clients that send no token can't be paired and get no signals.
+    """
+    client_socket = None
+    token = None
+    decoder = FrameDecoder()
+    try:
+        # The first frame names the session
+        frames = []
+        while not frames:
+            data = await reader.read(RECV_BUFFER_SIZE)
+            if not data:
+                return
+            frames = decoder.feed(data)
+        hello = frames[0].decode('utf-8').split()
+        if len(hello) != 2 or hello[0] != 'SESSION':
+            return
+        token = hello[1]
+
+        client_socket = sessions_by_token.pop(token, None)
+        if client_socket is None:
+            waiter = pending_signals[token] = asyncio.get_running_loop().create_future()
+            try:
+                client_socket = await asyncio.wait_for(waiter, SESSION_PAIR_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"No command connection named session {token}; closing its signal connection")
+                return
+        if client_socket not in client_sessions:
+            # The command connection closed while this one waited
+            client_socket = None
+            return
+
+        register_signal_session(client_socket, AsyncSignalOutbox(writer, **outbox_settings))
+        # Clients never send anything else on the signal connection; wait here until it closes
+        while await reader.read(RECV_BUFFER_SIZE):
+            pass
+    except (ConnectionError, OSError, ValueError) as e:
+        print(f"Error in signal connection: {e}")
+    finally:
+        # A wait that timed out or was cancelled leaves its future behind
+        waiter = pending_signals.get(token)
+        if waiter is not None and waiter.done():
+            del pending_signals[token]
+        if client_socket is not None:
+            drop_signal_session(client_socket)
+        writer.close()
+
+async def start_async_server(host, port, public_board, private_boards, multiplex=False):
+    """
+    Starts the command and signal listeners on one event loop and serves clients until cancelled.
+    With multiplex, only the command listener is started and each client's signals share its connection.
+    """
+    command_server = await asyncio.start_server(
+        lambda reader, writer: handle_client_async(reader, writer, public_board, private_boards, multiplex),
+        host, port)
+    if multiplex:
+        print(f"[*] Listening on {host}:{port} (asyncio, multiplexed)")
+        async with command_server:
+            await command_server.serve_forever()
+        return
+    signal_server = await asyncio.start_server(handle_signal_client_async, host, port + 1)
+    print(f"[*] Listening on {host}:{port} (asyncio)")
+
+    async with command_server, signal_server:
+        await asyncio.gather(command_server.serve_forever(), signal_server.serve_forever())
@@ -0,0 +1,94 @@
+"""
+Measures what archiving old posts buys and costs.
+
+Writes N posts (default 1,000,000) to an archive, then compares holding them in a MessageStore
+with opening the archive: bytes allocated (tracemalloc) and time to make the posts available,
+and p50/p99 latency of get_message_content for random IDs from each.
+
+Usage (from the repository root):
+    python benchmarks/bench_archive.py --posts 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from archive import ArchiveSet, write_archive
+from bulletin_board import BulletinBoard
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def make_messages(count):
+    messages = []
+    for index in range(count):
+        minute, second = divmod(index % 3600, 60)
+        messages.append({'id': index + 1, 'sender': f"user{index % 1000}", 'date': f"2024-12-02 16:{minute:02}:{second:02}",
+                         'subject': f"subject {index}", 'content': f"content of post number {index}"})
+    return messages
+
+def in_memory_board(messages, _):
+    board = BulletinBoard()
+    for message in messages:
+        board.restore_post(message)
+    return board
+
+def archived_board(_, archive_dir):
+    return BulletinBoard(archives=ArchiveSet(archive_dir))
+
+def measure(build, messages, archive_dir):
+    """
+    Returns the board, the bytes it still holds and the seconds it took to build.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    board = build(messages, archive_dir)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return board, allocated, seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and lookup latency: posts in memory vs. in an archive")
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=20000)
+    args = parser.parse_args()
+
+    archive_dir = tempfile.mkdtemp()
+    try:
+        messages = make_messages(args.posts)
+        start = time.perf_counter()
+        write_archive(os.path.join(archive_dir, 'public.archive'), messages)
+        print(f"{args.posts} posts archived in {time.perf_counter() - start:.1f}s "
+              f"({os.path.getsize(os.path.join(archive_dir, 'public.archive')) / 2 ** 20:.0f} MiB)")
+        rng = random.Random(42)
+        ids = [rng.randint(1, args.posts) for _ in range(args.lookups)]
+        print(f"{'posts':<10} {'heap MiB':>9} {'load s':>7} {'p50 us':>7} {'p99 us':>7}")
+        for name, build in (('in memory', in_memory_board), ('archived', archived_board)):
+            board, allocated, seconds = measure(build, messages, archive_dir)
+            samples = []
+            for message_id in ids:
+                start = time.perf_counter()
+                board.get_message_content(message_id)
+                samples.append((time.perf_counter() - start) * 1e6)
+            print(f"{name:<10} {allocated / 2 ** 20:>9.1f} {seconds:>7.2f} "
+                  f"{percentile(samples, 0.5):>7.1f} {percentile(samples, 0.99):>7.1f}")
+            if board.archive:
+                board.archive.close()
+            del board
+    finally:
+        shutil.rmtree(archive_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measures the cost of one broadcast to a large board.
+
+Registers N members (default 10,000) on a BulletinBoard with in-memory outboxes and times
+broadcast_message for a POST_SIGNAL. Allocations are counted with tracemalloc: with encode-once
+fan-out every recipient shares a single frame, so the bytes allocated per broadcast no longer
+grow with the payload size times the member count. The old per-recipient f-string and encode is
+timed alongside for comparison.
+
+Usage (from the repository root):
+    python benchmarks/bench_broadcast.py --members 10000 --rounds 50
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import socket_server
+from bulletin_board import BulletinBoard
+from socket_protocol import encode_frame
+
+class ListOutbox:
+    """
+    Outbox stand-in that keeps queued frames in memory instead of writing to a socket.
+    """
+    __slots__ = ('frames',)
+
+    def __init__(self):
+        self.frames = []
+
+    def put(self, payload, coalesce_key=None):
+        self.frames.append(payload)
+        return True
+
+    def __len__(self):
+        return len(self.frames)
+
+def per_recipient_broadcast(recipients, signal_code, post_summary):
+    """
+    The fan-out used before encode-once: build and encode the message again for every recipient.
+    """
+    for outbox in recipients:
+        message = f"{signal_code} {post_summary}"
+        outbox.put(encode_frame(message))
+
+def measure(broadcast, outboxes, rounds):
+    """
+    Returns (microseconds per broadcast, allocated blocks per broadcast, allocated KB per broadcast).
+    """
+    elapsed = 0.0
+    blocks = 0
+    allocated = 0
+    for _ in range(rounds):
+        for outbox in outboxes:
+            outbox.frames.clear()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        broadcast()
+        elapsed += time.perf_counter() - start
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        for stat in after.compare_to(before, 'filename'):
+            if stat.size_diff > 0:
+                blocks += stat.count_diff
+                allocated += stat.size_diff
+    # tracemalloc slows every allocation down, so time a separate untraced run as well
+    start = time.perf_counter()
+    for _ in range(rounds):
+        broadcast()
+    untraced = (time.perf_counter() - start) / rounds * 1e6
+    return untraced, blocks / rounds, allocated / rounds / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="Broadcast fan-out cost for one large board")
+    parser.add_argument('--members', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--summary-size', type=int, default=200, help="Length of the post summary in bytes")
+    args = parser.parse_args()
+
+    board = BulletinBoard()
+    outboxes = []
+    for index in range(args.members):
+        client_socket = object()
+        outbox = ListOutbox()
+        socket_server.client_sessions[client_socket] = {'username': None}
+        socket_server.register_signal_session(client_socket, outbox)
+        socket_server.set_session_username(client_socket, f"user{index}")
+        board.add_user(f"user{index}")
+        outboxes.append(outbox)
+
+    post_summary = "x" * args.summary_size
+    recipients = socket_server.subscribers.outboxes_for(board.users)
+
+    print(f"{args.members} members, {args.summary_size} byte summary")
+    print(f"{'fan-out':<14} {'us/broadcast':>13} {'blocks':>9} {'KB':>9}")
+    results = [
+        ('encode once', measure(
+            lambda: socket_server.broadcast_message(None, 'POST_SIGNAL', target_board=board, post_summary=post_summary),
+            outboxes, args.rounds)),
+        ('per recipient', measure(
+            lambda: per_recipient_broadcast(recipients, 'POST_SIGNAL', post_summary),
+            outboxes, args.rounds)),
+    ]
+    for name, (micros, blocks, kilobytes) in results:
+        print(f"{name:<14} {micros:>13.0f} {blocks:>9.0f} {kilobytes:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Measures how much the client's cache of posts and versioned listings saves a client that repeats reads.
+
+Starts socket_server.py in a subprocess (with --multiplex), joins --users users and creates --groups extra
+groups so the listings have some size, then has one client repeat a round of reads --rounds times:
+%message and %groupmessage for --posts posts each, %users, %groups and %groupusers. The round is run once
+sending every command as before and once through the client's cache (socket_client.request_post and
+request_listing): posts read again never leave the client, and unchanged listings come back as NOT_MODIFIED.
+Reports commands sent to the server, response bytes received and reads/sec.
+
+Usage (from the repository root):
+    python benchmarks/bench_client_cache.py --rounds 200 --users 200
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import socket_client
+
+HOST = '127.0.0.1'
+
+def find_free_port():
+    """
+    Finds a port where both port and port + 1 (the signal port) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket() as signal_probe:
+                signal_probe.bind((HOST, port + 1))
+            return port
+        except OSError:
+            continue
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+class CountingConnection(socket_client.ServerConnection):
+    """
+    A multiplexed connection that counts the commands it sends and the response bytes it receives, and
+    ignores signals.
+    """
+    def __init__(self, reader, writer):
+        super().__init__(reader, writer)
+        self.commands = 0
+        self.response_bytes = 0
+
+    def sendall(self, data):
+        self.commands += 1
+        super().sendall(data)
+
+    def _dispatch(self, channel, payload):
+        # Signals (hundreds of joins and posts) aren't printed
+        if channel == socket_client.RESPONSE_CHANNEL:
+            self.response_bytes += len(payload)
+            super()._dispatch(channel, payload)
+
+async def open_connection(port):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    return CountingConnection(reader, writer)
+
+async def command(connection, text):
+    socket_client.send_command(connection, text)
+    return await socket_client.receive_response(connection)
+
+async def read_round(connection, posts, cached):
+    """
+    Runs one round of reads, through the connection's cache or straight to the server. Returns the reads done.
+    """
+    reads = 0
+    for message_id in range(1, posts + 1):
+        if cached:
+            await socket_client.request_post(connection, (None, str(message_id)), '%message', str(message_id))
+            await socket_client.request_post(connection, ('1', str(message_id)), '%groupmessage', '1', str(message_id))
+        else:
+            await command(connection, f"%message {message_id}")
+            await command(connection, f"%groupmessage 1 {message_id}")
+        reads += 2
+    for key, text in (('users', '%users'), ('groups', '%groups'), (('groupusers', '1'), '%groupusers 1')):
+        if cached:
+            await socket_client.request_listing(connection, key, *text.split())
+        else:
+            await command(connection, text)
+        reads += 1
+    return reads
+
+async def measure(port, args):
+    # Members and groups, so the listings are the size a busy server's are; their connections stay open
+    members = []
+    for number in range(args.users):
+        connection = await open_connection(port)
+        await command(connection, f"%connect {HOST} {port} user{number}")
+        await command(connection, "%join")
+        await command(connection, "%groupjoin 1")
+        members.append(connection)
+    for number in range(args.groups):
+        await command(members[0], f"%groupcreate Bench group {number}")
+    for number in range(args.posts):
+        await command(members[0], f"%post user0 2024-12-02 16:38:44 Subject {number}|" + "x" * args.post_size)
+        await command(members[0], f"%grouppost user0 2024-12-02 16:38:44 1 Subject {number}|" + "x" * args.post_size)
+
+    results = []
+    try:
+        for cached in (False, True):
+            connection = await open_connection(port)
+            await command(connection, f"%connect {HOST} {port} reader{int(cached)}")
+            await command(connection, "%groupjoin 1")
+            connection.commands = connection.response_bytes = 0
+            reads = 0
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                reads += await read_round(connection, args.posts, cached)
+            elapsed = time.perf_counter() - started
+            results.append((cached, reads, connection.commands, connection.response_bytes, elapsed))
+            connection.close()
+    finally:
+        for connection in members:
+            connection.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Commands and bytes saved by the client's response cache")
+    parser.add_argument('--rounds', type=int, default=200, help="Times the round of reads is repeated")
+    parser.add_argument('--posts', type=int, default=10, help="Public and group posts read per round")
+    parser.add_argument('--post-size', type=int, default=200, help="Bytes of content per post")
+    parser.add_argument('--users', type=int, default=200, help="Users joined to the board and to group 1")
+    parser.add_argument('--groups', type=int, default=50, help="Groups created on top of the default ones")
+    parser.add_argument('--mode', default='threaded', help="Server engine")
+    args = parser.parse_args()
+
+    port = find_free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'socket_server.py'), '--host', HOST,
+                               '--port', str(port), '--mode', args.mode, '--multiplex'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        results = asyncio.run(measure(port, args))
+    finally:
+        server.kill()
+        server.wait()
+
+    print(f"{args.rounds} rounds of {args.posts * 2} post reads and 3 listings, {args.users} users "
+          f"({args.mode} server)")
+    print(f"{'client':<8} {'reads':>7} {'commands sent':>13} {'response KiB':>12} {'reads/s':>9}")
+    for cached, reads, commands, response_bytes, elapsed in results:
+        print(f"{'cached' if cached else 'plain':<8} {reads:>7} {commands:>13} {response_bytes / 1024:>12.1f} "
+              f"{reads / elapsed:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Measures how pipelining commands on the asyncio client raises throughput over one connection.
+
+Starts socket_server.py in a subprocess and sends %message commands through one client connection
+(socket_client.ServerConnection), keeping 1, 4, 16 and 64 of them outstanding at a time. Depth 1 is the
+old request/response behaviour: every command waits a full round trip before the next is sent.
+Reports commands/sec and p50/p99 time from sending a command to receiving its response.
+
+Usage (from the repository root):
+    python benchmarks/bench_client_pipelining.py --commands 20000 --multiplex
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import socket_client
+
+HOST = '127.0.0.1'
+
+def find_free_port():
+    """
+    Finds a port where both port and port + 1 (the signal port) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket() as signal_probe:
+                signal_probe.bind((HOST, port + 1))
+            return port
+        except OSError:
+            continue
+
+def wait_for_port(port, multiplexed, timeout=30.0):
+    # A split server pairs connections in accept order, so its probe opens a signal connection as well
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                if not multiplexed:
+                    socket.create_connection((HOST, port + 1), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def run_depth(connection, depth, commands):
+    """
+    Sends commands with at most depth of them outstanding; returns the elapsed time and each round trip.
+    """
+    latencies = []
+
+    async def one(number):
+        start = time.perf_counter()
+        socket_client.send_command(connection, '%message', str(number % 2 + 1))
+        await socket_client.receive_response(connection)
+        latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    outstanding = set()
+    for number in range(commands):
+        if len(outstanding) >= depth:
+            _, outstanding = await asyncio.wait(outstanding, return_when=asyncio.FIRST_COMPLETED)
+        outstanding.add(asyncio.create_task(one(number)))
+    await asyncio.gather(*outstanding)
+    return time.perf_counter() - started, latencies
+
+async def measure(port, args):
+    connection = await socket_client.connect_to_server(HOST, port, args.multiplex)
+    try:
+        socket_client.send_command(connection, '%connect', HOST, str(port), 'bench')
+        await socket_client.receive_response(connection)
+        results = []
+        for depth in args.depths:
+            results.append((depth,) + await run_depth(connection, depth, args.commands))
+        return results
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Client commands/sec with 1, 4, 16 and 64 commands outstanding")
+    parser.add_argument('--commands', type=int, default=20000, help="Commands sent per depth")
+    parser.add_argument('--depths', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--mode', default='threaded', help="Server engine")
+    parser.add_argument('--multiplex', action='store_true', help="Run the server and client with --multiplex")
+    args = parser.parse_args()
+
+    port = find_free_port()
+    command = [sys.executable, os.path.join(ROOT, 'socket_server.py'), '--host', HOST, '--port', str(port),
+               '--mode', args.mode]
+    if args.multiplex:
+        command.append('--multiplex')
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, args.multiplex)
+        results = asyncio.run(measure(port, args))
+    finally:
+        server.kill()
+        server.wait()
+
+    print(f"{args.commands} %message commands on one {'multiplexed ' if args.multiplex else ''}connection "
+          f"({args.mode} server)")
+    print(f"{'depth':>5} {'commands/s':>11} {'p50 ms':>7} {'p99 ms':>7}")
+    for depth, elapsed, latencies in results:
+        print(f"{depth:>5} {args.commands / elapsed:>11.0f} {percentile(latencies, 0.5) * 1000:>7.2f} "
+              f"{percentile(latencies, 0.99) * 1000:>7.2f}")
+
+if __name__ == "__main__":
+    main()
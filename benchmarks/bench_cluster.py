@@ -0,0 +1,153 @@
+"""
+Measures group traffic in cluster mode as nodes are added.
+
+For 1, 2 and 4 nodes, starts socket_server.py --mode cluster nodes on localhost and drives them from
+several client processes. Every connection goes to one node (round robin), creates and joins its own
+groups, then sends %grouppost and %groupmessage commands to them; each group lives on the node its ID
+hashes to, so most commands are forwarded once there are several nodes. Reports commands/sec and
+p50/p99 round-trip latency. Gains need a core per node, or nodes on separate machines.
+
+Usage (from the repository root):
+    python benchmarks/bench_cluster.py --clients 8 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from socket_protocol import encode_frame, read_frames
+
+HOST = '127.0.0.1'
+# Ports each node uses: clients, signals and other nodes
+PORTS_PER_NODE = 3
+
+def find_free_ports(nodes):
+    """
+    Finds a base port such that every node's ports (base + 10 * node + 0..2) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            base = probe.getsockname()[1]
+        try:
+            for node in range(nodes):
+                for offset in range(PORTS_PER_NODE):
+                    with socket.socket() as port_probe:
+                        port_probe.bind((HOST, base + 10 * node + offset))
+            return [base + 10 * node for node in range(nodes)]
+        except OSError:
+            continue
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # The threaded engine pairs each command connection with a signal connection, so open both
+            with socket.create_connection((HOST, port), timeout=1), socket.create_connection((HOST, port + 1), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("node did not start")
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_client(number, ports, connections, groups, duration, results):
+    """
+    Client process: each connection creates and joins its groups on the node it is connected to, then the
+    connections take turns sending group posts and reads until duration ends.
+    """
+    sessions = []
+    for index in range(connections):
+        name = f"c{number}_{index}"
+        port = ports[(number * connections + index) % len(ports)]
+        command_socket = socket.create_connection((HOST, port))
+        signal_socket = socket.create_connection((HOST, port + 1))
+        frames = read_frames(command_socket)
+        # The server pairs the two connections by session token
+        token = secrets.token_hex(8)
+        signal_socket.sendall(encode_frame(f"SESSION {token}"))
+        for command in (f"%session {token}", f"%connect {HOST} {port} {name}"):
+            command_socket.sendall(encode_frame(command))
+            next(frames)
+        group_ids = []
+        for group in range(groups):
+            command_socket.sendall(encode_frame(f"%groupcreate {name}-{group}"))
+            group_ids.append(int(next(frames).decode('utf-8').split()[2].rstrip(':')))
+            command_socket.sendall(encode_frame(f"%groupjoin {group_ids[-1]}"))
+            next(frames)
+        sessions.append((name, command_socket, signal_socket, frames, group_ids))
+    latencies = []
+    sent = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        name, command_socket, _, frames, group_ids = sessions[sent % len(sessions)]
+        group_id = group_ids[sent // len(sessions) % len(group_ids)]
+        if sent % 2:
+            command = f"%groupmessage {group_id} 1"
+        else:
+            command = f"%grouppost {name} 2024-12-02 16:38:44 {group_id} Load|post {sent}"
+        start = time.perf_counter()
+        command_socket.sendall(encode_frame(command))
+        next(frames)
+        latencies.append(time.perf_counter() - start)
+        sent += 1
+    for _, command_socket, signal_socket, _, _ in sessions:
+        command_socket.close()
+        signal_socket.close()
+    results.put(latencies)
+
+def measure(nodes, args):
+    ports = find_free_ports(nodes)
+    cluster_nodes = ",".join(f"{HOST}:{port}" for port in ports)
+    servers = [subprocess.Popen([sys.executable, os.path.join(ROOT, 'socket_server.py'), '--host', HOST,
+                                 '--port', str(port), '--mode', 'cluster', '--cluster-nodes', cluster_nodes],
+                                stdout=subprocess.DEVNULL)
+               for port in ports]
+    try:
+        for port in ports:
+            wait_for_port(port)
+        time.sleep(1.0)  # Let the nodes connect to each other
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=run_client,
+                                           args=(number, ports, args.connections, args.groups, args.duration, results))
+                   for number in range(args.clients)]
+        for client in clients:
+            client.start()
+        latencies = []
+        for _ in clients:
+            latencies.extend(results.get())
+        for client in clients:
+            client.join()
+        return len(latencies) / args.duration, latencies
+    finally:
+        for server in servers:
+            server.kill()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Group commands/sec for clusters of 1, 2 and 4 nodes")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8, help="Client processes")
+    parser.add_argument('--connections', type=int, default=4, help="Connections per client process")
+    parser.add_argument('--groups', type=int, default=4, help="Groups each connection creates and posts to")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds of load per cluster size")
+    args = parser.parse_args()
+
+    print(f"{args.clients} client processes x {args.connections} connections, {os.cpu_count()} CPUs")
+    print(f"{'nodes':>5} {'commands/s':>11} {'p50 ms':>7} {'p99 ms':>7}")
+    for nodes in args.nodes:
+        rate, latencies = measure(nodes, args)
+        print(f"{nodes:>5} {rate:>11.0f} {percentile(latencies, 0.5) * 1000:>7.2f} "
+              f"{percentile(latencies, 0.99) * 1000:>7.2f}")
+
+if __name__ == "__main__":
+    main()
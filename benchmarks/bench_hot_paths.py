@@ -0,0 +1,221 @@
+"""
+Microbenchmarks for the protocol and board hot paths, with a stored baseline to compare against.
+
+Times parse_client_command, format_client_command, parse_bulletin_message, BulletinBoard.add_post and
+get_message_content, and PrivateBoard.post_to_group and get_group_message. It also times a broadcast to a
+board of --members members, measured until every member's signal has been written. Each member gets a real
+SignalOutbox, whose writer thread sends the shared frame with send_frames to a socket that accepts every
+byte. Each benchmark runs its operation in batches of about 0.2s and keeps the fastest of --repeats
+batches, which is the one least disturbed by whatever else the machine was doing.
+
+--save writes the results (nanoseconds per operation) to a JSON file. --compare runs the suite again and
+flags every benchmark more than --threshold percent slower than that baseline, exiting with status 1 if
+any regressed, so it can gate a change.
+
+Baselines are machine-local: they only compare runs on the same machine and Python, so none is committed.
+Save one from the unchanged tree before a change, then compare against it after the change:
+    python benchmarks/bench_hot_paths.py --save benchmarks/hot_paths_baseline.json
+    python benchmarks/bench_hot_paths.py --compare benchmarks/hot_paths_baseline.json --threshold 10
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import socket_server
+from bulletin_board import BulletinBoard
+from private_board import PrivateBoard
+from signal_outbox import SignalOutbox
+from socket_protocol import format_client_command, parse_bulletin_message, parse_client_command
+
+# Posts on the boards the lookups run against
+LOOKUP_POSTS = 10000
+
+class Delivery:
+    """
+    Counts the signal frames written to every member's socket, so a broadcast can be timed until delivered.
+    """
+    def __init__(self):
+        self.frames = 0
+        self.ready = threading.Condition()
+
+    def add(self, frames):
+        with self.ready:
+            self.frames += frames
+            self.ready.notify()
+
+    def wait_for(self, frames):
+        with self.ready:
+            self.ready.wait_for(lambda: self.frames >= frames)
+
+class NullSocket:
+    """
+    A member's signal socket that accepts every byte at once, like a client that keeps up with its signals.
+    """
+    def __init__(self, delivery):
+        self.delivery = delivery
+
+    def sendmsg(self, buffers):
+        self.delivery.add(len(buffers))
+        return sum(len(buffer) for buffer in buffers)
+
+    def shutdown(self, how):
+        pass
+
+def filled_board(board, post):
+    for index in range(LOOKUP_POSTS):
+        post(f"user{index % 100}", "2024-12-02 16:38:44", f"Subject {index}", "hello world " * 8)
+    return board
+
+def bench_parse_post():
+    message = "%post user1 2024-12-02 16:38:44 Weekly update|The deploy went out on time and nothing broke."
+    return lambda: parse_client_command(message)
+
+def bench_parse_message():
+    return lambda: parse_client_command("%message 1234")
+
+def bench_format_command():
+    return lambda: format_client_command('%groupmessage', '3', '1234')
+
+def bench_parse_bulletin():
+    message = "17 user1 2024-12-02 Weekly update on the deploy"
+    return lambda: parse_bulletin_message(message)
+
+def bench_add_post():
+    board = BulletinBoard()
+    return lambda: board.add_post("user1", "2024-12-02 16:38:44", "Subject", "hello world " * 8)
+
+def bench_get_message():
+    board = BulletinBoard()
+    filled_board(board, board.add_post)
+    message_ids = itertools.cycle(range(1, LOOKUP_POSTS + 1, 7))
+    return lambda: board.get_message_content(next(message_ids))
+
+def bench_post_to_group():
+    board = PrivateBoard("Bench post", group_id=PrivateBoard.last_group_id + 1)
+    return lambda: board.post_to_group("user1", "2024-12-02 16:38:44", "Subject", "hello world " * 8)
+
+def bench_get_group_message():
+    board = PrivateBoard("Bench lookup", group_id=PrivateBoard.last_group_id + 1)
+    filled_board(board, board.post_to_group)
+    message_ids = itertools.cycle(range(1, LOOKUP_POSTS + 1, 7))
+    return lambda: board.get_group_message(board.group_id, next(message_ids))
+
+def bench_broadcast(members):
+    def setup():
+        delivery = Delivery()
+        board = BulletinBoard()
+        for index in range(members):
+            client_socket = object()
+            socket_server.client_sessions[client_socket] = {'username': None}
+            socket_server.register_signal_session(client_socket, SignalOutbox(NullSocket(delivery)))
+            socket_server.set_session_username(client_socket, f"member{index}")
+            board.add_user(f"member{index}")
+        summary = "Message ID: 17, Sender: member0, Post Date: 2024-12-02 16:38:44, Subject: Weekly update"
+        # Frames written once each broadcast so far has reached every member
+        delivered = itertools.count(members, members)
+
+        def broadcast():
+            socket_server.broadcast_message(None, 'POST_SIGNAL', target_board=board, post_summary=summary)
+            delivery.wait_for(next(delivered))
+        return broadcast
+    return setup
+
+def benchmarks(args):
+    """
+    Returns (name, setup) for every benchmark; setup() builds its state and returns the operation to time.
+    """
+    return [
+        ('parse_client_command %post', bench_parse_post),
+        ('parse_client_command %message', bench_parse_message),
+        ('format_client_command', bench_format_command),
+        ('parse_bulletin_message', bench_parse_bulletin),
+        ('BulletinBoard.add_post', bench_add_post),
+        ('BulletinBoard.get_message_content', bench_get_message),
+        ('PrivateBoard.post_to_group', bench_post_to_group),
+        ('PrivateBoard.get_group_message', bench_get_group_message),
+        (f'broadcast delivered to {args.members} members', bench_broadcast(args.members)),
+    ]
+
+def run_suite(args):
+    """
+    Runs every benchmark and returns {name: nanoseconds per operation}.
+    """
+    results = {}
+    for name, setup in benchmarks(args):
+        timer = timeit.Timer(setup())
+        # Size the batches once so every repeat does the same work
+        number, _ = timer.autorange()
+        number = max(1, number)
+        best = min(timer.repeat(args.repeats, number))
+        results[name] = best / number * 1e9
+    return results
+
+def compare(baseline, results, threshold):
+    """
+    Prints each benchmark against the baseline and returns the names of those more than threshold percent slower.
+    """
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline ns':>12} {'current ns':>11} {'change':>8}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<36} {'-':>12} {current:>11.0f} {'new':>8}")
+            continue
+        change = (current / base - 1) * 100
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<36} {base:>12.0f} {current:>11.0f} {change:>+7.1f}%{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Protocol and board microbenchmarks with a stored baseline")
+    parser.add_argument('--repeats', type=int, default=5, help="Batches per benchmark; the fastest is kept")
+    parser.add_argument('--members', type=int, default=1000,
+                        help="Members receiving the benchmarked broadcast (one writer thread each)")
+    parser.add_argument('--save', metavar='PATH', help="Write the results to a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Compare the results with a JSON baseline")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="Percent slower than the baseline that counts as a regression")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = run_suite(args)
+
+    if baseline is not None:
+        print(f"Compared with {args.compare} (Python {baseline['python']}, {baseline['created']})")
+        regressions = compare(baseline['results'], results, args.threshold)
+    else:
+        print(f"{'benchmark':<36} {'ns/op':>11}")
+        for name, nanoseconds in results.items():
+            print(f"{name:<36} {nanoseconds:>11.0f}")
+        regressions = []
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'repeats': args.repeats,
+                       'members': args.members, 'results': results}, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Saved the results to {args.save}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) more than {args.threshold:g}% slower than the baseline.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
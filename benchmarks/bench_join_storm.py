@@ -0,0 +1,58 @@
+"""
+Measures the server-side cost of a reconnect storm of %join commands.
+
+Fills a BulletinBoard with N users (default 10,000), then builds the %join response once per
+user, as when every client reconnects after a deploy. Compares building the welcome text on
+every join (users list plus the two latest messages, as before the cache) with serving the
+board's cached welcome payload, and reports joins/sec and how often the payload was rebuilt.
+The join broadcast is left out; it costs the same either way.
+A post every --post-every joins invalidates the cache, as live traffic would.
+
+Usage (from the repository root):
+    python benchmarks/bench_join_storm.py --users 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bulletin_board import BulletinBoard
+
+def uncached_join(board, username):
+    response = board.add_user(username)
+    return (response + f" Users active on this board: {board.list_users()}"
+            f"\n{board.get_message_content(len(board.messages))}"
+            f"\n{board.get_message_content(len(board.messages) - 1)}").encode('utf-8')
+
+def cached_join(board, username):
+    return board.add_user(username).encode('utf-8') + board.welcome.get()
+
+def main():
+    parser = argparse.ArgumentParser(description="Joins/sec during a reconnect storm, with and without the welcome cache")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--post-every', type=int, default=1000, help="Joins between posts that invalidate the cache")
+    args = parser.parse_args()
+
+    board = BulletinBoard()
+    usernames = [f"user{number}" for number in range(args.users)]
+    for username in usernames:
+        board.add_user(username)
+
+    print(f"{args.users} users rejoining, a post every {args.post_every} joins")
+    print(f"{'welcome':<10} {'joins/s':>10} {'rebuilds':>9}")
+    for name, join in (('rebuilt', lambda username: uncached_join(board, username)),
+                       ('cached', lambda username: cached_join(board, username))):
+        builds = board.welcome.builds
+        start = time.perf_counter()
+        for number, username in enumerate(usernames):
+            if number % args.post_every == 0:
+                board.add_post(username, "2024-12-02 16:38:44", "Subject", "Content")
+            join(username)
+        seconds = time.perf_counter() - start
+        print(f"{name:<10} {args.users / seconds:>10.0f} {board.welcome.builds - builds:>9}")
+
+if __name__ == "__main__":
+    main()
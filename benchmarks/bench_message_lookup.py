@@ -0,0 +1,71 @@
+"""
+Measures %message / %groupmessage lookup latency as boards grow.
+
+Fills a BulletinBoard and a PrivateBoard with N posts and times random lookups through
+get_message_content / get_group_message. With the ID index the latency stays flat as N grows;
+the old linear scan is timed alongside (up to --scan-limit posts) for comparison.
+
+Usage (from the repository root):
+    python benchmarks/bench_message_lookup.py --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bulletin_board import BulletinBoard
+from private_board import PrivateBoard
+
+def linear_scan(messages, message_id):
+    """
+    The lookup the boards used before the index: scan the list until the ID matches.
+    """
+    for message in messages:
+        if message['id'] == message_id:
+            return message
+    return None
+
+def time_lookups(lookup, ids):
+    """
+    Returns the mean latency in microseconds of calling lookup for every ID.
+    """
+    start = time.perf_counter()
+    for message_id in ids:
+        lookup(message_id)
+    return (time.perf_counter() - start) / len(ids) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Message lookup latency vs board size")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--lookups', type=int, default=10000, help="Random lookups per measurement")
+    parser.add_argument('--scan-limit', type=int, default=100000, help="Largest board to time the linear scan on")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'posts':>9} {'public us':>10} {'group us':>10} {'scan us':>10}")
+    for size in args.sizes:
+        public_board = BulletinBoard()
+        private_board = PrivateBoard("Bench")
+        for index in range(size):
+            public_board.add_post("bench", "2024-12-02 16:38:44", f"subject {index}", "content")
+            private_board.post_to_group("bench", "2024-12-02 16:38:44", f"subject {index}", "content")
+
+        last_id = len(public_board.messages)
+        ids = [rng.randint(1, last_id) for _ in range(args.lookups)]
+        public_us = time_lookups(public_board.get_message_content, ids)
+        group_us = time_lookups(lambda message_id: private_board.get_group_message(1, message_id), ids)
+
+        scan = "skipped"
+        if size <= args.scan_limit:
+            # The scan is O(n) per lookup, so use fewer lookups to keep the run short
+            scan_ids = ids[:max(1, min(len(ids), 1000000 // size))]
+            scan = f"{time_lookups(lambda message_id: linear_scan(public_board.messages, message_id), scan_ids):.2f}"
+
+        print(f"{size:>9} {public_us:>10.2f} {group_us:>10.2f} {scan:>10}")
+
+if __name__ == "__main__":
+    main()
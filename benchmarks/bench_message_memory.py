@@ -0,0 +1,83 @@
+"""
+Measures memory per stored message.
+
+Stores N posts (default 1,000,000) from a pool of senders, first the way the boards used to (a
+five-key dict per post in a list, plus the ID index) and then in a MessageStore, and reports the
+bytes allocated per message with tracemalloc. Subject and content strings are the same in both,
+so the difference is the per-message overhead.
+
+Usage (from the repository root):
+    python benchmarks/bench_message_memory.py --posts 1000000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from message_store import MessageStore
+
+def make_posts(count, senders):
+    """
+    Yields (id, sender, date, subject, content) with fresh strings per post, as parsed from client commands.
+    """
+    for index in range(count):
+        minute, second = divmod(index % 3600, 60)
+        yield (index + 1, f"user{index % senders}", f"2024-12-02 16:{minute:02}:{second:02}",
+               f"subject {index}", f"content of post number {index}")
+
+def text_layout(posts):
+    subjects = []
+    contents = []
+    for _, _, _, subject, content in posts:
+        subjects.append(subject)
+        contents.append(content)
+    return subjects, contents
+
+def dict_layout(posts):
+    messages = []
+    index = {}
+    for message_id, sender, date, subject, content in posts:
+        message = {'id': message_id, 'sender': sender, 'date': date, 'subject': subject, 'content': content}
+        messages.append(message)
+        index[message_id] = message
+    return messages, index
+
+def store_layout(posts):
+    store = MessageStore()
+    for post in posts:
+        store.add(*post)
+    return store
+
+def measure(build, posts, senders):
+    """
+    Returns the bytes still allocated per message after building the layout.
+    """
+    gc.collect()
+    tracemalloc.start()
+    layout = build(make_posts(posts, senders))
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del layout
+    return allocated / posts
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per message: dict per post vs. MessageStore")
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--senders', type=int, default=1000, help="Distinct senders")
+    args = parser.parse_args()
+
+    # Subject and content are identical in both layouts, so measure them alone to show the overhead
+    text_only = measure(text_layout, args.posts, args.senders)
+    print(f"{args.posts} posts, {args.senders} senders")
+    print(f"{'layout':<14} {'bytes/message':>14} {'overhead':>9}")
+    for name, build in (('dict per post', dict_layout), ('MessageStore', store_layout)):
+        per_message = measure(build, args.posts, args.senders)
+        print(f"{name:<14} {per_message:>14.0f} {per_message - text_only:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Compares clients with a separate signal connection against multiplexed clients (--multiplex).
+
+For each server engine, starts socket_server.py in a subprocess, once as usual and once with --multiplex,
+and connects the same number of clients to it from a pool of threads. Reports how long each client took
+from its first connect() until its %connect response (split clients also open the signal connection and
+exchange their session token first), the file descriptors the server holds per client, and how long
+one %post takes to reach every other client as a POST_SIGNAL. The threaded engine pairs split connections in
+accept order, so clients connecting at the same time can end up with each other's signals; clients that
+never see the post within SIGNAL_TIMEOUT are counted as missed.
+
+Usage (from the repository root):
+    python benchmarks/bench_multiplex.py --clients 200 --concurrency 16
+"""
+import argparse
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from socket_protocol import SIGNAL_CHANNEL, ChannelFrameDecoder, encode_frame, read_frames
+
+HOST = '127.0.0.1'
+# Seconds a client waits for the post's signal before it counts as missed
+SIGNAL_TIMEOUT = 2.0
+
+def find_free_port():
+    """
+    Finds a port where both port and port + 1 (the signal port) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket() as signal_probe:
+                signal_probe.bind((HOST, port + 1))
+            return port
+        except OSError:
+            continue
+
+def wait_for_port(port, multiplexed, timeout=30.0):
+    # A split server pairs connections in accept order, so its probe opens a signal connection as well
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                if not multiplexed:
+                    socket.create_connection((HOST, port + 1), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def open_fds(pid):
+    """
+    Returns how many file descriptors the process holds, or None where /proc isn't available.
+    """
+    try:
+        return len(os.listdir(f'/proc/{pid}/fd'))
+    except OSError:
+        return None
+
+class SplitClient:
+    """
+    A client with a command connection and a signal connection, paired by session token.
+    """
+    def __init__(self, port, name):
+        self.command_socket = socket.create_connection((HOST, port))
+        self.signal_socket = socket.create_connection((HOST, port + 1))
+        self.signal_socket.settimeout(SIGNAL_TIMEOUT)
+        token = secrets.token_hex(8)
+        self.signal_socket.sendall(encode_frame(f"SESSION {token}"))
+        self.frames = read_frames(self.command_socket)
+        self.signals = read_frames(self.signal_socket)
+        self.command(f"%session {token}")
+        self.command(f"%connect {HOST} {port} {name}")
+
+    def command(self, text):
+        self.command_socket.sendall(encode_frame(text))
+        return next(self.frames)
+
+    def next_signal(self):
+        try:
+            return next(self.signals)
+        except socket.timeout:
+            return None
+
+    def close(self):
+        self.command_socket.close()
+        self.signal_socket.close()
+
+class MultiplexedClient:
+    """
+    A client whose responses and signals share one connection. Signals that arrive while it waits for a
+    response are kept for next_signal().
+    """
+    def __init__(self, port, name):
+        self.command_socket = socket.create_connection((HOST, port))
+        self.command_socket.settimeout(SIGNAL_TIMEOUT)
+        self.frames = read_frames(self.command_socket, ChannelFrameDecoder())
+        self.signals = []
+        self.command(f"%connect {HOST} {port} {name}")
+
+    def command(self, text):
+        self.command_socket.sendall(encode_frame(text))
+        for channel, payload in self.frames:
+            if channel == SIGNAL_CHANNEL:
+                self.signals.append(payload)
+            else:
+                return payload
+
+    def next_signal(self):
+        if self.signals:
+            return self.signals.pop(0)
+        try:
+            for channel, payload in self.frames:
+                if channel == SIGNAL_CHANNEL:
+                    return payload
+        except socket.timeout:
+            return None
+
+    def close(self):
+        self.command_socket.close()
+
+def connect_timed(client_type, port, name):
+    start = time.perf_counter()
+    client = client_type(port, name)
+    return client, time.perf_counter() - start
+
+def measure(mode, multiplexed, args):
+    port = find_free_port()
+    command = [sys.executable, os.path.join(ROOT, 'socket_server.py'), '--host', HOST, '--port', str(port),
+               '--mode', mode]
+    if multiplexed:
+        command.append('--multiplex')
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    client_type = MultiplexedClient if multiplexed else SplitClient
+    clients = []
+    try:
+        wait_for_port(port, multiplexed)
+        time.sleep(0.5)
+        idle_fds = open_fds(server.pid)
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            connected = list(pool.map(lambda number: connect_timed(client_type, port, f"user{number}"),
+                                      range(args.clients)))
+        clients = [client for client, _ in connected]
+        connect_times = [seconds for _, seconds in connected]
+        fds = open_fds(server.pid)
+        fds_per_client = (fds - idle_fds) / args.clients if fds is not None and idle_fds is not None else None
+
+        for client in clients:
+            client.command("%join")
+        # Everyone but the poster receives the post's signal; time until the last one has it
+        poster = clients[0]
+        missed = 0
+        waited = 0.0  # Time spent timing out on missed clients, left out of the fan-out time
+        start = time.perf_counter()
+        poster.command("%post user0 2024-12-02 16:38:44 Hello|everyone")
+        finished = start
+        for client in clients[1:]:
+            waiting_since = time.perf_counter()
+            signal = client.next_signal()
+            while signal is not None and not signal.startswith(b"POST_SIGNAL"):
+                signal = client.next_signal()
+            if signal is None:
+                missed += 1
+                waited += time.perf_counter() - waiting_since
+            else:
+                finished = time.perf_counter()
+        return connect_times, fds_per_client, max(0.0, finished - start - waited), missed
+    finally:
+        for client in clients:
+            client.close()
+        server.kill()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Split signal connections versus multiplexed connections")
+    parser.add_argument('--modes', nargs='+', default=['threaded', 'asyncio'], help="Server engines to compare")
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16, help="Clients connecting at the same time")
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.concurrency} connecting at a time")
+    print(f"{'engine':<10} {'connections':<12} {'connect p50 ms':>14} {'connect p99 ms':>14} "
+          f"{'fds/client':>10} {'fan-out ms':>10} {'missed':>6}")
+    for mode in args.modes:
+        for multiplexed in (False, True):
+            connect_times, fds_per_client, fan_out, missed = measure(mode, multiplexed, args)
+            fds = f"{fds_per_client:.1f}" if fds_per_client is not None else "n/a"
+            print(f"{mode:<10} {'multiplexed' if multiplexed else 'split':<12} "
+                  f"{percentile(connect_times, 0.5) * 1000:>14.2f} {percentile(connect_times, 0.99) * 1000:>14.2f} "
+                  f"{fds:>10} {fan_out * 1000:>10.2f} {missed:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Measures post throughput with and without the durable post log.
+
+Runs --threads posters against a BulletinBoard, each adding posts and waiting for them to be
+committed the way the server does before it answers a %post. Compared modes:
+    memory        no log (nothing survives a restart)
+    no-fsync      log written but never fsynced (--no-fsync)
+    group commit  log fsynced; concurrent posters share each fsync
+    fsync/post    log fsynced with a single poster, so every post pays its own fsync
+
+Usage (from the repository root):
+    python benchmarks/bench_post_log.py --posts 20000 --threads 16
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bulletin_board import BulletinBoard
+from post_log import PostLog
+
+def run_posters(log, posts, threads):
+    """
+    Returns (posts per second, commits) for posts split evenly over the poster threads.
+    """
+    board = BulletinBoard(log=log)
+    per_thread = posts // threads
+    def poster(index):
+        for number in range(per_thread):
+            board.add_post(f"user{index}", "2024-12-02 16:38:44", f"subject {number}", "content " * 10)
+            if log:
+                log.wait_committed(log.last_seq)
+    workers = [threading.Thread(target=poster, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    commits = 0
+    if log:
+        log.close()
+        commits = log.commits
+    return per_thread * threads / elapsed, commits
+
+def main():
+    parser = argparse.ArgumentParser(description="Post throughput with durability on and off")
+    parser.add_argument('--posts', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=16, help="Concurrent posters")
+    parser.add_argument('--dir', help="Directory for the log files (default: a temporary directory)")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(dir=args.dir)
+    def new_log(name, durable):
+        return PostLog(os.path.join(data_dir, name), durable=durable)
+
+    # fsync per post is slow, so it gets fewer posts
+    single_posts = max(1, min(args.posts, 2000))
+    try:
+        results = [
+            ('memory', args.posts, run_posters(None, args.posts, args.threads)),
+            ('no-fsync', args.posts, run_posters(new_log('nofsync.log', False), args.posts, args.threads)),
+            ('group commit', args.posts, run_posters(new_log('group.log', True), args.posts, args.threads)),
+            ('fsync/post', single_posts, run_posters(new_log('single.log', True), single_posts, 1)),
+        ]
+    finally:
+        shutil.rmtree(data_dir)
+
+    print(f"{'mode':<13} {'posts':>7} {'posts/sec':>11} {'commits':>8} {'posts/commit':>13}")
+    for name, posts, (rate, commits) in results:
+        per_commit = f"{posts / commits:.1f}" if commits else "-"
+        print(f"{name:<13} {posts:>7} {rate:>11.0f} {commits:>8} {per_commit:>13}")
+
+if __name__ == "__main__":
+    main()
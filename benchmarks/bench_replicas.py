@@ -0,0 +1,165 @@
+"""
+Measures read throughput with read replicas, and how long a post takes to show up on them.
+
+For 0, 1 and 2 followers, starts a leader (socket_server.py --serve-replicas) and that many
+followers (--follow), then runs reader processes spread over the followers (or the leader when
+there are none) sending %message requests back to back, while one writer posts to the leader
+every few milliseconds. Reports read commands/sec and the p50/p99 replication lag: the time from
+the leader confirming a post until a follower returns it. Gains need a core per server.
+
+Usage (from the repository root):
+    python benchmarks/bench_replicas.py --readers 8 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from socket_protocol import encode_frame, read_frames
+
+HOST = '127.0.0.1'
+# Ports each server uses: clients, signals, (cluster links) and followers
+PORTS_PER_SERVER = 4
+
+def find_free_ports(servers):
+    """
+    Finds a base port such that every server's ports (base + 10 * server + 0..3) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            base = probe.getsockname()[1]
+        try:
+            for server in range(servers):
+                for offset in range(PORTS_PER_SERVER):
+                    with socket.socket() as port_probe:
+                        port_probe.bind((HOST, base + 10 * server + offset))
+            return [base + 10 * server for server in range(servers)]
+        except OSError:
+            continue
+
+def start(args, log=subprocess.DEVNULL):
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'socket_server.py'), '--host', HOST, *args], stdout=log)
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # The threaded engine pairs each command connection with a signal connection, so open both
+            with socket.create_connection((HOST, port), timeout=1), socket.create_connection((HOST, port + 1), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+class Session:
+    def __init__(self, port, name):
+        self.command_socket = socket.create_connection((HOST, port))
+        self.signal_socket = socket.create_connection((HOST, port + 1))
+        self.frames = read_frames(self.command_socket)
+        # The server pairs the two connections by session token
+        token = secrets.token_hex(8)
+        self.signal_socket.sendall(encode_frame(f"SESSION {token}"))
+        self.send(f"%session {token}")
+        self.send(f"%connect {HOST} {port} {name}")
+
+    def send(self, command):
+        self.command_socket.sendall(encode_frame(command))
+        return next(self.frames)
+
+    def close(self):
+        self.command_socket.close()
+        self.signal_socket.close()
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_reader(number, port, duration, results):
+    session = Session(port, f"reader{number}")
+    reads = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        session.send(f"%message {reads % 2 + 1}")
+        reads += 1
+    session.close()
+    results.put(reads)
+
+def run_writer(leader_port, follower_ports, duration, interval, results):
+    """
+    Posts to the leader every interval seconds and polls a follower (round robin) until the post is there.
+    """
+    writer = Session(leader_port, "writer")
+    writer.send("%join")
+    followers = [Session(port, f"watcher{port}") for port in follower_ports]
+    lags = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        response = writer.send("%post writer 2024-12-02 16:38:44 Lag|probe").decode('utf-8')
+        confirmed = time.perf_counter()
+        message_id = response.split(",")[0].split()[-1]
+        if followers:
+            follower = followers[len(lags) % len(followers)]
+            while follower.send(f"%message {message_id}") == b"Message not found.":
+                pass
+            lags.append(time.perf_counter() - confirmed)
+        time.sleep(interval)
+    for session in [writer] + followers:
+        session.close()
+    results.put(lags)
+
+def measure(followers, args):
+    ports = find_free_ports(followers + 1)
+    leader_port, follower_ports = ports[0], ports[1:]
+    servers = [start(['--port', str(leader_port), '--serve-replicas'])]
+    try:
+        wait_for_port(leader_port)
+        for port in follower_ports:
+            servers.append(start(['--port', str(port), '--follow', f"{HOST}:{leader_port}"]))
+        for port in follower_ports:
+            wait_for_port(port)
+        read_ports = follower_ports or [leader_port]
+        reads, lags = multiprocessing.Queue(), multiprocessing.Queue()
+        readers = [multiprocessing.Process(target=run_reader,
+                                           args=(number, read_ports[number % len(read_ports)], args.duration, reads))
+                   for number in range(args.readers)]
+        writer = multiprocessing.Process(target=run_writer,
+                                         args=(leader_port, follower_ports, args.duration, args.post_interval, lags))
+        for process in readers + [writer]:
+            process.start()
+        total_reads = sum(reads.get() for _ in readers)
+        lag_samples = lags.get()
+        for process in readers + [writer]:
+            process.join()
+        return total_reads / args.duration, lag_samples
+    finally:
+        for server in servers:
+            server.kill()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Read throughput and replication lag with 0, 1 and 2 followers")
+    parser.add_argument('--followers', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--readers', type=int, default=8, help="Reader processes")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds of load per setup")
+    parser.add_argument('--post-interval', type=float, default=0.005, help="Seconds between the writer's posts")
+    args = parser.parse_args()
+
+    print(f"{args.readers} reader processes, {os.cpu_count()} CPUs")
+    print(f"{'followers':>9} {'reads/s':>9} {'lag p50 ms':>11} {'lag p99 ms':>11}")
+    for followers in args.followers:
+        rate, lags = measure(followers, args)
+        if lags:
+            print(f"{followers:>9} {rate:>9.0f} {percentile(lags, 0.5) * 1000:>11.2f} {percentile(lags, 0.99) * 1000:>11.2f}")
+        else:
+            print(f"{followers:>9} {rate:>9.0f} {'-':>11} {'-':>11}")
+
+if __name__ == "__main__":
+    main()
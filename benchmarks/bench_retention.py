@@ -0,0 +1,93 @@
+"""
+Measures what the hot-post limit buys and costs.
+
+Stores N posts (default 1,000,000) in a MessageStore that keeps everything in memory and in one
+that keeps only the newest --hot-posts in memory and spills the rest to a segment file, reporting
+the bytes still allocated per post (tracemalloc) and the time taken. Then times lookups of random
+recent (in-memory) and old (spilled) IDs in the bounded store, reporting p50/p99 latency.
+
+Usage (from the repository root):
+    python benchmarks/bench_retention.py --posts 1000000 --hot-posts 10000
+"""
+import argparse
+import gc
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from message_store import Retention, open_message_store
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def fill(store, posts):
+    for index in range(posts):
+        minute, second = divmod(index % 3600, 60)
+        store.add(index + 1, f"user{index % 1000}", f"2024-12-02 16:{minute:02}:{second:02}",
+                  f"subject {index}", f"content of post number {index}")
+
+def measure(make_store, posts):
+    """
+    Returns the store, the bytes still allocated per post after filling it and the seconds taken.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = make_store()
+    fill(store, posts)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, allocated / posts, seconds
+
+def time_lookups(store, ids):
+    samples = []
+    for message_id in ids:
+        start = time.perf_counter()
+        store.get(message_id)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and lookup latency with and without a hot-post limit")
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--hot-posts', type=int, default=10000, help="Posts kept in memory by the bounded store")
+    parser.add_argument('--lookups', type=int, default=20000, help="Lookups per kind")
+    args = parser.parse_args()
+
+    spill_dir = tempfile.mkdtemp()
+    try:
+        print(f"{args.posts} posts, {args.hot_posts} kept in memory by the bounded store")
+        print(f"{'store':<10} {'bytes/post':>11} {'fill s':>8}")
+        store, per_post, seconds = measure(lambda: open_message_store('unbounded'), args.posts)
+        print(f"{'unbounded':<10} {per_post:>11.0f} {seconds:>8.1f}")
+        del store
+        retention = Retention(args.hot_posts, spill_dir)
+        store, per_post, seconds = measure(lambda: open_message_store('bounded', retention=retention), args.posts)
+        print(f"{'bounded':<10} {per_post:>11.0f} {seconds:>8.1f}")
+
+        rng = random.Random(42)
+        first_hot = args.posts - args.hot_posts + 1
+        kinds = [
+            ('hot', [rng.randint(first_hot, args.posts) for _ in range(args.lookups)]),
+            ('spilled', [rng.randint(1, first_hot - 1) for _ in range(args.lookups)]),
+        ]
+        print(f"{'lookup':<10} {'p50 us':>8} {'p99 us':>8}")
+        for name, ids in kinds:
+            samples = time_lookups(store, ids)
+            print(f"{name:<10} {percentile(samples, 0.5):>8.1f} {percentile(samples, 0.99):>8.1f}")
+        store.segment.close()
+    finally:
+        shutil.rmtree(spill_dir)
+
+if __name__ == "__main__":
+    main()
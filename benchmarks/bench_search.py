@@ -0,0 +1,78 @@
+"""
+Measures %search query latency on a large board.
+
+Indexes N posts (default 1,000,000) whose words follow a Zipf-like distribution over a fixed
+vocabulary, so a few words appear in a large share of posts and most are rare, then times
+first-page queries (SEARCH_PAGE_SIZE results) of one and two words drawn from common, middle and
+rare parts of the vocabulary. Reports p50/p99 latency per query kind.
+
+Usage (from the repository root):
+    python benchmarks/bench_search.py --posts 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_index import SearchIndex
+from socket_protocol import SEARCH_PAGE_SIZE
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Search latency at a large board size")
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=50000, help="Distinct words")
+    parser.add_argument('--words-per-post', type=int, default=12)
+    parser.add_argument('--queries', type=int, default=2000, help="Queries per kind")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = [f"word{rank}" for rank in range(args.vocabulary)]
+    # Zipf-like weights: the word at rank r is picked with probability proportional to 1 / (r + 1)
+    weights = [1 / (rank + 1) for rank in range(args.vocabulary)]
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    chunk = 10000
+    for first_id in range(1, args.posts + 1, chunk):
+        words = rng.choices(vocabulary, weights, k=chunk * args.words_per_post)
+        for offset in range(min(chunk, args.posts - first_id + 1)):
+            post_words = words[offset * args.words_per_post:(offset + 1) * args.words_per_post]
+            index.add(first_id + offset, " ".join(post_words[:3]), " ".join(post_words[3:]))
+    build_seconds = time.perf_counter() - start
+    print(f"{args.posts} posts indexed in {build_seconds:.1f}s ({len(index.postings)} distinct words)")
+
+    bands = {
+        'common': vocabulary[:20],
+        'middle': vocabulary[1000:2000],
+        'rare': vocabulary[20000:],
+    }
+    kinds = [
+        ('1 common', lambda: bands['common'][rng.randrange(20)]),
+        ('1 middle', lambda: rng.choice(bands['middle'])),
+        ('1 rare', lambda: rng.choice(bands['rare'])),
+        ('common+common', lambda: f"{rng.choice(bands['common'])} {rng.choice(bands['common'])}"),
+        ('common+middle', lambda: f"{rng.choice(bands['common'])} {rng.choice(bands['middle'])}"),
+        ('middle+rare', lambda: f"{rng.choice(bands['middle'])} {rng.choice(bands['rare'])}"),
+    ]
+    print(f"{'query':<15} {'p50 us':>9} {'p99 us':>9} {'avg hits':>9}")
+    for name, make_query in kinds:
+        samples = []
+        hits = 0
+        for _ in range(args.queries):
+            query = make_query()
+            start = time.perf_counter()
+            results, _ = index.search(query, 0, SEARCH_PAGE_SIZE)
+            samples.append((time.perf_counter() - start) * 1e6)
+            hits += len(results)
+        print(f"{name:<15} {percentile(samples, 0.5):>9.0f} {percentile(samples, 0.99):>9.0f} {hits / args.queries:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Compares the threaded and asyncio server engines.
+
+For each mode, starts socket_server.py in a subprocess, opens client connections (a command and a
+signal socket per client) and holds them, then measures how many round-trip commands per second
+the server answers while all of them stay connected.
+
+Usage (from the repository root):
+    python benchmarks/bench_server_modes.py --connections 2000 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from socket_protocol import FRAME_HEADER, encode_frame
+
+HOST = '127.0.0.1'
+
+def raise_fd_limit():
+    """
+    Raises the open file limit so thousands of sockets can be held (inherited by the server process).
+    """
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def find_free_port():
+    """
+    Finds a port where both port and port + 1 (the signal port) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket() as signal_probe:
+                signal_probe.bind((HOST, port + 1))
+            return port
+        except OSError:
+            continue
+
+def process_status(pid):
+    """
+    Returns (resident memory in KB, thread count) for a process, or (None, None) off Linux.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            fields = dict(line.split(':', 1) for line in status if ':' in line)
+        return int(fields['VmRSS'].split()[0]), int(fields['Threads'])
+    except OSError:
+        return None, None
+
+async def open_client(port, index):
+    """
+    Opens the command and signal connections for one client, pairs them by session token and sends %connect.
+    """
+    reader, writer = await asyncio.open_connection(HOST, port)
+    _, signal_writer = await asyncio.open_connection(HOST, port + 1)
+    token = secrets.token_hex(8)
+    signal_writer.write(encode_frame(f"SESSION {token}"))
+    await request(reader, writer, f"%session {token}")
+    await request(reader, writer, f"%connect {HOST} {port} bench{index}")
+    return reader, writer, signal_writer
+
+async def request(reader, writer, command):
+    """
+    Sends one command and waits for its response.
+    """
+    writer.write(encode_frame(command))
+    await writer.drain()
+    (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    return await reader.readexactly(length)
+
+async def wait_for_server(port, timeout=10.0):
+    """
+    Waits until the server answers a full connect/exit round trip.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer, signal_writer = await open_client(port, 'probe')
+            await request(reader, writer, '%exit')
+            writer.close()
+            signal_writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+async def run_mode(mode, connections, duration):
+    """
+    Runs the hold-connections and commands/sec measurements against one server mode.
+    """
+    port = find_free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'socket_server.py'), '--mode', mode, '--port', str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    clients = []
+    try:
+        await wait_for_server(port)
+
+        # Phase 1: open and hold connections
+        start = time.perf_counter()
+        for index in range(connections):
+            try:
+                clients.append(await open_client(port, index))
+            except OSError as e:
+                print(f"  {mode}: connection {index} failed: {e}")
+                break
+        connect_time = time.perf_counter() - start
+        rss_kb, threads = process_status(server.pid)
+
+        # Phase 2: every held connection sends %users in a loop for the duration
+        completed = 0
+        stop_at = time.perf_counter() + duration
+
+        async def client_loop(reader, writer):
+            nonlocal completed
+            while time.perf_counter() < stop_at:
+                await request(reader, writer, '%users')
+                completed += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(reader, writer) for reader, writer, _ in clients))
+        elapsed = time.perf_counter() - start
+
+        return {
+            'mode': mode,
+            'held': len(clients),
+            'connect_per_sec': len(clients) / connect_time if connect_time else 0.0,
+            'commands_per_sec': completed / elapsed,
+            'rss_kb': rss_kb,
+            'threads': threads,
+        }
+    finally:
+        for _, writer, signal_writer in clients:
+            writer.close()
+            signal_writer.close()
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Threaded vs asyncio server benchmark")
+    parser.add_argument('--connections', type=int, default=1000, help="Clients to open and hold per mode")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds to run the commands/sec phase")
+    parser.add_argument('--modes', nargs='+', default=['threaded', 'asyncio'])
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    print(f"{'mode':<10} {'held':>6} {'connects/s':>11} {'commands/s':>11} {'server RSS':>11} {'threads':>8}")
+    for mode in args.modes:
+        result = asyncio.run(run_mode(mode, args.connections, args.duration))
+        rss = f"{result['rss_kb'] / 1024:.1f} MB" if result['rss_kb'] else "n/a"
+        threads = result['threads'] if result['threads'] is not None else "n/a"
+        print(f"{result['mode']:<10} {result['held']:>6} {result['connect_per_sec']:>11.0f} "
+              f"{result['commands_per_sec']:>11.0f} {rss:>11} {threads:>8}")
+
+if __name__ == "__main__":
+    main()
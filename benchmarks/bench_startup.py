@@ -0,0 +1,64 @@
+"""
+Measures how long the server takes to rebuild its boards on startup as history grows.
+
+For each size, logs N posts to a data directory, then times create_boards() twice: once replaying
+the whole post log, and once after a snapshot has truncated the log so only a short tail of
+--tail changes is replayed on top of the memory-mapped snapshot.
+
+Usage (from the repository root):
+    python benchmarks/bench_startup.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from socket_server import create_boards
+from snapshot import SNAPSHOT_NAME, Snapshotter
+
+def timed_startup(data_dir):
+    """
+    Returns (seconds to rebuild the boards, posts restored) for the data directory.
+    """
+    start = time.perf_counter()
+    public_board, private_boards = create_boards(data_dir=data_dir, durable=False)
+    elapsed = time.perf_counter() - start
+    public_board.log.close()
+    return elapsed, len(public_board.messages)
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time with and without snapshots")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--tail', type=int, default=1000, help="Changes logged after the snapshot")
+    args = parser.parse_args()
+
+    print(f"{'posts':>9} {'log MB':>8} {'replay s':>9} {'snapshot MB':>12} {'tail':>6} {'snapshot+tail s':>16}")
+    for size in args.sizes:
+        data_dir = tempfile.mkdtemp()
+        try:
+            public_board, private_boards = create_boards(data_dir=data_dir, durable=False)
+            for index in range(size):
+                public_board.add_post(f"user{index % 100}", "2024-12-02 16:38:44", f"subject {index}", "content " * 10)
+            public_board.log.close()
+            log_size = os.path.getsize(os.path.join(data_dir, 'posts.log'))
+            replay_seconds, _ = timed_startup(data_dir)
+
+            public_board, private_boards = create_boards(data_dir=data_dir, durable=False)
+            Snapshotter(data_dir, public_board, private_boards, public_board.log).take_snapshot()
+            for index in range(args.tail):
+                public_board.add_post("tail", "2024-12-02 16:38:44", f"tail {index}", "content " * 10)
+            public_board.log.close()
+            snapshot_size = os.path.getsize(os.path.join(data_dir, SNAPSHOT_NAME))
+            snapshot_seconds, _ = timed_startup(data_dir)
+        finally:
+            shutil.rmtree(data_dir)
+        print(f"{size:>9} {log_size / 1e6:>8.1f} {replay_seconds:>9.2f} {snapshot_size / 1e6:>12.1f} "
+              f"{args.tail:>6} {snapshot_seconds:>16.2f}")
+
+if __name__ == "__main__":
+    main()
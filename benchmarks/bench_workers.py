@@ -0,0 +1,136 @@
+"""
+Measures how multiprocess mode scales with the number of worker processes.
+
+For 1, 2, 4 and 8 workers, starts socket_server.py --mode multiprocess in a subprocess and drives
+it from several client processes, each holding a few connections that send commands back to back:
+mostly %message reads (answered by the workers' replicas) with a share of %post writes (run by
+the broker and broadcast to every worker). Reports commands/sec and p50/p99 round-trip latency.
+Gains need as many free cores as workers plus client processes.
+
+Usage (from the repository root):
+    python benchmarks/bench_workers.py --clients 8 --duration 5
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from socket_protocol import encode_frame, read_frames
+
+HOST = '127.0.0.1'
+
+def find_free_port():
+    """
+    Finds a port where both port and port + 1 (the signal port) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket() as signal_probe:
+                signal_probe.bind((HOST, port + 1))
+            return port
+        except OSError:
+            continue
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_client(number, port, connections, duration, post_every, results):
+    """
+    Client process: joins with each connection, then cycles through them sending commands until duration ends.
+    Signal connections are drained by nobody, so they exercise the server's overflow policy rather than
+    slowing the client.
+    """
+    sessions = []
+    for index in range(connections):
+        name = f"c{number}_{index}"
+        command_socket = socket.create_connection((HOST, port))
+        signal_socket = socket.create_connection((HOST, port + 1))
+        token = secrets.token_hex(8)
+        signal_socket.sendall(encode_frame(f"SESSION {token}"))
+        frames = read_frames(command_socket)
+        for command in (f"%session {token}", f"%connect {HOST} {port} {name}", "%join"):
+            command_socket.sendall(encode_frame(command))
+            next(frames)
+        sessions.append((name, command_socket, signal_socket, frames))
+    latencies = []
+    sent = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        name, command_socket, _, frames = sessions[sent % len(sessions)]
+        if post_every and sent % post_every == 0:
+            command = f"%post {name} 2024-12-02 16:38:44 Load|post {sent}"
+        else:
+            command = f"%message {sent % 2 + 1}"
+        start = time.perf_counter()
+        command_socket.sendall(encode_frame(command))
+        next(frames)
+        latencies.append(time.perf_counter() - start)
+        sent += 1
+    for _, command_socket, signal_socket, _ in sessions:
+        command_socket.close()
+        signal_socket.close()
+    results.put(latencies)
+
+def measure(workers, args):
+    port = find_free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'socket_server.py'), '--host', HOST,
+                               '--port', str(port), '--mode', 'multiprocess', '--workers', str(workers)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        time.sleep(1.0)  # Let every worker finish syncing and bind the port
+        results = multiprocessing.Queue()
+        clients = [multiprocessing.Process(target=run_client,
+                                           args=(number, port, args.connections, args.duration, args.post_every, results))
+                   for number in range(args.clients)]
+        for client in clients:
+            client.start()
+        latencies = []
+        for _ in clients:
+            latencies.extend(results.get())
+        for client in clients:
+            client.join()
+        return len(latencies) / args.duration, latencies
+    finally:
+        server.kill()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Commands/sec for 1, 2, 4 and 8 worker processes")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--clients', type=int, default=8, help="Client processes")
+    parser.add_argument('--connections', type=int, default=4, help="Connections per client process")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds of load per worker count")
+    parser.add_argument('--post-every', type=int, default=10, help="One %%post per this many commands (0: reads only)")
+    args = parser.parse_args()
+
+    print(f"{args.clients} client processes x {args.connections} connections, {os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'commands/s':>11} {'p50 ms':>7} {'p99 ms':>7}")
+    for workers in args.workers:
+        rate, latencies = measure(workers, args)
+        print(f"{workers:>7} {rate:>11.0f} {percentile(latencies, 0.5) * 1000:>7.2f} "
+              f"{percentile(latencies, 0.99) * 1000:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Offline tool that moves old posts into read-only board archives.
+
+Reads the boards' state from a server's data directory (the snapshot plus the post log, without
+modifying either, so it can run next to a live server) and writes every post except the newest
+--keep per board to an archive in <data-dir>/archive, merged with what earlier runs archived.
+On its next start the server reads those posts from the memory-mapped archives instead of
+loading them into memory.
+
+Usage (from the repository root):
+    python build_archive.py --data-dir ./data --keep 10000
+"""
+import argparse
+import os
+from archive import ARCHIVE_DIR_NAME, ArchiveSet, archive_name, write_archive
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from post_log import POST_LOG_NAME, replay_log
+from snapshot import SNAPSHOT_NAME, load_snapshot
+
+def build_archives(data_dir, keep, archive_dir=None):
+    """
+    Archives all but the newest keep posts of every board found in data_dir.
+    Returns a list of (archive file name, posts in the archive) for the archives written.
+    """
+    public_board = BulletinBoard()
+    private_boards = GroupRegistry()
+    snapshot_seq = load_snapshot(os.path.join(data_dir, SNAPSHOT_NAME), public_board, private_boards)
+    # Read-only replay: a server may be appending to the log right now, so a partial last record is just skipped
+    replay_log(os.path.join(data_dir, POST_LOG_NAME), public_board, private_boards, after_seq=snapshot_seq,
+               repair=False)
+
+    archive_dir = archive_dir or os.path.join(data_dir, ARCHIVE_DIR_NAME)
+    os.makedirs(archive_dir, exist_ok=True)
+    archives = ArchiveSet(archive_dir)
+    written = []
+    boards = [(None, public_board)] + [(board.group_id, board) for board in private_boards]
+    for group_id, board in boards:
+        cutoff = board.last_message_id - keep
+        # Posts archived by earlier runs are no longer in the snapshot, so start from the existing archive
+        messages = {}
+        existing = archives.open(group_id)
+        if existing:
+            messages = {message['id']: message for message in existing}
+            existing.close()
+        for message in board.messages:
+            if message['id'] > cutoff:
+                break
+            messages.setdefault(message['id'], message)
+        if not messages:
+            continue
+        name = archive_name(group_id)
+        write_archive(os.path.join(archive_dir, name), [messages[message_id] for message_id in sorted(messages)])
+        written.append((name, len(messages)))
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old posts from a data directory into board archives")
+    parser.add_argument('--data-dir', required=True, help="Data directory of the server (as given to socket_server.py)")
+    parser.add_argument('--keep', type=int, default=1000, help="Newest posts per board left out of the archive")
+    parser.add_argument('--archive-dir', help="Where to write the archives (default: <data-dir>/archive)")
+    args = parser.parse_args()
+    for name, count in build_archives(args.data_dir, args.keep, args.archive_dir):
+        print(f"{name}: {count} posts")
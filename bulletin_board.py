@@ -1,14 +1,32 @@
 import itertools
+from archive import page_messages
+from message_store import open_message_store
+from search_index import SearchIndex
+from welcome_cache import WelcomeCache
 
 class BulletinBoard:
-    def __init__(self):
+    def __init__(self, log=None, retention=None, archives=None):
+        self.log = log  # Optional PostLog that persists every change to this board
         self.users = {}  # Store users in a dictionary for quick access
-        self.messages = [
+        self.users_version = 0  # Bumped whenever a user joins or leaves, so clients can revalidate %users
+        self.archive = archives.open() if archives else None  # Read-only archive of older posts, or None
+        self.messages = open_message_store('public', [
             {'id': 1, 'sender': 'user1', 'date': '2024-12-02 16:38:44', 'subject': 'subj here', 'content': 'hello world'},
             {'id': 2, 'sender': 'user2', 'date': '2024-12-02 16:46:45', 'subject': 'another one', 'content': 'hello world again'}
-        ]  # List to store public messages, starting with two example messages
+        ], retention, self.archive)  # Columnar store of public messages by ID, starting with two example messages
+        self.search_index = SearchIndex()  # Words of every post's subject and content, for %search
+        for message in self.messages:
+            self.search_index.add(message['id'], message['subject'], message['content'])
         self.groups = {}  # Dictionary to store groups with members and messages
         self.message_counter = itertools.count(3)  # To assign unique message IDs (starting at 3)
+        self.last_message_id = 2  # Highest message ID handed out so far
+        self.welcome = WelcomeCache(self.build_welcome)  # Payload sent after %join, rebuilt only after changes
+        if self.archive and self.archive.last_id > self.last_message_id:
+            # Number new posts after the archived ones
+            self.last_message_id = self.archive.last_id
+            self.message_counter = itertools.count(self.archive.last_id + 1)
+        # Archived posts stay searchable through the archive's own postings, without being indexed here
+        self.search_index.archive = self.archive
 
     def add_user(self, user):
         """
@@ -16,6 +34,10 @@ class BulletinBoard:
         """
         if user not in self.users:
             self.users[user] = {'groups': set()}
+            self.users_version += 1
+            self.welcome.invalidate()
+            if self.log:
+                self.log.append({'type': 'join', 'user': user})
             return f"{user} joined the public bulletin board."
         return f"{user} is already a member."
 
@@ -30,6 +52,10 @@ class BulletinBoard:
                 if not self.groups[group]['members']:  # Remove group if empty
                     del self.groups[group]
             del self.users[user]  # Finally, remove the user from the board
+            self.users_version += 1
+            self.welcome.invalidate()
+            if self.log:
+                self.log.append({'type': 'leave', 'user': user})
             return f"{user} removed successfully."
         return f"{user} is not found."
 
@@ -38,27 +64,76 @@ class BulletinBoard:
         Creates a new message with a unique ID and saves it.
         """
         message_id = next(self.message_counter)
-        message = {
-            'id': message_id,
-            'sender': sender,
-            'date': post_date,
-            'subject': subject,
-            'content': content
-        }
-        self.messages.append(message)  # Save the message directly here
+        self.messages.add(message_id, sender, post_date, subject, content)  # Stored by ID, so lookups don't scan
+        self.search_index.add(message_id, subject, content)
+        self.last_message_id = max(self.last_message_id, message_id)
+        self.welcome.invalidate()
+        if self.log:
+            self.log.append({'type': 'post', 'group': None, 'id': message_id, 'sender': sender, 'date': post_date,
+                             'subject': subject, 'content': content})
         return message_id
 
+    def restore_post(self, message):
+        """
+        Re-adds a post recovered from the log, keeping its original ID. Posts that are already present are skipped,
+        as are archived posts, which are read (and searched) from the archive instead.
+        """
+        if self.archive and message['id'] in self.archive:
+            return False
+        if not self.messages.add(message['id'], message['sender'], message['date'], message['subject'], message['content']):
+            return False
+        self.search_index.add(message['id'], message['subject'], message['content'])
+        self.welcome.invalidate()
+        if message['id'] > self.last_message_id:
+            # Continue numbering after the highest recovered ID
+            self.last_message_id = message['id']
+            self.message_counter = itertools.count(message['id'] + 1)
+        return True
+
     def list_users(self):
         """
         Returns a list of usernames currently on the bulletin board.
         """
         return list(self.users.keys())
 
+    def build_welcome(self):
+        """
+        Returns the text sent after a %join response: the active users and the two latest messages.
+        """
+        return (
+            f" Users active on this board: {self.list_users()}"
+            f"\n{self.get_message_content(self.last_message_id)}"
+            f"\n{self.get_message_content(self.last_message_id - 1)}"
+        )
+
+    def find_message(self, message_id):
+        """
+        Returns the message with the given ID as a dict, from memory or the archive, or None.
+        """
+        message = self.messages.get(message_id)
+        if message is None and self.archive:
+            message = self.archive.get(message_id)
+        return message
+
     def get_message_content(self, message_id):
         """
         Finds and returns the content of a message with the given ID.
         """
-        for message in self.messages:
-            if message['id'] == message_id:
-                return f"{message['sender']} on {message['date']}: {message['content']}"
-        return None
\ No newline at end of file
+        message = self.find_message(message_id)
+        if message:
+            return f"{message['sender']} on {message['date']}: {message['content']}"
+        return None
+
+    def get_messages(self, from_id, count):
+        """
+        Returns a page of up to count messages starting at from_id and the ID the next page starts at (0 at the end).
+        """
+        return page_messages(self.messages, self.archive, from_id, count)
+
+    def search_messages(self, query, offset, count):
+        """
+        Returns up to count messages containing every word of query, newest first, starting at the offset-th match,
+        and the offset the next page starts at (0 when there are no more matches).
+        """
+        message_ids, next_offset = self.search_index.search(query, offset, count)
+        return [self.find_message(message_id) for message_id in message_ids], next_offset
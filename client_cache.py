@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from socket_protocol import parse_listing
+
+# Most posts one connection keeps; the least recently read are dropped first
+MAX_CACHED_POSTS = 10000
+
+class ResponseCache:
+    """
+    What a client has already been told by the server, kept for the life of one connection.
+    Posts never change once written, so a %message or %groupmessage response is kept by board and message ID
+    and not asked for again. Listings (%users, %groups, %groupusers) do change, so each is kept with the version
+    the server sent it at; asking again names that version, and the server only resends a listing that changed.
+    """
+    def __init__(self, max_posts=MAX_CACHED_POSTS):
+        self.posts = OrderedDict()  # (group ID or None for the public board, message ID) -> response
+        self.max_posts = max_posts
+        self.listings = {}  # listing key -> (version, listing)
+        self.hits = 0  # Posts answered from the cache
+        self.not_modified = 0  # Listings the server confirmed unchanged
+        self.misses = 0  # Requests the server answered in full
+
+    def get_post(self, key):
+        """
+        Returns the cached response for a post, or None.
+        """
+        response = self.posts.get(key)
+        if response is not None:
+            self.posts.move_to_end(key)
+            self.hits += 1
+        return response
+
+    def store_post(self, key, response):
+        """
+        Keeps a post's response. Only successful responses may be stored: a missing post can appear later.
+        """
+        self.misses += 1
+        self.posts[key] = response
+        self.posts.move_to_end(key)
+        if len(self.posts) > self.max_posts:
+            self.posts.popitem(last=False)
+
+    def listing_version(self, key):
+        """
+        Returns the version of the cached listing, or "" if there is none (which still asks for a versioned reply).
+        """
+        cached = self.listings.get(key)
+        return cached[0] if cached else ""
+
+    def resolve_listing(self, key, response):
+        """
+        Takes the server's response to a listing request and returns the listing to show: the cached one if the
+        server replied NOT_MODIFIED, otherwise the new one, which is cached. Responses that aren't versioned
+        (errors, or a server that doesn't version this listing) are returned as they are.
+        """
+        listing = parse_listing(response) if response is not None else None
+        if listing is None:
+            return response
+        version, text = listing
+        cached = self.listings.get(key)
+        if text is None:
+            if cached and cached[0] == version:
+                self.not_modified += 1
+                return cached[1]
+            # Can't happen while the server answers in order; show the reply rather than a wrong listing
+            return response
+        self.misses += 1
+        self.listings[key] = (version, text)
+        return text
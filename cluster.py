@@ -0,0 +1,537 @@
+import bisect
+import hashlib
+import itertools
+import json
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import socket_server
+from bulletin_board import BulletinBoard
+from multiprocess_server import RemoteSession
+from private_board import PrivateBoard
+from socket_protocol import FRAME_HEADER, MAX_FRAME_SIZE, FrameDecoder, encode_frame, read_frames
+from socket_server import client_sessions, deliver_signal, execute_command, format_signal, log_position
+from socket_server import set_session_username, signal_sessions, subscribers, wait_until_durable
+
+# Each node serves clients on its port and signals on port + 1; other nodes connect to it on port + 2
+PEER_PORT_OFFSET = 2
+# Points each node gets on the hash ring; more points spread the boards more evenly
+RING_REPLICAS = 128
+# Largest message on a node link; a reply wraps a response of up to MAX_FRAME_SIZE
+LINK_MAX_FRAME_SIZE = 2 * MAX_FRAME_SIZE
+# Seconds between attempts to connect to a node that is down
+RECONNECT_DELAY = 0.5
+# Seconds a forwarded command may take before its node is reported unavailable
+REQUEST_TIMEOUT = 30.0
+# Threads running the commands other nodes forward to this one
+FORWARDED_COMMAND_THREADS = 32
+
+# Commands on the public board, which is placed on the ring like a group
+PUBLIC_COMMANDS = frozenset(['%join', '%post', '%users', '%leave', '%message', '%messages', '%search'])
+# Group commands -> position of the group ID in their parameters
+GROUP_ID_PARAMS = {
+    '%groupjoin': 0, '%groupremove': 0, '%grouppost': 2, '%groupusers': 0, '%groupleave': 0,
+    '%groupmessage': 0, '%groupmessages': 0, '%groupsearch': 0
+}
+
+def group_key(group_id):
+    return f'group-{group_id}'
+
+def command_board_key(command, params):
+    """
+    Returns the ring key of the board a command works on ('public' or 'group-<ID>'), or None when the command
+    names no board, or names it by something other than an ID (the receiving node reports the error).
+    """
+    if command in PUBLIC_COMMANDS:
+        return 'public'
+    position = GROUP_ID_PARAMS.get(command)
+    if position is None or len(params) <= position:
+        return None
+    group = params[position].strip()
+    return group_key(int(group)) if group.isdigit() else None
+
+def peer_address(node):
+    """
+    Returns the address other nodes connect to for a node named 'host:port' (its client address).
+    """
+    host, port = node.rsplit(':', 1)
+    return host, int(port) + PEER_PORT_OFFSET
+
+def pack_peer_message(message):
+    """
+    Frames a message (a list starting with its kind) for a node link. Nodes may run on different machines,
+    so messages are JSON rather than pickles.
+    """
+    payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def read_peer_messages(sock):
+    """
+    Yields the messages received on a node link until it closes.
+    """
+    for frame in read_frames(sock, FrameDecoder(LINK_MAX_FRAME_SIZE)):
+        yield json.loads(frame)
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class HashRing:
+    """
+    Consistent hash ring of node names. Every node gets RING_REPLICAS points on the ring and owns the keys
+    hashing up to each of its points, so adding or removing a node only moves the keys next to its points.
+    Every node builds the same ring from the same node list, so they all agree on where a board lives.
+    """
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.nodes = sorted(set(nodes))
+        if not self.nodes:
+            raise ValueError("A cluster needs at least one node.")
+        points = sorted((ring_hash(f'{node}#{replica}'), node) for node in self.nodes for replica in range(replicas))
+        self.hashes = [point for point, _ in points]
+        self.owners = [node for _, node in points]
+
+    def owner(self, key):
+        """
+        Returns the name of the node that holds the board with the given key.
+        """
+        position = bisect.bisect(self.hashes, ring_hash(key))
+        return self.owners[position % len(self.owners)]
+
+class PeerLink:
+    """
+    This node's connection to another node. Carries this node's requests, answered on the same connection, and
+    one-way presence and signal messages. A background thread keeps it connected and sends the users of this
+    node's sessions on every (re)connect, so the other node can route signals here.
+    """
+    def __init__(self, node, peer):
+        self.node = node
+        self.peer = peer
+        self.sock = None  # None while disconnected
+        self.send_lock = threading.Lock()
+        self.request_ids = itertools.count(1)
+        self.pending = {}  # request ID -> [Event set when the reply arrives, (ok, value)]
+
+    def run(self):
+        while True:
+            try:
+                sock = socket.create_connection(peer_address(self.peer))
+            except OSError:
+                time.sleep(RECONNECT_DELAY)
+                continue
+            # Requests and replies are small and latency-bound, so don't let Nagle hold them back
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            try:
+                with self.node.lock:
+                    # Held until the link is live, so no presence change falls between the list and later updates
+                    sock.sendall(pack_peer_message(['hello', self.node.name, dict(self.node.user_counts)]))
+                    with self.send_lock:
+                        self.sock = sock
+                print(f"[*] Connected to node {self.peer}")
+                self._read(sock)
+            except OSError as e:
+                print(f"Node link error: {e}")
+            with self.send_lock:
+                self.sock = None
+            sock.close()
+            # Requests still waiting on the lost connection won't get a reply
+            for request_id in list(self.pending):
+                self._resolve(request_id, False, ['unavailable', f"Node {self.peer} is unavailable."])
+            time.sleep(RECONNECT_DELAY)
+
+    def _read(self, sock):
+        try:
+            for _, request_id, ok, value in read_peer_messages(sock):
+                self._resolve(request_id, ok, value)
+        except ValueError as e:
+            print(f"Node link error: {e}")
+
+    def _resolve(self, request_id, ok, value):
+        waiter = self.pending.pop(request_id, None)
+        if waiter:
+            waiter[1] = (ok, value)
+            waiter[0].set()
+
+    def send(self, message):
+        """
+        Sends a message to the node. Raises OSError if it is not connected.
+        """
+        data = pack_peer_message(message)
+        with self.send_lock:
+            if self.sock is None:
+                raise OSError(f"Node {self.peer} is unavailable.")
+            self.sock.sendall(data)
+
+    def request(self, *request):
+        """
+        Sends a request to the node and returns the value of its reply, raising the error it reported
+        (or OSError when the node can't be reached).
+        """
+        request_id = next(self.request_ids)
+        waiter = self.pending[request_id] = [threading.Event(), None]
+        try:
+            self.send(['request', request_id, *request])
+        except OSError:
+            self.pending.pop(request_id, None)
+            raise OSError(f"Node {self.peer} is unavailable.")
+        if not waiter[0].wait(REQUEST_TIMEOUT):
+            self.pending.pop(request_id, None)
+            raise OSError(f"Node {self.peer} is unavailable.")
+        ok, value = waiter[1]
+        if ok:
+            return value
+        kind, text = value
+        if kind == 'ValueError':
+            # Raised again here, so the client is handled as if the command had run on this node
+            raise ValueError(text)
+        if kind == 'unavailable':
+            raise OSError(text)
+        raise RuntimeError(text)
+
+class ClusterNode:
+    """
+    One server node of a cluster. The public board and every group are placed on a node by consistent hashing,
+    and only that node holds them; a command for a board held elsewhere is forwarded to its node and the reply
+    passed back, so clients can connect to any node. A board's signals are sent to each node that has sessions
+    of its members, naming just those members, so the receiving node never needs the board itself.
+    """
+    def __init__(self, name, ring, public_board, private_boards):
+        if name not in ring.nodes:
+            raise ValueError(f"Node '{name}' is not one of the cluster's nodes {ring.nodes}.")
+        self.name = name
+        self.ring = ring
+        self.public_board = public_board
+        self.private_boards = private_boards
+        self.links = {peer: PeerLink(self, peer) for peer in ring.nodes if peer != name}
+        self.lock = threading.Lock()  # Guards the user counts, session numbers and peer users
+        self.user_counts = Counter()  # username -> sessions on this node using it
+        self.usernames = {}  # client socket -> username, for sessions on this node
+        self.session_numbers = {}  # client socket -> number naming the session to other nodes
+        self.sessions_by_number = {}  # number -> client socket
+        self.session_counter = itertools.count(1)
+        self.peer_users = {}  # node name -> Counter of the usernames of its sessions
+        self.next_group_id = 1  # Lowest ID to try for the next group created through this node
+        self.create_lock = threading.Lock()  # Makes checking and creating a group on its node one step
+        self.local = threading.local()  # Marks threads running a command on this node's own boards
+        self.executor = ThreadPoolExecutor(FORWARDED_COMMAND_THREADS)
+
+    def start(self, listener):
+        """
+        Accepts other nodes' links on listener and starts connecting to every other node.
+        """
+        threading.Thread(target=self.serve, args=(listener,), daemon=True).start()
+        for link in self.links.values():
+            threading.Thread(target=link.run, daemon=True).start()
+
+    def owns(self, key):
+        return self.ring.owner(key) == self.name
+
+    def serve(self, listener):
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=self.handle_peer, args=(sock,), daemon=True).start()
+
+    def handle_peer(self, sock):
+        """
+        Serves another node's link: tracks the users of its sessions, delivers its signals to the clients
+        connected here and answers its requests.
+        """
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        send_lock = threading.Lock()
+        peer = users = None
+        try:
+            for message in read_peer_messages(sock):
+                kind = message[0]
+                if kind == 'hello':
+                    _, peer, counts = message
+                    users = Counter(counts)
+                    with self.lock:
+                        self.peer_users[peer] = users
+                elif kind == 'presence':
+                    self._update_presence(users, *message[1:])
+                elif kind == 'signal':
+                    self._deliver(*message[1:])
+                elif kind == 'request':
+                    self.executor.submit(self._answer, peer, sock, send_lock, message[1], message[2:])
+        except (OSError, ValueError) as e:
+            print(f"Node link error: {e}")
+        finally:
+            with self.lock:
+                # Unless the node has reconnected meanwhile, its users are unknown until it does
+                if peer and self.peer_users.get(peer) is users:
+                    del self.peer_users[peer]
+            sock.close()
+
+    def _answer(self, peer, sock, send_lock, request_id, request):
+        kind = request[0]
+        try:
+            if kind == 'execute':
+                value = self._execute_for(peer, *request[1:])
+            elif kind == 'find':
+                value = self.private_boards.get_by_name(request[1]) is not None
+            elif kind == 'groups':
+                value = self._local_groups()
+            elif kind == 'create':
+                value = self._create_group_here(*request[1:])
+            else:
+                raise ValueError(f"Unknown request '{kind}'.")
+            reply = ['reply', request_id, True, value]
+        except Exception as e:
+            reply = ['reply', request_id, False, [type(e).__name__, str(e)]]
+        data = pack_peer_message(reply)
+        with send_lock:
+            try:
+                sock.sendall(data)
+            except OSError:
+                pass  # The node is gone; its pending requests fail on its side
+
+    def forwards(self, command, params):
+        """
+        Tells whether a command has to involve other nodes: its board is held elsewhere, it names a group that
+        has to be looked up, or it lists or creates groups.
+        """
+        if getattr(self.local, 'here', False):
+            return False
+        if command in ('%groups', '%groupcreate'):
+            return True
+        if command == '%groupjoin' and len(params) == 1 and not params[0].strip().isdigit():
+            return True  # Joined by name, and only the group's node knows it
+        key = command_board_key(command, params)
+        return key is not None and not self.owns(key)
+
+    def execute(self, client_socket, command, params):
+        """
+        Runs a command that involves other nodes and returns its response.
+        """
+        try:
+            if command == '%groups':
+                return self.list_groups()
+            if command == '%groupcreate' and len(params) == 1:
+                return self.create_group(params[0])
+            key = command_board_key(command, params)
+            if command == '%groupjoin' and len(params) == 1 and key is None:
+                owner = self.locate_group(params[0].strip())
+            else:
+                owner = self.ring.owner(key) if key else None
+            if owner is None or owner == self.name:
+                return self.run_here(client_socket, command, params)
+            return self.forward(owner, client_socket, command, params)
+        except OSError as e:
+            return f"Error: {e}"
+
+    def run_here(self, client_socket, command, params):
+        """
+        Runs a command against this node's boards.
+        """
+        self.local.here = True
+        try:
+            return execute_command(client_socket, command, params, self.public_board, self.private_boards)
+        finally:
+            self.local.here = False
+
+    def forward(self, owner, client_socket, command, params):
+        """
+        Runs a command on the node holding its board, updating the session's username if it changed.
+        """
+        session = client_sessions[client_socket]
+        response, username = self.links[owner].request('execute', self._session_number(client_socket),
+                                                       session.get('username'), command, params)
+        if username != session.get('username'):
+            set_session_username(client_socket, username)
+        return response
+
+    def _execute_for(self, peer, number, username, command, params):
+        # Runs a command forwarded by another node for one of its sessions, answering once its changes are durable
+        session = RemoteSession(f'{peer}/{number}')
+        client_sessions[session] = {'username': username}
+        position = log_position()
+        try:
+            response = self.run_here(session, command, params)
+        finally:
+            username = client_sessions.pop(session)['username']
+        if not wait_until_durable(position):
+            response = "Error: The change could not be saved."
+        if isinstance(response, bytes):
+            response = response.decode('utf-8')
+        return [response, username]
+
+    def _session_number(self, client_socket):
+        with self.lock:
+            number = self.session_numbers.get(client_socket)
+            if number is None:
+                number = self.session_numbers[client_socket] = next(self.session_counter)
+                self.sessions_by_number[number] = client_socket
+            return number
+
+    def locate_group(self, group_name):
+        """
+        Returns the name of the node holding the group with the given name, or None if no node has it.
+        """
+        if self.private_boards.get_by_name(group_name):
+            return self.name
+        for peer, link in self.links.items():
+            if link.request('find', group_name):
+                return peer
+        return None
+
+    def _local_groups(self):
+        return [[board.group_id, board.group_name] for board in self.private_boards]
+
+    def list_groups(self):
+        """
+        Answers %groups with the groups of every node, in group ID order.
+        """
+        groups = self._local_groups()
+        for link in self.links.values():
+            groups.extend(link.request('groups'))
+        if not groups:
+            return "No groups available."
+        return "\n".join(f"ID: {group_id}, Name: {group_name}" for group_id, group_name in sorted(groups))
+
+    def create_group(self, group_name):
+        """
+        Answers %groupcreate: picks a group ID and creates the group on the node that ID hashes to.
+        Two nodes creating the same name at the same moment can both succeed, since names are only checked
+        on every node beforehand.
+        """
+        if self.locate_group(group_name):
+            return f"Error: Group '{group_name}' already exists."
+        while True:
+            group_id = self._next_group_id()
+            owner = self.ring.owner(group_key(group_id))
+            if owner == self.name:
+                result = self._create_group_here(group_name, group_id)
+            else:
+                result = self.links[owner].request('create', group_name, group_id)
+            if result == 'created':
+                return f"Created group {group_id}: {group_name}."
+            if result == 'name_taken':
+                return f"Error: Group '{group_name}' already exists."
+            # The ID is taken (e.g. it was handed out before this node restarted), so try the next one
+
+    def _next_group_id(self):
+        # Each node draws IDs from its own residue class, so nodes creating groups at once pick different IDs
+        with self.lock:
+            node_count = len(self.ring.nodes)
+            group_id = max(self.next_group_id, PrivateBoard.last_group_id + 1)
+            group_id += (self.ring.nodes.index(self.name) - group_id) % node_count
+            self.next_group_id = group_id + node_count
+            return group_id
+
+    def _create_group_here(self, group_name, group_id):
+        # Runs on the node group_id hashes to
+        with self.create_lock:
+            if group_id in self.private_boards:
+                return 'id_taken'
+            if self.private_boards.get_by_name(group_name):
+                return 'name_taken'
+            self.private_boards.create_group(group_name, group_id)
+            return 'created'
+
+    def publish_session(self, client_socket, username):
+        """
+        Counts the session under its new username and tells every other node, so they route signals for
+        that user here.
+        """
+        if isinstance(client_socket, RemoteSession):
+            return  # Another node's session, mirrored while one of its commands runs here
+        with self.lock:
+            old = self.usernames.pop(client_socket, None)
+            if username:
+                self.usernames[client_socket] = username
+            else:
+                # Ended (or left); a new number is handed out if it forwards again
+                number = self.session_numbers.pop(client_socket, None)
+                self.sessions_by_number.pop(number, None)
+            if old == username:
+                return
+            if old:
+                self._uncount(self.user_counts, old)
+            if username:
+                self.user_counts[username] += 1
+            self._send_all(['presence', old, username])
+
+    def _update_presence(self, users, old, username):
+        with self.lock:
+            if old:
+                self._uncount(users, old)
+            if username:
+                users[username] += 1
+
+    @staticmethod
+    def _uncount(counts, username):
+        counts[username] -= 1
+        if counts[username] <= 0:
+            del counts[username]
+
+    def _send_all(self, message):
+        # Called with the lock held; a node that is down gets the full user list when it reconnects
+        for link in self.links.values():
+            try:
+                link.send(message)
+            except OSError:
+                pass
+
+    def publish_signal(self, sender_socket, signal_code, kwargs):
+        """
+        Delivers a signal to the recipients connected here and sends it to every node with recipients,
+        naming only the members connected to that node.
+        """
+        deliver_signal(signal_sessions.get(sender_socket), signal_code, **kwargs)
+        signal = format_signal(signal_code, **kwargs)
+        if signal is None:
+            return
+        message, coalesce_key = signal
+        target_board = kwargs.get('target_board')
+        if isinstance(target_board, PrivateBoard):
+            members = target_board.members
+        elif isinstance(target_board, BulletinBoard):
+            members = target_board.users
+        else:
+            members = None  # Everyone
+        # Lets the sender's node leave the sender out
+        sender = sender_socket.token if isinstance(sender_socket, RemoteSession) else None
+        with self.lock:
+            for peer, link in self.links.items():
+                recipients = None
+                if members is not None:
+                    recipients = list(self.peer_users.get(peer, {}).keys() & members)
+                    if not recipients:
+                        continue
+                try:
+                    link.send(['signal', message, coalesce_key, recipients, sender])
+                except OSError:
+                    pass
+
+    def _deliver(self, message, coalesce_key, recipients, sender):
+        # Delivers a signal sent by the node holding its board to the given users' sessions here (None: everyone)
+        sender_outbox = None
+        if sender:
+            origin, _, number = sender.rpartition('/')
+            if origin == self.name:
+                with self.lock:
+                    client_socket = self.sessions_by_number.get(int(number))
+                sender_outbox = signal_sessions.get(client_socket)
+        if recipients is None:
+            outboxes = list(signal_sessions.values())
+        else:
+            outboxes = subscribers.outboxes_for(recipients)
+        payload = encode_frame(message)
+        coalesce_key = tuple(coalesce_key) if coalesce_key else None
+        for outbox in outboxes:
+            if outbox is not sender_outbox:
+                outbox.put(payload, coalesce_key)
+
+def start_cluster_node(name, ring, public_board, private_boards):
+    """
+    Starts this server's node of the cluster: listens for the other nodes on its peer port, connects to them and
+    makes the node the server's coordinator. Clients are then served by the threaded engine.
+    """
+    node = ClusterNode(name, ring, public_board, private_boards)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(peer_address(name))
+    listener.listen(len(ring.nodes) * 2)
+    node.start(listener)
+    socket_server.coordinator = node
+    return node
@@ -0,0 +1,86 @@
+import threading
+from private_board import PrivateBoard
+
+class GroupRegistry:
+    """
+    Keeps every private board indexed by group ID and by group name so group commands never scan.
+    Iterating the registry yields the boards in creation (group ID) order.
+    """
+    def __init__(self, group_names=(), log=None, retention=None, archives=None):
+        self.log = log  # Optional PostLog shared with every board in the registry
+        self.retention = retention  # Optional Retention bounding each board's in-memory messages
+        self.archives = archives  # Optional ArchiveSet the boards read their archived posts from
+        self.boards_by_id = {}  # group_id -> PrivateBoard
+        self.boards_by_name = {}  # group_name -> PrivateBoard
+        self.version = 0  # Bumped whenever a group is created or removed, so clients can revalidate %groups
+        self.lock = threading.Lock()  # Held while creating or removing a group, so the name check can't race
+        for group_name in group_names:
+            self.create_group(group_name)
+
+    def create_group(self, group_name, group_id=None):
+        """
+        Creates a new private board with a unique name and returns it.
+        group_id is only given when recreating a group recovered from the log.
+        Raises ValueError if a group with that name already exists.
+        """
+        with self.lock:
+            if group_name in self.boards_by_name:
+                raise ValueError(f"Group '{group_name}' already exists.")
+            board = PrivateBoard(group_name, group_id, log=self.log, retention=self.retention, archives=self.archives)
+            self.boards_by_id[board.group_id] = board
+            self.boards_by_name[group_name] = board
+            self.version += 1
+            if self.log:
+                self.log.append({'type': 'group_create', 'group': board.group_id, 'name': group_name})
+        return board
+
+    def remove_group(self, group_id):
+        """
+        Removes the group with the given ID and returns its board, or None if it doesn't exist.
+        """
+        with self.lock:
+            board = self.boards_by_id.pop(group_id, None)
+            if board:
+                del self.boards_by_name[board.group_name]
+                self.version += 1
+                if self.log:
+                    self.log.append({'type': 'group_remove', 'group': group_id})
+        return board
+
+    def attach_log(self, log):
+        """
+        Starts persisting changes to this registry and all of its boards in the given log.
+        """
+        self.log = log
+        for board in self.boards_by_id.values():
+            board.log = log
+
+    def get(self, group_id):
+        """
+        Returns the board with the given group ID, or None.
+        """
+        return self.boards_by_id.get(group_id)
+
+    def get_by_name(self, group_name):
+        """
+        Returns the board with the given group name, or None.
+        """
+        return self.boards_by_name.get(group_name)
+
+    def resolve(self, group):
+        """
+        Finds a board from user input that is either a numeric group ID or a group name.
+        """
+        group = group.strip()
+        if group.isdigit():
+            return self.get(int(group))
+        return self.get_by_name(group)
+
+    def __iter__(self):
+        return iter(list(self.boards_by_id.values()))
+
+    def __len__(self):
+        return len(self.boards_by_id)
+
+    def __contains__(self, group_id):
+        return group_id in self.boards_by_id
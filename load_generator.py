@@ -0,0 +1,338 @@
+"""
+Load generator that drives simulated clients through the real protocol against a bulletin board server.
+
+Each simulated client connects like socket_client.py (a command and a signal connection, or one connection
+with --multiplex), sends %connect with its own username and then runs the scenario's phases, one command at a
+time. Every command is timed from sending it until its response arrives. Signals are timestamped as they
+arrive: each %post and %grouppost carries a unique subject and each %join a unique username, so the lag from
+sending one to every other client receiving its signal is measured too. Each client draws its choices from a
+random generator seeded with --seed and its number, so runs with the same arguments send the same commands.
+All clients run on one event loop in this process, so with thousands of clients its own work shows up in the
+measured latencies; run several generators to push a server harder.
+
+Scenarios:
+    join-storm   every client connects, joins the public board and joins a group at the same moment
+    post-heavy   every client joins, then each posts --commands times, reading a post back every few posts
+    many-groups  --groups groups are created, each client joins --groups-per-client of them, then each
+                 posts --commands times to its groups
+
+Usage (from the repository root):
+    python load_generator.py --scenario post-heavy --clients 100 --commands 50 --start-server
+    python load_generator.py --scenario join-storm --clients 1000 --start-server --mode asyncio --multiplex
+    python load_generator.py --scenario many-groups --host 127.0.0.1 --port 5000
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from socket_client import ServerConnection, receive_response, send_command
+from socket_protocol import SIGNAL_CHANNEL, encode_frame
+
+# Scenarios selectable with --scenario
+SCENARIOS = ('join-storm', 'post-heavy', 'many-groups')
+# Signals whose delivery lag is measured, and how each names what was sent
+LAG_SIGNALS = ('JOIN_SIGNAL', 'POST_SIGNAL', 'GROUP_POST_SIGNAL')
+# A post-heavy client reads a post back after every this many posts
+POSTS_PER_READ = 4
+# Groups every server starts with (socket_server.DEFAULT_GROUP_NAMES), joined by join-storm clients
+DEFAULT_GROUP_COUNT = 5
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class LoadStats:
+    """
+    What a run measured: each command's latencies, its error responses, and each signal's delivery lag.
+    """
+    def __init__(self):
+        self.latencies = defaultdict(list)  # command -> seconds from sending it to its response
+        self.errors = Counter()  # command -> responses that were errors
+        self.sent_at = {}  # post subject or joining username -> when it was sent
+        self.lags = defaultdict(list)  # signal code -> seconds from sending to each recipient receiving it
+        self.phases = []  # (phase name, commands, seconds)
+
+    def signal_received(self, message):
+        """
+        Records the delivery lag of a signal whose command this run sent.
+        """
+        code, _, rest = message.partition(" ")
+        if code not in LAG_SIGNALS:
+            return
+        # Post summaries end with the subject, which names the post
+        key = rest if code == 'JOIN_SIGNAL' else rest.rpartition("Subject: ")[2]
+        sent = self.sent_at.get(key)
+        if sent is not None:
+            self.lags[code].append(time.perf_counter() - sent)
+
+class LoadConnection(ServerConnection):
+    """
+    A client connection whose signals are recorded in the run's stats instead of printed.
+    """
+    def __init__(self, stats, *streams):
+        super().__init__(*streams)
+        self.stats = stats
+
+    def _dispatch(self, channel, payload):
+        if channel == SIGNAL_CHANNEL:
+            self.stats.signal_received(payload.decode('utf-8').strip())
+        else:
+            super()._dispatch(channel, payload)
+
+class LoadClient:
+    """
+    One simulated client. Sends one command at a time and times each.
+    """
+    def __init__(self, number, stats, seed):
+        self.number = number
+        self.username = f"load{number}"
+        self.stats = stats
+        self.random = random.Random(f"{seed}-{number}")
+        self.connection = None
+        self.posts = 0  # Posts sent, numbering their subjects
+        self.last_message_id = 2  # Newest public post this client knows of (the board starts with two)
+        self.groups = []  # Group IDs this client joined
+
+    async def connect(self, host, port, multiplexed):
+        """
+        Opens the client's connection(s) and sends %connect. A split client's two connections are paired by the
+        session token it sends on both.
+        """
+        start = time.perf_counter()
+        if multiplexed:
+            reader, writer = await asyncio.open_connection(host, port)
+            self.connection = LoadConnection(self.stats, reader, writer)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+            signal_reader, signal_writer = await asyncio.open_connection(host, port + 1)
+            token = secrets.token_hex(8)
+            signal_writer.write(encode_frame(f"SESSION {token}"))
+            self.connection = LoadConnection(self.stats, reader, writer, signal_reader, signal_writer)
+            send_command(self.connection, '%session', token)
+            await receive_response(self.connection)
+        self.stats.latencies['connect'].append(time.perf_counter() - start)
+        await self.command(f"%connect {host} {port} {self.username}")
+
+    async def command(self, text, key=None):
+        """
+        Sends one command and returns its response. key names what the command's signal will carry, so its
+        delivery lag can be measured.
+        """
+        command = text.split(maxsplit=1)[0]
+        start = time.perf_counter()
+        if key is not None:
+            self.stats.sent_at[key] = start
+        send_command(self.connection, text)
+        response = await receive_response(self.connection)
+        self.stats.latencies[command].append(time.perf_counter() - start)
+        if response is None or response.startswith("Error"):
+            self.stats.errors[command] += 1
+        return response
+
+    async def join(self):
+        await self.command("%join", key=self.username)
+
+    async def post(self):
+        self.posts += 1
+        subject = f"{self.username}-{self.posts}"
+        response = await self.command(f"%post {self.username} 2024-12-02 16:38:44 {subject}|load test post",
+                                      key=subject)
+        # "Message ID: <id>, Sender: ..."
+        if response and response.startswith("Message ID: "):
+            self.last_message_id = max(self.last_message_id, int(response.split(",")[0].split()[-1]))
+
+    async def group_post(self, group_id):
+        self.posts += 1
+        subject = f"{self.username}-{self.posts}"
+        await self.command(f"%grouppost {self.username} 2024-12-02 16:38:44 {group_id} {subject}|load test post",
+                           key=subject)
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+
+def join_storm(args, connect):
+    """
+    Every client connects, joins and joins a group at once; the storm is one phase.
+    """
+    async def storm(client):
+        await connect(client)
+        await client.join()
+        await client.command(f"%groupjoin {client.random.randint(1, DEFAULT_GROUP_COUNT)}")
+    return [('join-storm', storm)]
+
+def post_heavy(args, connect):
+    """
+    Every client connects and joins, then each posts --commands times, reading one post back every
+    POSTS_PER_READ posts.
+    """
+    async def join(client):
+        await connect(client)
+        await client.join()
+
+    async def post(client):
+        for number in range(1, args.commands + 1):
+            await client.post()
+            if number % POSTS_PER_READ == 0:
+                await client.command(f"%message {client.random.randint(1, client.last_message_id)}")
+    return [('connect+join', join), ('post', post)]
+
+def many_groups(args, connect):
+    """
+    The first client creates --groups groups (on a server that already has them, from an earlier run, they
+    are reused); every client then joins --groups-per-client of them by name and posts --commands times to
+    the groups it joined.
+    """
+    group_names = [f"load-group-{number}" for number in range(args.groups)]
+
+    async def create(client):
+        if client.number == 0:
+            for group_name in group_names:
+                await client.command(f"%groupcreate {group_name}")
+
+    async def group_join(client):
+        for group_name in client.random.sample(group_names, min(args.groups_per_client, len(group_names))):
+            response = await client.command(f"%groupjoin {group_name}")
+            # "<user> joined group <id>. ..." or "User <user> is already a member of group <id>."
+            if response and " group " in response and not response.startswith("Error"):
+                client.groups.append(int(response.split(".")[0].split()[-1]))
+
+    async def group_post(client):
+        for _ in range(args.commands if client.groups else 0):
+            await client.group_post(client.random.choice(client.groups))
+    return [('connect', connect), ('groupcreate', create), ('groupjoin', group_join), ('grouppost', group_post)]
+
+async def run_scenario(host, port, args):
+    """
+    Runs the chosen scenario with args.clients clients and returns its LoadStats. Each phase starts once every
+    client finished the previous one, so its throughput covers the whole phase.
+    """
+    stats = LoadStats()
+    clients = [LoadClient(number, stats, args.seed) for number in range(args.clients)]
+
+    async def connect(client):
+        await client.connect(host, port, args.multiplex)
+
+    scenario = {'join-storm': join_storm, 'post-heavy': post_heavy, 'many-groups': many_groups}[args.scenario]
+    try:
+        for name, phase in scenario(args, connect):
+            sent = sum(len(samples) for samples in stats.latencies.values())
+            start = time.perf_counter()
+            await asyncio.gather(*(phase(client) for client in clients))
+            elapsed = time.perf_counter() - start
+            stats.phases.append((name, sum(len(samples) for samples in stats.latencies.values()) - sent, elapsed))
+        # Give the last signals time to arrive before the connections close
+        await asyncio.sleep(args.drain)
+    finally:
+        for client in clients:
+            client.close()
+    return stats
+
+def print_report(stats, args):
+    print(f"Scenario {args.scenario}: {args.clients} clients, seed {args.seed}"
+          f"{', multiplexed' if args.multiplex else ''}")
+    print(f"{'phase':<14} {'commands':>9} {'seconds':>8} {'commands/s':>11}")
+    for name, commands, elapsed in stats.phases:
+        print(f"{name:<14} {commands:>9} {elapsed:>8.2f} {commands / elapsed if elapsed else 0:>11.0f}")
+    print()
+    print(f"{'command':<14} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8}")
+    for command, samples in sorted(stats.latencies.items()):
+        print(f"{command:<14} {len(samples):>7} {stats.errors[command]:>7} {percentile(samples, 0.5) * 1000:>8.2f} "
+              f"{percentile(samples, 0.99) * 1000:>8.2f} {percentile(samples, 0.999) * 1000:>8.2f}")
+    print()
+    print(f"{'signal lag':<18} {'deliveries':>10} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8}")
+    for code in LAG_SIGNALS:
+        samples = stats.lags.get(code)
+        if samples:
+            print(f"{code:<18} {len(samples):>10} {percentile(samples, 0.5) * 1000:>8.2f} "
+                  f"{percentile(samples, 0.99) * 1000:>8.2f} {percentile(samples, 0.999) * 1000:>8.2f}")
+
+def raise_fd_limit():
+    """
+    Raises the open file limit so thousands of sockets can be held (inherited by a started server).
+    """
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def find_free_port(host):
+    """
+    Finds a port where both port and port + 1 (the signal port) are free.
+    """
+    while True:
+        with socket.socket() as probe:
+            probe.bind((host, 0))
+            port = probe.getsockname()[1]
+        try:
+            with socket.socket() as signal_probe:
+                signal_probe.bind((host, port + 1))
+            return port
+        except OSError:
+            continue
+
+def start_local_server(host, args):
+    """
+    Starts socket_server.py in a subprocess on a free port and waits until it accepts clients.
+    Returns the process and its port.
+    """
+    port = find_free_port(host)
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'socket_server.py'),
+               '--host', host, '--port', str(port), '--mode', args.mode]
+    if args.multiplex:
+        command.append('--multiplex')
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            # A split server pairs connections in accept order, so the probe opens a signal connection as well
+            with socket.create_connection((host, port), timeout=1):
+                if not args.multiplex:
+                    socket.create_connection((host, port + 1), timeout=1).close()
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The server did not start.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Drives simulated clients against a bulletin board server")
+    parser.add_argument('--scenario', choices=SCENARIOS, default='post-heavy')
+    parser.add_argument('--clients', type=int, default=100, help="Simulated clients")
+    parser.add_argument('--commands', type=int, default=50, help="Posts per client in post-heavy and many-groups")
+    parser.add_argument('--groups', type=int, default=50, help="Groups created in many-groups")
+    parser.add_argument('--groups-per-client', type=int, default=5, help="Groups each client joins in many-groups")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of every client's choices")
+    parser.add_argument('--drain', type=float, default=1.0, help="Seconds to wait for the last signals")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000, help="Port of a running server")
+    parser.add_argument('--multiplex', action='store_true', help="Connect with --multiplex (the server must use it)")
+    parser.add_argument('--start-server', action='store_true',
+                        help="Start a server on a free port for the run instead of using --port")
+    parser.add_argument('--mode', default='threaded', help="Engine of the server started with --start-server")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    server = None
+    port = args.port
+    if args.start_server:
+        server, port = start_local_server(args.host, args)
+    try:
+        stats = asyncio.run(run_scenario(args.host, port, args))
+    finally:
+        if server:
+            server.kill()
+            server.wait()
+    print_report(stats, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import struct
+import threading
+
+# Each record is the message ID and the byte lengths of sender, date, subject and content, then those
+# four UTF-8 fields back to back
+RECORD_HEADER = struct.Struct('!IIIII')
+# The index holds one fixed-width entry per message ID (entry N for ID N + 1): the record's offset in the
+# data file plus one, so an all-zero entry means the ID isn't in the segment
+INDEX_ENTRY = struct.Struct('!Q')
+
+class MessageSegment:
+    """
+    On-disk storage for messages spilled out of a board's memory: a data file of records appended in
+    spill order and an index file with a fixed-width offset per message ID, so any message is found
+    with two reads and nothing per message stays in memory.
+    The files are recreated on startup; the post log and snapshots remain the durable copy.
+    """
+    def __init__(self, path):
+        self.path = path
+        # Unbuffered, so a record is readable as soon as it has been written
+        self.data_file = open(path + '.dat', 'w+b', buffering=0)
+        self.index_file = open(path + '.idx', 'w+b', buffering=0)
+        self.data_size = 0
+        self.count = 0  # Messages in the segment
+        self.lock = threading.Lock()
+
+    def append(self, message_id, sender, date, subject, content):
+        """
+        Writes a message to the segment.
+        """
+        fields = [sender.encode('utf-8'), date.encode('utf-8'), subject.encode('utf-8'), content.encode('utf-8')]
+        record = RECORD_HEADER.pack(message_id, *map(len, fields)) + b"".join(fields)
+        with self.lock:
+            self.data_file.seek(self.data_size)
+            self.data_file.write(record)
+            self.index_file.seek((message_id - 1) * INDEX_ENTRY.size)
+            self.index_file.write(INDEX_ENTRY.pack(self.data_size + 1))
+            self.data_size += len(record)
+            self.count += 1
+
+    def _offset(self, message_id):
+        # Called with the lock held; returns the record's offset in the data file, or None
+        if message_id < 1:
+            return None
+        self.index_file.seek((message_id - 1) * INDEX_ENTRY.size)
+        entry = self.index_file.read(INDEX_ENTRY.size)
+        if len(entry) < INDEX_ENTRY.size:
+            return None
+        offset, = INDEX_ENTRY.unpack(entry)
+        return offset - 1 if offset else None
+
+    def get(self, message_id):
+        """
+        Returns the message with the given ID as a dict, or None if it isn't in the segment.
+        """
+        with self.lock:
+            offset = self._offset(message_id)
+            if offset is None:
+                return None
+            self.data_file.seek(offset)
+            header = self.data_file.read(RECORD_HEADER.size)
+            _, sender_length, date_length, subject_length, content_length = RECORD_HEADER.unpack(header)
+            body = self.data_file.read(sender_length + date_length + subject_length + content_length)
+        date_start = sender_length
+        subject_start = date_start + date_length
+        content_start = subject_start + subject_length
+        return {
+            'id': message_id,
+            'sender': str(body[:date_start], 'utf-8'),
+            'date': str(body[date_start:subject_start], 'utf-8'),
+            'subject': str(body[subject_start:content_start], 'utf-8'),
+            'content': str(body[content_start:], 'utf-8')
+        }
+
+    def __contains__(self, message_id):
+        with self.lock:
+            return self._offset(message_id) is not None
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
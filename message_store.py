@@ -0,0 +1,204 @@
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta
+from message_segment import MessageSegment
+
+# Dates are stored as whole seconds since this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+# Timestamp stored for dates that aren't in 'YYYY-MM-DD HH:MM:SS' form; the text is kept as is instead
+RAW_DATE = -2 ** 63
+# Sender stored in rows that hold no message
+NO_MESSAGE = -1
+
+def date_to_timestamp(date):
+    """
+    Converts a 'YYYY-MM-DD HH:MM:SS' date to seconds since the epoch, or returns None if the text
+    wouldn't come back unchanged from timestamp_to_date().
+    """
+    try:
+        parsed = datetime.fromisoformat(date)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None or parsed.microsecond or parsed.isoformat(sep=' ') != date:
+        return None
+    return (parsed - EPOCH) // timedelta(seconds=1)
+
+def timestamp_to_date(timestamp):
+    return (EPOCH + timedelta(seconds=timestamp)).isoformat(sep=' ')
+
+class Retention:
+    """
+    How many posts each board keeps in memory (hot_limit) and the directory older posts are spilled to.
+    """
+    def __init__(self, hot_limit, spill_dir):
+        self.hot_limit = hot_limit
+        self.spill_dir = spill_dir
+        os.makedirs(spill_dir, exist_ok=True)
+
+def open_message_store(name, messages=(), retention=None, archive=None):
+    """
+    Creates the message store for a board. With a Retention, only the newest posts stay in memory and older
+    ones are spilled to a segment file named after the board; without one, every post stays in memory.
+    With the board's archive, the messages it already holds are left out and rows start after its last ID,
+    so the archived history takes no memory.
+    """
+    base_id = 1
+    if archive is not None:
+        messages = [message for message in messages if message['id'] not in archive]
+        base_id = archive.last_id + 1
+    if retention is None:
+        return MessageStore(messages, base_id=base_id)
+    segment = MessageSegment(os.path.join(retention.spill_dir, name))
+    return MessageStore(messages, retention.hot_limit, segment)
+
+class MessageStore:
+    """
+    Columnar store for one board's posts. Each field is its own column: senders are interned into a table
+    and stored as small integers, dates as integer timestamps, and only subject and content stay as strings.
+    This avoids a five-key dict per post and repeated copies of each sender's name.
+    Rows are addressed by message ID (row = ID - base_id, since IDs are handed out densely from base_id: 1, or
+    the first ID after a board's archive; a late post below base_id moves the rows down to make room). With a
+    hot_limit the columns become a ring of that many rows holding the newest posts (row = (ID - 1) % hot_limit):
+    a post pushed out of the ring is spilled to the segment, so memory stays bounded while get() still finds
+    every post. get() builds the familiar message dict on demand.
+    """
+    def __init__(self, messages=(), hot_limit=None, segment=None, base_id=1):
+        if hot_limit is not None and (hot_limit < 1 or segment is None):
+            raise ValueError("A hot_limit needs a positive size and a segment to spill older messages to.")
+        self.hot_limit = hot_limit  # Most posts kept in memory (None keeps every post)
+        self.segment = segment  # MessageSegment holding the posts pushed out of memory
+        self.base_id = base_id  # ID of row 0 when every post stays in memory
+        self.sender_names = []  # Interned sender names; senders column holds indexes into this
+        self.sender_numbers = {}  # sender name -> index in sender_names
+        self.ids = array('I')  # ID of the message in each row (0 for an empty row)
+        self.senders = array('i')
+        self.timestamps = array('q')
+        self.subjects = []
+        self.contents = []
+        self.raw_dates = {}  # row -> date text that doesn't fit a timestamp
+        self.count = 0  # Messages stored, in memory or spilled
+        self.last_id = 0  # Highest message ID stored
+        self.lock = threading.Lock()
+        for message in messages:
+            self.add(message['id'], message['sender'], message['date'], message['subject'], message['content'])
+
+    def _row(self, message_id):
+        # Called with the lock held, since base_id moves when a post below it arrives
+        if self.hot_limit is None:
+            return message_id - self.base_id
+        return (message_id - 1) % self.hot_limit
+
+    def _first_id(self):
+        # Lowest ID the store can hold: base_id, unless older posts may have been spilled to the segment
+        return self.base_id if self.hot_limit is None else 1
+
+    def add(self, message_id, sender, date, subject, content):
+        """
+        Stores a message under its ID. Returns False if the ID already holds a message.
+        """
+        timestamp = date_to_timestamp(date)
+        with self.lock:
+            row = self._row(message_id)
+            if row < 0:
+                # Older than every row (e.g. a post recovered from the log below the archive's IDs): add rows in front
+                shift = -row
+                self.ids[0:0] = array('I', [0]) * shift
+                self.senders[0:0] = array('i', [NO_MESSAGE]) * shift
+                self.timestamps[0:0] = array('q', [0]) * shift
+                self.subjects[0:0] = [None] * shift
+                self.contents[0:0] = [None] * shift
+                self.raw_dates = {held_row + shift: held_date for held_row, held_date in self.raw_dates.items()}
+                self.base_id = message_id
+                row = 0
+            # Posts can arrive out of ID order (concurrent posters, recovery), so leave gaps to fill in later
+            while len(self.ids) <= row:
+                self.ids.append(0)
+                self.senders.append(NO_MESSAGE)
+                self.timestamps.append(0)
+                self.subjects.append(None)
+                self.contents.append(None)
+            held = self.ids[row]
+            if held == message_id:
+                return False
+            if held > message_id:
+                # Older than the post in its ring row, so it goes straight to the segment (unless already there)
+                if message_id in self.segment:
+                    return False
+                self.segment.append(message_id, sender, date, subject, content)
+            else:
+                if held:
+                    # The ring row's post is the oldest in memory; spill it to make room
+                    self.segment.append(*self._read_row(row).values())
+                    self.raw_dates.pop(row, None)
+                sender_number = self.sender_numbers.get(sender)
+                if sender_number is None:
+                    sender_number = self.sender_numbers[sender] = len(self.sender_names)
+                    self.sender_names.append(sender)
+                if timestamp is None:
+                    timestamp = RAW_DATE
+                    self.raw_dates[row] = date
+                self.ids[row] = message_id
+                self.senders[row] = sender_number
+                self.timestamps[row] = timestamp
+                self.subjects[row] = subject
+                self.contents[row] = content
+            self.count += 1
+            self.last_id = max(self.last_id, message_id)
+        return True
+
+    def _read_row(self, row):
+        # Called with the lock held
+        timestamp = self.timestamps[row]
+        return {
+            'id': self.ids[row],
+            'sender': self.sender_names[self.senders[row]],
+            'date': self.raw_dates[row] if timestamp == RAW_DATE else timestamp_to_date(timestamp),
+            'subject': self.subjects[row],
+            'content': self.contents[row]
+        }
+
+    def get(self, message_id):
+        """
+        Returns the message with the given ID as a dict, or None.
+        """
+        if message_id < 1:
+            return None
+        with self.lock:
+            row = self._row(message_id)
+            if 0 <= row < len(self.ids) and self.ids[row] == message_id:
+                return self._read_row(row)
+        # Not in memory, so it is either spilled or doesn't exist
+        if self.segment is not None:
+            return self.segment.get(message_id)
+        return None
+
+    def page(self, from_id, count):
+        """
+        Returns up to count messages with IDs from from_id on, in ID order, and the ID the next page
+        starts at (0 once there are no more messages).
+        """
+        messages = []
+        message_id = max(from_id, self._first_id())
+        last_id = self.last_id
+        while message_id <= last_id and len(messages) < count:
+            message = self.get(message_id)
+            if message:
+                messages.append(message)
+            message_id += 1
+        return messages, (message_id if message_id <= last_id else 0)
+
+    def __contains__(self, message_id):
+        return self.get(message_id) is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """
+        Yields every stored message as a dict in ID order. Messages added meanwhile may or may not be included.
+        """
+        for message_id in range(self._first_id(), self.last_id + 1):
+            message = self.get(message_id)
+            if message:
+                yield message
@@ -0,0 +1,181 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from signal_outbox import signal_counters
+
+# Each power of two is split into 2 ** SUB_BUCKET_BITS buckets, so a recorded value is known to within 1/16 (~6%)
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Distinct command names tracked; anything past this (clients can send any word) is counted as 'other'
+MAX_COMMANDS = 64
+
+def bucket_index(value):
+    """
+    Returns the histogram bucket of a non-negative integer: exact below SUB_BUCKETS, then SUB_BUCKETS
+    equal-width buckets per power of two (the HDR histogram layout).
+    """
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + (value >> shift) - SUB_BUCKETS
+
+def bucket_upper_bound(index):
+    """
+    Returns the largest value that falls in a bucket.
+    """
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    mantissa = (index & (SUB_BUCKETS - 1)) + SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+class Histogram:
+    """
+    Counts of integer values (microseconds, recipients) in log-linear buckets. Recording is one dict update,
+    and memory stays bounded by the range of values rather than how many are recorded.
+    """
+    def __init__(self):
+        self.buckets = {}  # bucket index -> values recorded in it
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        index = bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket holding the given fraction of the values (never above the max).
+        """
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * fraction))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+class MetricsRegistry:
+    """
+    In-process counters for the server: each command's count and latency, bytes received and sent, open
+    connections and the fan-out of every broadcast. In multiprocess and cluster mode each process keeps its own.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.commands = {}  # command -> Histogram of its latencies in microseconds
+        self.errors = {}  # command -> responses that were errors
+        self.bytes_in = 0  # Command frames received, headers included
+        self.bytes_out = 0  # Response frames sent
+        self.signal_bytes_out = 0  # Signal frames queued for clients (one frame per recipient)
+        self.connections = 0  # Client connections open now
+        self.connections_total = 0  # Client connections accepted since startup
+        self.fan_out = Histogram()  # Recipients of each broadcast
+        self.spans = {}  # span name -> Histogram of its durations in microseconds (see profiler.span)
+
+    def record_command(self, command, seconds, bytes_in, bytes_out, error=False):
+        """
+        Records one command answered: how long it took from receiving it to sending its response, and the size
+        of both frames.
+        """
+        with self.lock:
+            histogram = self.commands.get(command)
+            if histogram is None:
+                if len(self.commands) >= MAX_COMMANDS:
+                    command = 'other'
+                histogram = self.commands.setdefault(command, Histogram())
+            histogram.record(int(seconds * 1e6))
+            if error:
+                self.errors[command] = self.errors.get(command, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def record_span(self, name, seconds):
+        """
+        Records one timed span of a hot-path step. Span names are fixed in the server's code, so they stay few.
+        """
+        with self.lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = Histogram()
+            histogram.record(int(seconds * 1e6))
+
+    def record_broadcast(self, recipients, frame_size):
+        with self.lock:
+            self.fan_out.record(recipients)
+            self.signal_bytes_out += recipients * frame_size
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+            self.connections_total += 1
+
+    def connection_closed(self):
+        with self.lock:
+            self.connections -= 1
+
+    def report(self, outboxes=()):
+        """
+        Returns the metrics as text, one line per figure, with the signal queue depths of the given outboxes.
+        Latencies are in milliseconds, rounded up to their histogram bucket.
+        """
+        depths = [len(outbox) for outbox in outboxes]
+        dropped = signal_counters.snapshot()
+        with self.lock:
+            lines = [
+                f"uptime_seconds {time.monotonic() - self.started:.0f}",
+                f"connections {self.connections}",
+                f"connections_total {self.connections_total}",
+                f"bytes_in {self.bytes_in}",
+                f"bytes_out {self.bytes_out}",
+                f"signal_bytes_out {self.signal_bytes_out}",
+                f"broadcasts {self.fan_out.count}",
+                f"fan_out p50={self.fan_out.percentile(0.5)} p99={self.fan_out.percentile(0.99)} max={self.fan_out.max}",
+                f"signal_queues clients={len(depths)} queued={sum(depths)} max={max(depths, default=0)}",
+                f"signals dropped={dropped['dropped']} coalesced={dropped['coalesced']} "
+                f"disconnected={dropped['disconnected']}",
+            ]
+            for command in sorted(self.commands):
+                histogram = self.commands[command]
+                lines.append(
+                    f"command {command} count={histogram.count} errors={self.errors.get(command, 0)} "
+                    f"mean_ms={histogram.total / histogram.count / 1000:.3f} "
+                    f"p50_ms={histogram.percentile(0.5) / 1000:.3f} p99_ms={histogram.percentile(0.99) / 1000:.3f} "
+                    f"p999_ms={histogram.percentile(0.999) / 1000:.3f} max_ms={histogram.max / 1000:.3f}")
+            for name in sorted(self.spans):
+                histogram = self.spans[name]
+                lines.append(
+                    f"span {name} count={histogram.count} mean_ms={histogram.total / histogram.count / 1000:.3f} "
+                    f"p99_ms={histogram.percentile(0.99) / 1000:.3f} max_ms={histogram.max / 1000:.3f}")
+        return "\n".join(lines)
+
+# The server's registry, shared by every engine in this process
+metrics = MetricsRegistry()
+
+def start_stats_endpoint(port, report, host='127.0.0.1'):
+    """
+    Serves report() as plain text over HTTP on host:port (localhost by default, since the figures are only meant
+    for the operator), e.g. for curl or a scraper. Returns the server, which runs on a daemon thread.
+    """
+    class StatsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = report().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Don't log every scrape
+
+    server = ThreadingHTTPServer((host, port), StatsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
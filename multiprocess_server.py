@@ -0,0 +1,522 @@
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import secrets
+import shutil
+import socket
+import tempfile
+import threading
+import socket_server
+from archive import ARCHIVE_DIR_NAME, ArchiveSet
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from message_store import Retention
+from metrics import start_stats_endpoint
+from post_log import apply_record
+from profiler import profiler
+from private_board import PrivateBoard
+from signal_outbox import SignalOutbox
+from snapshot import load_snapshot, write_snapshot
+from socket_protocol import FRAME_HEADER, MAX_FRAME_SIZE, FrameDecoder, read_frames
+from socket_server import SPILL_DIR_NAME, client_sessions, deliver_signal, drop_signal_session, execute_command
+from socket_server import handle_client, register_multiplexed_client, register_signal_session, set_session_username
+from socket_server import signal_sessions
+
+# Commands that change the boards. Workers forward them to the broker, which runs them against the one
+# authoritative copy; every other command is answered from the worker's replica.
+FORWARDED_COMMANDS = frozenset([
+    '%join', '%post', '%leave', '%groupjoin', '%groupcreate', '%groupremove', '%grouppost', '%groupleave'
+])
+
+# Largest message on a broker link; a reply wraps a response of up to MAX_FRAME_SIZE
+LINK_MAX_FRAME_SIZE = 2 * MAX_FRAME_SIZE
+
+def pack_link_message(message):
+    """
+    Frames a message (a tuple starting with its kind) for a broker link. Links only connect the server's own
+    processes, so messages are pickled, which keeps bytes responses and records as they are.
+    """
+    payload = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def read_link_messages(sock):
+    """
+    Yields the messages received on a broker link until it closes.
+    """
+    for frame in read_frames(sock, FrameDecoder(LINK_MAX_FRAME_SIZE)):
+        yield pickle.loads(frame)
+
+def board_key(board):
+    """
+    Names a signal's target board across processes: 'public', a group ID, or None for every client.
+    """
+    if isinstance(board, PrivateBoard):
+        return board.group_id
+    if isinstance(board, BulletinBoard):
+        return 'public'
+    return None
+
+def resolve_board_key(key, public_board, private_boards):
+    """
+    Turns a board_key() back into the board it names in the given boards; None if that group is gone
+    (or the key named no board).
+    """
+    if key == 'public':
+        return public_board
+    if key is not None:
+        return private_boards.get(key)
+    return None
+
+def session_token(client_socket):
+    """
+    Returns the token pairing a client's command and signal connections, or None for clients that sent none.
+    """
+    if isinstance(client_socket, RemoteSession):
+        return client_socket.token
+    return client_sessions.get(client_socket, {}).get('token')
+
+class RemoteSession:
+    """
+    Stands in for a client connection held by another process as the key of its client_sessions and
+    signal_sessions entries: a forwarded command's client on the broker, or on a worker a signal connection
+    whose command connection was accepted by a different worker.
+    """
+    __slots__ = ('token',)
+
+    def __init__(self, token):
+        self.token = token
+
+class WorkerConnection:
+    """
+    The broker's end of one worker's link. Sends are serialized so records, signals and replies stay whole.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def send(self, data):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                # The worker is gone; its reader thread cleans up
+                self.closed = True
+
+class Broker:
+    """
+    Runs in the main process of a multiprocess server and holds the authoritative boards. Workers forward
+    every command that changes the boards and the broker runs it, so post IDs and group IDs are handed out
+    in one place. It is attached as the boards' log: every change record (also appended to the post log,
+    when there is one) and every signal is streamed to all workers in one order, so their replicas match
+    and each worker delivers signals to the clients it holds.
+    """
+    # How links are wrapped and how messages are framed on them; replication.py swaps in its own
+    connection_type = WorkerConnection
+    pack_message = staticmethod(pack_link_message)
+    read_messages = staticmethod(read_link_messages)
+
+    def __init__(self, public_board, private_boards, post_log=None):
+        self.public_board = public_board
+        self.private_boards = private_boards
+        self.post_log = post_log
+        self.seq = post_log.last_seq if post_log else 0  # Sequence number of the last record streamed
+        self.links = []  # WorkerConnection of every synced worker
+        self.lock = threading.Lock()  # Held while a record or signal is numbered and sent, to keep one order
+
+    def append(self, record):
+        """
+        Numbers a change record, persists it when there is a post log and streams it to every worker.
+        """
+        with self.lock:
+            if self.post_log:
+                self.seq = self.post_log.append(record)
+            else:
+                self.seq += 1
+                record['seq'] = self.seq
+            self._send_all(('record', record))
+            return self.seq
+
+    def _send_all(self, message):
+        # Called with the lock held
+        data = self.pack_message(message)
+        for link in self.links:
+            link.send(data)
+
+    def forwards(self, command, params):
+        return False  # The broker runs every command itself
+
+    def publish_signal(self, sender_socket, signal_code, kwargs):
+        kwargs = dict(kwargs, target_board=board_key(kwargs.get('target_board')))
+        with self.lock:
+            self._send_all(('signal', session_token(sender_socket), signal_code, kwargs))
+
+    def publish_session(self, client_socket, username):
+        pass  # Sessions belong to the workers, which publish them
+
+    def serve(self, listener):
+        """
+        Accepts worker links on listener and serves each on its own thread.
+        """
+        while True:
+            sock, _ = listener.accept()
+            threading.Thread(target=self.handle_worker, args=(sock,), daemon=True).start()
+
+    def handle_worker(self, sock):
+        """
+        Syncs a worker, then runs its forwarded commands and relays its sessions and signals to every worker.
+        """
+        link = self.connection_type(sock)
+        replies = queue.Queue()
+        threading.Thread(target=self.send_replies, args=(link, replies), daemon=True).start()
+        try:
+            for message in self.read_messages(sock):
+                kind = message[0]
+                if kind == 'hello':
+                    self.sync(link, message[1])
+                elif kind == 'execute':
+                    replies.put(self.execute(*message[1:]))
+                elif kind in ('session', 'signal'):
+                    self.relay(message)
+                else:
+                    self.handle_message(link, message)
+        except (OSError, ValueError) as e:
+            print(f"Worker link error: {e}")
+        finally:
+            with self.lock:
+                if link in self.links:
+                    self.links.remove(link)
+            link.close()
+            replies.put(None)
+            sock.close()
+
+    def relay(self, message):
+        """
+        Passes a session or signal from one worker on to every worker.
+        """
+        with self.lock:
+            self._send_all(message)
+
+    def handle_message(self, link, message):
+        pass  # Only other kinds of links send other messages
+
+    def sync(self, link, snapshot_path):
+        """
+        Snapshots the boards for a new worker at snapshot_path and starts streaming records to it.
+        The lock is held throughout, so the worker gets exactly the records after the snapshot.
+        """
+        with self.lock:
+            write_snapshot(snapshot_path, self.public_board, self.private_boards, self.seq)
+            self.links.append(link)
+            link.send(self.pack_message(('synced', self.seq)))
+
+    def execute(self, request_id, token, username, command, params):
+        """
+        Runs a forwarded command for the client with the given session token and username.
+        Returns the reply, with the seq the response must wait for (or None when nothing was logged).
+        """
+        session = RemoteSession(token)
+        client_sessions[session] = {'username': username}
+        position = self.post_log.last_seq if self.post_log else None
+        try:
+            response = execute_command(session, command, params, self.public_board, self.private_boards)
+        except Exception as e:
+            # Raised again on the worker, so its client is handled as in a single-process server
+            response = e
+        finally:
+            username = client_sessions.pop(session)['username']
+        durable_seq = None
+        if self.post_log and self.post_log.last_seq != position:
+            durable_seq = self.post_log.last_seq
+        return request_id, response, username, durable_seq
+
+    def send_replies(self, link, replies):
+        """
+        Sends a worker its replies in order, each once its changes are durable. The records a command made
+        were streamed while it ran, so the worker has applied them by the time the reply arrives.
+        """
+        while True:
+            reply = replies.get()
+            if reply is None:
+                return
+            request_id, response, username, durable_seq = reply
+            if durable_seq and not self.post_log.wait_committed(durable_seq):
+                response = "Error: The change could not be saved."
+            link.send(self.pack_message(('reply', request_id, response, username)))
+
+class WorkerLink:
+    """
+    A worker process's link to the broker. Keeps the worker's board replica current by applying the
+    broker's record stream, forwards commands that change the boards, and tracks which user every client
+    session belongs to so signal connections held here are subscribed under the right username.
+    """
+    pack_message = staticmethod(pack_link_message)
+    read_messages = staticmethod(read_link_messages)
+    peer_name = 'broker'  # What the other end of the link is called in log lines
+
+    def __init__(self, link_path, number):
+        self.label = f"worker {number}"  # Names this process in log lines
+        self.sock = self.connect(link_path)
+        self.send_lock = threading.Lock()
+        self.request_ids = itertools.count(1)
+        self.pending = {}  # request ID -> [Event set when the reply arrives, reply]
+        self.session_users = {}  # session token -> username, for clients connected to any worker
+        # session token -> key of the signal outboxes held by this worker: a RemoteSession for a signal connection,
+        # or the client connection itself when it carries its own signals (multiplexed)
+        self.signal_keys = {}
+        self.lock = threading.Lock()  # Guards session_users and signal_keys
+        self.public_board = None
+        self.private_boards = None
+        self.messages = None
+        self.applied_seq = 0  # Sequence number of the last record applied to the replica
+        self.on_close = None  # Called when the broker link closes
+
+    def connect(self, link_path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(link_path)
+        return sock
+
+    def _send(self, message):
+        data = self.pack_message(message)
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def sync(self, snapshot_path, retention=None, archives=None):
+        """
+        Builds this worker's replica of the boards from a snapshot taken by the broker, then starts applying
+        the broker's stream. Returns the public board and the group registry.
+        """
+        self._send(('hello', snapshot_path))
+        self.messages = self.read_messages(self.sock)
+        _, self.applied_seq = next(self.messages)
+        self.public_board = BulletinBoard(retention=retention, archives=archives)
+        self.private_boards = GroupRegistry(retention=retention, archives=archives)
+        load_snapshot(snapshot_path, self.public_board, self.private_boards)
+        os.remove(snapshot_path)
+        threading.Thread(target=self._read, daemon=True).start()
+        return self.public_board, self.private_boards
+
+    def _read(self):
+        try:
+            for message in self.messages:
+                self._handle(message)
+        except (OSError, ValueError) as e:
+            print(f"[{self.label}] Link error: {e}")
+        print(f"[{self.label}] Lost the {self.peer_name} link.")
+        if self.on_close:
+            self.on_close()
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == 'record':
+            apply_record(message[1], self.public_board, self.private_boards)
+            self.applied_seq = message[1]['seq']
+        elif kind == 'signal':
+            self._deliver(*message[1:])
+        elif kind == 'session':
+            self._update_session(*message[1:])
+        elif kind == 'reply':
+            _, request_id, response, username = message
+            waiter = self.pending.pop(request_id)
+            waiter[1] = (response, username)
+            waiter[0].set()
+
+    def forwards(self, command, params):
+        return command in FORWARDED_COMMANDS
+
+    def execute(self, client_socket, command, params):
+        """
+        Runs a command on the broker and returns its response, updating the session's username if it changed.
+        """
+        session = client_sessions[client_socket]
+        if client_socket in signal_sessions:
+            # Signals are sent on this connection, so the broker must be able to name it as a signal's sender
+            # (to leave it out) even if the client never sent a token of its own
+            token = session.setdefault('token', secrets.token_hex(8))
+            with self.lock:
+                self.signal_keys[token] = client_socket
+        request_id = next(self.request_ids)
+        waiter = self.pending[request_id] = [threading.Event(), None]
+        self._send(('execute', request_id, session.get('token'), session.get('username'), command, params))
+        waiter[0].wait()
+        response, username = waiter[1]
+        if isinstance(response, Exception):
+            raise response
+        if username != session.get('username'):
+            set_session_username(client_socket, username)
+        return response
+
+    def publish_signal(self, sender_socket, signal_code, kwargs):
+        kwargs = dict(kwargs, target_board=board_key(kwargs.get('target_board')))
+        self._send(('signal', session_token(sender_socket), signal_code, kwargs))
+
+    def publish_session(self, client_socket, username):
+        token = session_token(client_socket)
+        # Only sessions of command connections held here are published; RemoteSessions mirror other workers'
+        if token and not isinstance(client_socket, RemoteSession):
+            self._send(('session', token, username))
+            if username is None:
+                self.forget_signal_key(token, client_socket)
+
+    def forget_signal_key(self, token, client_socket):
+        """
+        Stops delivering signals by token to a client connection whose session ended.
+        """
+        with self.lock:
+            if self.signal_keys.get(token) is client_socket:
+                del self.signal_keys[token]
+
+    def _update_session(self, token, username):
+        with self.lock:
+            if username:
+                self.session_users[token] = username
+            else:
+                self.session_users.pop(token, None)
+            key = self.signal_keys.get(token)
+            # A connection held here already has its username; only signal connections mirror it
+            if isinstance(key, RemoteSession):
+                set_session_username(key, username)
+
+    def _deliver(self, sender_token, signal_code, kwargs):
+        key = kwargs.get('target_board')
+        target_board = resolve_board_key(key, self.public_board, self.private_boards)
+        if key is not None and target_board is None:
+            return  # The group was removed since
+        sender_key = self.signal_keys.get(sender_token)
+        deliver_signal(signal_sessions.get(sender_key), signal_code, **dict(kwargs, target_board=target_board))
+
+    def handle_signal_connection(self, signal_socket):
+        """
+        Pairs a signal connection with its session through the token the client sends first, then keeps it
+        open for signals. Clients that send no token can't be paired across processes and get no signals.
+        """
+        frames = read_frames(signal_socket)
+        key = None
+        try:
+            hello = next(frames, b"").decode('utf-8').split()
+            if len(hello) != 2 or hello[0] != 'SESSION':
+                return
+            key = RemoteSession(hello[1])
+            with self.lock:
+                client_sessions[key] = {'username': self.session_users.get(key.token)}
+                register_signal_session(key, SignalOutbox(signal_socket, **socket_server.outbox_settings))
+                self.signal_keys[key.token] = key
+            # Clients never send anything else on the signal connection; wait here until it closes
+            for _ in frames:
+                pass
+        except (OSError, ValueError) as e:
+            print(f"Error in signal connection: {e}")
+        finally:
+            if key is not None:
+                with self.lock:
+                    if self.signal_keys.get(key.token) is key:
+                        del self.signal_keys[key.token]
+                    drop_signal_session(key)
+                    client_sessions.pop(key, None)
+            signal_socket.close()
+
+def reuseport_listener(host, port):
+    """
+    Returns a listening socket on host:port that other worker processes can bind as well; the kernel spreads
+    incoming connections across them.
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    return listener
+
+def accept_signal_connections(listener, link):
+    while True:
+        signal_socket, _ = listener.accept()
+        threading.Thread(target=link.handle_signal_connection, args=(signal_socket,), daemon=True).start()
+
+def run_worker(number, host, port, link_path, settings):
+    """
+    Entry point of a worker process: syncs a replica of the boards from the broker, then serves clients on
+    the shared command and signal ports with the threaded engine.
+    """
+    socket_server.outbox_settings.update(settings['outbox_settings'])
+    socket_server.admin_settings.update(settings['admin_settings'])
+    profiler.profile_dir = settings['profile_dir'] or profiler.profile_dir
+    profiler.keep_spans(settings['spans'])
+    retention = None
+    if settings['hot_posts']:
+        retention = Retention(settings['hot_posts'], os.path.join(settings['spill_dir'], f'worker-{number}'))
+    archives = ArchiveSet(settings['archive_dir']) if settings['archive_dir'] else None
+    link = WorkerLink(link_path, number)
+    # Without the broker the replica can't stay current, so the worker stops
+    link.on_close = lambda: os._exit(1)
+    snapshot_path = os.path.join(os.path.dirname(link_path), f'worker-{number}.snapshot')
+    public_board, private_boards = link.sync(snapshot_path, retention, archives)
+    socket_server.coordinator = link
+
+    command_listener = reuseport_listener(host, port)
+    if not settings['multiplex']:
+        signal_listener = reuseport_listener(host, port + 1)
+        threading.Thread(target=accept_signal_connections, args=(signal_listener, link), daemon=True).start()
+    if settings['stats_port']:
+        start_stats_endpoint(settings['stats_port'] + number, socket_server.stats_report)
+    print(f"[worker {number}] Serving {host}:{port}")
+    while True:
+        client_socket, client_address = command_listener.accept()
+        if settings['multiplex']:
+            # The client's signals are sent on this connection, by whichever worker accepted it
+            client_socket = register_multiplexed_client(client_socket)
+        print(f"[worker {number}] Accepted connection from {client_address}")
+        threading.Thread(target=handle_client, args=(client_socket, public_board, private_boards), daemon=True).start()
+
+def start_multiprocess_server(host, port, public_board, private_boards, workers, data_dir=None, hot_posts=None,
+                              multiplex=False, stats_port=None, profile_dir=None, spans=False):
+    """
+    Serves the boards with worker processes that all accept on host:port (and the signal port, unless
+    multiplex) via SO_REUSEPORT, while this process acts as their broker. Runs until the workers exit.
+    Each worker keeps its own metrics; with stats_port, worker N serves them on stats_port + N.
+    %profile profiles the worker that receives it, which writes the profile to profile_dir.
+    """
+    if not hasattr(socket, 'SO_REUSEPORT') or not hasattr(socket, 'AF_UNIX'):
+        raise ValueError("Multiprocess mode needs SO_REUSEPORT and Unix sockets, which this platform lacks.")
+    broker = Broker(public_board, private_boards, socket_server.post_log)
+    public_board.log = broker
+    private_boards.attach_log(broker)
+    socket_server.coordinator = broker
+
+    link_dir = tempfile.mkdtemp(prefix='bulletin-broker-')
+    link_path = os.path.join(link_dir, 'broker.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(link_path)
+    listener.listen(workers)
+    threading.Thread(target=broker.serve, args=(listener,), daemon=True).start()
+
+    settings = {
+        'outbox_settings': dict(socket_server.outbox_settings),
+        'admin_settings': dict(socket_server.admin_settings),
+        'hot_posts': hot_posts,
+        'multiplex': multiplex,
+        'stats_port': stats_port,
+        'profile_dir': profile_dir,
+        'spans': spans,
+        'spill_dir': os.path.join(data_dir, SPILL_DIR_NAME) if data_dir else link_dir,
+        'archive_dir': os.path.join(data_dir, ARCHIVE_DIR_NAME) if data_dir else None,
+    }
+    # Fresh interpreters rather than forks, since this process already runs the log and snapshot threads
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=run_worker, args=(number, host, port, link_path, settings), daemon=True)
+                 for number in range(workers)]
+    for process in processes:
+        process.start()
+    print(f"[*] Listening on {host}:{port} ({workers} worker processes)")
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        listener.close()
+        shutil.rmtree(link_dir, ignore_errors=True)
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+
+# File in the data directory that holds the post log
+POST_LOG_NAME = 'posts.log'
+
+class PostLog:
+    """
+    Append-only log of every change to the boards (posts, joins, group membership), one JSON record per line.
+    append() only queues a record; a commit thread writes everything queued so far with one write and,
+    when durable, one fsync. Records appended while an fsync is in progress are committed together in the
+    next batch, so many concurrent posters share each fsync instead of paying one per post.
+    Every record carries a sequence number; wait_committed() blocks until a given record is on disk.
+    """
+    def __init__(self, path, durable=True, last_seq=0):
+        self.path = path
+        self.durable = durable  # When False records are written but never fsynced
+        self.file = open(path, 'ab')
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # Held while the file is written or truncated
+        self.has_pending = threading.Condition(self.lock)  # Wakes the commit thread
+        self.has_committed = threading.Condition(self.lock)  # Wakes callers waiting for a commit
+        self.pending = []  # Encoded records waiting for the next group commit
+        self.async_waiters = []  # (seq, loop, future) for asyncio callers
+        self.last_seq = last_seq  # Sequence number of the last appended record
+        self.committed_seq = last_seq  # Sequence number of the last record on disk
+        self.commits = 0  # Number of group commits (writes) so far
+        self.error = None  # Set if writing the log fails; no further records are committed
+        self.closed = False
+        self.commit_thread = threading.Thread(target=self._commit_loop, daemon=True)
+        self.commit_thread.start()
+
+    def append(self, record):
+        """
+        Queues a record for the next group commit and returns its sequence number. Never blocks on disk I/O.
+        """
+        with self.lock:
+            if self.closed:
+                raise ValueError("PostLog is closed.")
+            self.last_seq += 1
+            record['seq'] = self.last_seq
+            self.pending.append(json.dumps(record).encode('utf-8') + b"\n")
+            self.has_pending.notify()
+            return self.last_seq
+
+    def wait_committed(self, seq):
+        """
+        Blocks until the record with the given sequence number has been committed. Returns False if the log failed.
+        """
+        with self.lock:
+            while self.committed_seq < seq and self.error is None:
+                self.has_committed.wait()
+            return self.committed_seq >= seq
+
+    async def wait_committed_async(self, seq):
+        """
+        Same as wait_committed() but suspends the calling task instead of blocking the event loop.
+        """
+        with self.lock:
+            if self.committed_seq >= seq or self.error is not None:
+                return self.committed_seq >= seq
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.async_waiters.append((seq, loop, future))
+        return await future
+
+    def truncate_through(self, seq):
+        """
+        Drops every record up to and including seq from the log file, once a snapshot covers them.
+        The remaining tail is copied to a new file that replaces the log, so a crash leaves one or the other.
+        Appends keep queueing meanwhile; only the commit thread waits.
+        """
+        with self.write_lock:
+            self.file.close()
+            temporary_path = self.path + '.tmp'
+            with open(self.path, 'rb') as old_file, open(temporary_path, 'wb') as new_file:
+                # Records are in seq order, so skip to the first one after seq and copy the rest as is
+                while True:
+                    offset = old_file.tell()
+                    line = old_file.readline()
+                    if not line or json.loads(line)['seq'] > seq:
+                        break
+                old_file.seek(offset)
+                shutil.copyfileobj(old_file, new_file)
+                new_file.flush()
+                os.fsync(new_file.fileno())
+            os.replace(temporary_path, self.path)
+            fsync_directory(self.path)
+            self.file = open(self.path, 'ab')
+
+    def close(self):
+        """
+        Commits whatever is still queued, then stops the commit thread and closes the file.
+        """
+        with self.lock:
+            self.closed = True
+            self.has_pending.notify()
+        self.commit_thread.join()
+        self.file.close()
+
+    def _commit_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.has_pending.wait()
+                if not self.pending:
+                    return  # Closed and fully committed
+                # Take everything queued so far; it is committed as one batch
+                batch = self.pending
+                self.pending = []
+                batch_seq = self.last_seq
+            try:
+                with self.write_lock:
+                    self.file.write(b"".join(batch))
+                    self.file.flush()
+                    if self.durable:
+                        os.fsync(self.file.fileno())
+            except OSError as e:
+                print(f"Error writing post log: {e}")
+                with self.lock:
+                    self.error = e
+                    self._wake_waiters()
+                return
+            with self.lock:
+                self.committed_seq = batch_seq
+                self.commits += 1
+                self._wake_waiters()
+
+    def _wake_waiters(self):
+        # Called with the lock held
+        self.has_committed.notify_all()
+        waiting = []
+        for seq, loop, future in self.async_waiters:
+            if self.committed_seq >= seq or self.error is not None:
+                loop.call_soon_threadsafe(_resolve, future, self.committed_seq >= seq)
+            else:
+                waiting.append((seq, loop, future))
+        self.async_waiters = waiting
+
+def fsync_directory(path):
+    """
+    Makes a rename of the file at path durable by fsyncing its directory (not possible on Windows).
+    """
+    try:
+        directory_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(directory_fd)
+
+def _resolve(future, result):
+    if not future.done():
+        future.set_result(result)
+
+def apply_record(record, public_board, private_boards):
+    """
+    Applies one logged change to the boards. Applying a record that is already reflected is harmless,
+    so a log can be replayed on top of state that already contains part of it.
+    """
+    record_type = record['type']
+    if record_type == 'join':
+        public_board.add_user(record['user'])
+    elif record_type == 'leave':
+        public_board.remove_user(record['user'])
+    elif record_type == 'post':
+        message = {key: record[key] for key in ('id', 'sender', 'date', 'subject', 'content')}
+        if record['group'] is None:
+            public_board.restore_post(message)
+        else:
+            board = private_boards.get(record['group'])
+            if board:
+                board.restore_post(message)
+    elif record_type == 'group_create':
+        if record['group'] not in private_boards:
+            private_boards.create_group(record['name'], record['group'])
+    elif record_type == 'group_remove':
+        private_boards.remove_group(record['group'])
+    elif record_type == 'group_join':
+        board = private_boards.get(record['group'])
+        if board:
+            board.members.add(record['user'])
+            board.members_changed()
+    elif record_type == 'group_leave':
+        board = private_boards.get(record['group'])
+        if board:
+            board.members.discard(record['user'])
+            board.members_changed()
+
+def replay_log(path, public_board, private_boards, after_seq=0, repair=True):
+    """
+    Rebuilds the boards from the log at path and returns the sequence number of the last record.
+    Records up to after_seq are skipped because a snapshot already covers them.
+    The boards must not have a log attached yet, or the replayed changes would be logged again.
+    A record torn by a crash mid-write can only be the last one; it is cut off so new records follow a clean line.
+    With repair=False the log is only read (e.g. while a server is still appending to it) and replay stops there.
+    """
+    last_seq = after_seq
+    if not os.path.exists(path):
+        return last_seq
+    with open(path, 'r+b' if repair else 'rb') as log_file:
+        offset = 0
+        for line in log_file:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete record")
+                record = json.loads(line)
+            except ValueError:
+                if repair:
+                    print(f"Truncating torn record at byte {offset} of {path}")
+                    log_file.truncate(offset)
+                break
+            if record['seq'] > after_seq:
+                apply_record(record, public_board, private_boards)
+                last_seq = record['seq']
+            offset += len(line)
+    return last_seq
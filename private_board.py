@@ -1,17 +1,48 @@
 import itertools
+from archive import page_messages
+from message_store import open_message_store
+from search_index import SearchIndex
+from welcome_cache import WelcomeCache
 
 class PrivateBoard:
     group_id_counter = itertools.count(1)  # Class-level counter for unique group IDs
+    last_group_id = 0  # Highest group ID handed out so far
 
-    def __init__(self, group_name):
+    def __init__(self, group_name, group_id=None, log=None, retention=None, archives=None):
         self.group_name = group_name  # Unique name for the group
-        self.group_id = next(PrivateBoard.group_id_counter)  # Automatically assign a unique group ID
+        if group_id is None:
+            group_id = next(PrivateBoard.group_id_counter)  # Automatically assign a unique group ID
+        PrivateBoard.reserve_group_id(group_id)
+        self.group_id = group_id
+        self.log = log  # Optional PostLog that persists every change to this board
         self.members = set()  # Members with access to this private board
-        self.messages = [
+        self.members_version = 0  # Bumped whenever a member joins or leaves, so clients can revalidate %groupusers
+        self.archive = archives.open(group_id) if archives else None  # Read-only archive of older posts, or None
+        self.messages = open_message_store(f'group-{group_id}', [
             {'id': 1, 'sender': 'user3', 'date': '2024-12-02 16:36:44', 'subject': 'PRIVATE subj here', 'content': 'PRIVATE hello world'},
             {'id': 2, 'sender': 'user4', 'date': '2024-12-02 16:42:45', 'subject': 'another SECRET one', 'content': 'hello world again but SECRET'}
-        ]  # Messages specific to this group, starting with two example messages
+        ], retention, self.archive)  # Columnar store of this group's messages by ID, starting with two example messages
+        self.search_index = SearchIndex()  # Words of every post's subject and content, for %search
+        for message in self.messages:
+            self.search_index.add(message['id'], message['subject'], message['content'])
         self.message_counter = itertools.count(3)  # Unique message IDs (starting at 3)
+        self.last_message_id = 2  # Highest message ID handed out so far
+        self.welcome = WelcomeCache(self.build_welcome)  # Payload sent after %groupjoin, rebuilt only after changes
+        if self.archive and self.archive.last_id > self.last_message_id:
+            # Number new posts after the archived ones
+            self.last_message_id = self.archive.last_id
+            self.message_counter = itertools.count(self.archive.last_id + 1)
+        # Archived posts stay searchable through the archive's own postings, without being indexed here
+        self.search_index.archive = self.archive
+
+    @classmethod
+    def reserve_group_id(cls, group_id):
+        """
+        Marks group_id as used. Recovered groups keep their ID, so new groups are numbered after them.
+        """
+        if group_id > cls.last_group_id:
+            cls.last_group_id = group_id
+            cls.group_id_counter = itertools.count(group_id + 1)
 
     def join_group(self, user, group_id):
         """
@@ -21,6 +52,9 @@ class PrivateBoard:
         # Ensure the user is not already in the group
         if user not in self.members:
             self.members.add(user)  # Add user to members set
+            self.members_changed()
+            if self.log:
+                self.log.append({'type': 'group_join', 'group': self.group_id, 'user': user})
             return f"{user} joined group {group_id}."
         else:
             return f"User {user} is already a member of group {group_id}."
@@ -30,16 +64,61 @@ class PrivateBoard:
         Posts a message to the private group, including sender and post date.
         """
         message_id = next(self.message_counter)
-        message = {
-            'id': message_id,
-            'sender': sender,
-            'date': post_date,
-            'subject': subject,
-            'content': content
-        }
-        self.messages.append(message)  # Append the message to the group's message list
+        self.messages.add(message_id, sender, post_date, subject, content)  # Stored by ID, so lookups don't scan
+        self.search_index.add(message_id, subject, content)
+        self.last_message_id = max(self.last_message_id, message_id)
+        self.welcome.invalidate()
+        if self.log:
+            self.log.append({'type': 'post', 'group': self.group_id, 'id': message_id, 'sender': sender, 'date': post_date,
+                             'subject': subject, 'content': content})
         return message_id  # Return the unique message ID
 
+    def restore_post(self, message):
+        """
+        Re-adds a post recovered from the log, keeping its original ID. Posts that are already present are skipped,
+        as are archived posts, which are read (and searched) from the archive instead.
+        """
+        if self.archive and message['id'] in self.archive:
+            return False
+        if not self.messages.add(message['id'], message['sender'], message['date'], message['subject'], message['content']):
+            return False
+        self.search_index.add(message['id'], message['subject'], message['content'])
+        self.welcome.invalidate()
+        if message['id'] > self.last_message_id:
+            # Continue numbering after the highest recovered ID
+            self.last_message_id = message['id']
+            self.message_counter = itertools.count(message['id'] + 1)
+        return True
+
+    def remove_member(self, user):
+        """
+        Removes a user from this group's members. Returns False if they weren't a member.
+        """
+        if user not in self.members:
+            return False
+        self.members.remove(user)
+        self.members_changed()
+        if self.log:
+            self.log.append({'type': 'group_leave', 'group': self.group_id, 'user': user})
+        return True
+
+    def members_changed(self):
+        """
+        Marks the members list changed: the welcome payload is rebuilt and %groupusers gets a new version.
+        """
+        self.members_version += 1
+        self.welcome.invalidate()
+
+    def build_welcome(self):
+        """
+        Returns the text sent after a %groupjoin response: the group's members and its two latest messages.
+        """
+        return (
+            f" Users active in group {self.group_id}: {self.members}"
+            f"\n{self.get_group_message(self.group_id, self.last_message_id)}"
+            f"\n{self.get_group_message(self.group_id, self.last_message_id - 1)}"
+        )
+
     def list_group_users(self, group_id):
         """
         Returns a list of users in the specified group.
@@ -58,15 +137,38 @@ class PrivateBoard:
             return f"{user} left group {group_id}."
         return f"{user} is not in group {group_id}."
 
+    def find_message(self, message_id):
+        """
+        Returns the group message with the given ID as a dict, from memory or the archive, or None.
+        """
+        message = self.messages.get(message_id)
+        if message is None and self.archive:
+            message = self.archive.get(message_id)
+        return message
+
     def get_group_message(self, group_id, message_id):
         """
         Retrieves a specific message from a group based on its ID.
         """
-        # Search for the message with the given ID
-        for message in self.messages:
-            if message['id'] == int(message_id):
-                # Format the message summary similar to the public board's `%message`
-                return f"{message['sender']} on {message['date']}: {message['content']}"
+        # Look up the message with the given ID
+        message = self.find_message(int(message_id))
+        if message:
+            # Format the message summary similar to the public board's `%message`
+            return f"{message['sender']} on {message['date']}: {message['content']}"
         
         # Return an error if the message is not found
-        return f"Error: Message ID '{message_id}' not found in group '{group_id}'."
\ No newline at end of file
+        return f"Error: Message ID '{message_id}' not found in group '{group_id}'."
+
+    def get_group_messages(self, from_id, count):
+        """
+        Returns a page of up to count group messages starting at from_id and the ID the next page starts at (0 at the end).
+        """
+        return page_messages(self.messages, self.archive, from_id, count)
+
+    def search_group_messages(self, query, offset, count):
+        """
+        Returns up to count group messages containing every word of query, newest first, starting at the offset-th match,
+        and the offset the next page starts at (0 when there are no more matches).
+        """
+        message_ids, next_offset = self.search_index.search(query, offset, count)
+        return [self.find_message(message_id) for message_id in message_ids], next_offset
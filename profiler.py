@@ -0,0 +1,139 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from metrics import metrics
+
+# Longest window %profile accepts, so a forgotten profile can't keep sampling the server or grow a large file
+MAX_PROFILE_SECONDS = 60
+# Seconds between two samples of every thread's stack
+SAMPLE_INTERVAL = 0.002
+# Frames kept per sampled stack (the outermost are dropped from deeper ones)
+MAX_STACK_DEPTH = 64
+
+# Whether span_start() times anything: only while a profile window is open, or always with --spans
+spans_enabled = False
+
+def span_start():
+    """
+    Starts timing a hot-path step (parsing, a board call, a broadcast). Returns the time to hand to span_end,
+    or None while spans are off, so a disabled span costs two calls that return at once.
+    """
+    if spans_enabled:
+        return time.perf_counter()
+    return None
+
+def span_end(name, started):
+    """
+    Records the step started at started (from span_start) under name in the metrics, shown by %stats.
+    """
+    if started is not None:
+        metrics.record_span(name, time.perf_counter() - started)
+
+class StackSampler:
+    """
+    Samples the stack of every thread in the process (client handlers, the asyncio event loop and whichever task
+    it is running, log and snapshot threads) every interval seconds for a bounded window, then writes the counts
+    as folded stacks ("thread;outer;...;inner count" per line), which flamegraph.pl and speedscope read.
+    Threads waiting for clients are sampled too and show up under the frame they wait in (e.g. read_frames).
+    """
+    def __init__(self, seconds, path, interval=SAMPLE_INTERVAL):
+        self.seconds = seconds
+        self.path = path
+        self.interval = interval
+        self.stacks = Counter()  # folded stack -> samples
+        self.samples = 0
+        self.labels = {}  # code object -> frame label, so each function is formatted once
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self.labels[code] = label
+        return label
+
+    def sample(self):
+        """
+        Adds one sample of every other thread's stack.
+        """
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(self.label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def run(self):
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+        self.write()
+
+    def write(self):
+        # Written next to its final name and renamed, so a reader never sees half a profile
+        partial = self.path + '.partial'
+        with open(partial, 'w', encoding='utf-8') as profile_file:
+            for stack, count in self.stacks.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        os.replace(partial, self.path)
+
+class Profiler:
+    """
+    Runs the profile windows %profile asks for, one at a time per process: while a window is open, a sampler
+    thread records every thread's stack and spans time parsing, board calls and broadcasts.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profile_dir = tempfile.gettempdir()  # Where profiles are written (set by start_server)
+        self.always_spans = False  # --spans: keep timing spans outside profile windows
+        self.sampler = None  # Sampler of the open window, or None
+
+    def keep_spans(self, enabled):
+        """
+        Turns spans on or off for good (--spans).
+        """
+        global spans_enabled
+        with self.lock:
+            self.always_spans = enabled
+            spans_enabled = enabled or self.sampler is not None
+
+    def start(self, seconds):
+        """
+        Opens a profile window of seconds seconds and returns the response to %profile, which names the file
+        the profile will be written to when the window closes.
+        """
+        global spans_enabled
+        with self.lock:
+            if self.sampler is not None:
+                return f"Error: A profile is already being written to {self.sampler.path}."
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.profile_dir, f"profile-{os.getpid()}-{stamp}.folded")
+            sampler = self.sampler = StackSampler(seconds, path)
+            spans_enabled = True
+        threading.Thread(target=self.run, args=(sampler,), daemon=True, name='profiler').start()
+        return f"Profiling for {seconds} seconds; the profile will be written to {path}."
+
+    def run(self, sampler):
+        global spans_enabled
+        try:
+            sampler.run()
+            print(f"[*] Wrote a profile of {sampler.samples} samples to {sampler.path}")
+        except OSError as e:
+            print(f"Could not write the profile to {sampler.path}: {e}")
+        finally:
+            with self.lock:
+                self.sampler = None
+                spans_enabled = self.always_spans
+
+# The process's profiler, shared by every engine
+profiler = Profiler()
@@ -0,0 +1,314 @@
+import base64
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+import socket_server
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from message_store import Retention
+from multiprocess_server import Broker, WorkerConnection, WorkerLink, resolve_board_key
+from snapshot import load_snapshot, write_snapshot
+from socket_protocol import FRAME_HEADER, MAX_FRAME_SIZE, FrameDecoder, read_frames
+from socket_server import client_sessions, deliver_signal
+
+# A leader accepts followers on its port + 3 (port + 1 carries signals and port + 2 cluster links)
+REPLICATION_PORT_OFFSET = 3
+# Largest message on a replication link; a reply wraps a response of up to MAX_FRAME_SIZE
+LINK_MAX_FRAME_SIZE = 2 * MAX_FRAME_SIZE
+# Bytes of the snapshot sent per message while a follower syncs
+SNAPSHOT_CHUNK_SIZE = 256 * 1024
+# Seconds between the leader's heartbeats, which followers answer with the last change they applied
+HEARTBEAT_INTERVAL = 1.0
+# Messages queued for a follower before it is dropped for falling too far behind
+FOLLOWER_QUEUE_LIMIT = 100000
+
+def encode_value(value):
+    # JSON has no bytes or exceptions, which replies can carry (cached welcome payloads, forwarded errors)
+    if isinstance(value, bytes):
+        return {'__bytes__': value.decode('utf-8')}
+    if isinstance(value, Exception):
+        return {'__error__': type(value).__name__, 'text': str(value)}
+    raise TypeError(f"Can't send a {type(value).__name__} to a follower.")
+
+def decode_value(value):
+    if '__bytes__' in value:
+        return value['__bytes__'].encode('utf-8')
+    if '__error__' in value:
+        # Raised again on the follower, so its client is handled as if the command had run there
+        return ValueError(value['text']) if value['__error__'] == 'ValueError' else RuntimeError(value['text'])
+    return value
+
+def pack_replication_message(message):
+    """
+    Frames a message for a replication link. Followers may run on other machines, so messages are JSON
+    rather than the pickles worker processes use.
+    """
+    payload = json.dumps(message, default=encode_value, ensure_ascii=False).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def read_replication_messages(sock):
+    """
+    Yields the messages received on a replication link until it closes.
+    """
+    for frame in read_frames(sock, FrameDecoder(LINK_MAX_FRAME_SIZE)):
+        yield json.loads(frame, object_hook=decode_value)
+
+def replication_address(leader):
+    """
+    Returns the address followers connect to for a leader at 'host:port' (its client address).
+    """
+    host, port = leader.rsplit(':', 1)
+    return host, int(port) + REPLICATION_PORT_OFFSET
+
+class FollowerConnection(WorkerConnection):
+    """
+    The leader's end of one follower's link. Messages are queued and written by the link's own thread, so a slow
+    follower never holds up changes on the leader; one that falls FOLLOWER_QUEUE_LIMIT messages behind is
+    dropped and has to be restarted to sync again.
+    """
+    def __init__(self, sock):
+        super().__init__(sock)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.address = "%s:%s" % sock.getpeername()[:2]
+        self.outgoing = queue.Queue()
+        self.applied_seq = 0  # Last change the follower reported applying
+        self.reported_at = time.monotonic()  # When it reported it
+        threading.Thread(target=self._write, daemon=True).start()
+
+    def send(self, data):
+        if self.closed:
+            return
+        if self.outgoing.qsize() >= FOLLOWER_QUEUE_LIMIT:
+            print(f"Follower {self.address} fell too far behind; dropping it.")
+            self.close()
+            # Ends the leader's reader for this link, which unregisters it
+            self.sock.shutdown(socket.SHUT_RDWR)
+            return
+        self.outgoing.put(data)
+
+    def close(self):
+        self.closed = True
+        self.outgoing.put(None)
+
+    def _write(self):
+        while True:
+            data = self.outgoing.get()
+            if data is None:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                self.closed = True
+                return
+
+class ReplicationLeader(Broker):
+    """
+    Streams a server's boards to its read replicas. Attached as the boards' log like the multiprocess broker:
+    every change is persisted (with a post log) and sent to each follower, the writes followers forward are run
+    here, and signals go to this server's clients as well as to the followers for theirs.
+    """
+    connection_type = FollowerConnection
+    pack_message = staticmethod(pack_replication_message)
+    read_messages = staticmethod(read_replication_messages)
+
+    def start(self, listener):
+        """
+        Accepts followers on listener and starts sending them heartbeats.
+        """
+        threading.Thread(target=self.serve, args=(listener,), daemon=True).start()
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+        return self
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self.lock:
+                self._send_all(('heartbeat', self.seq))
+
+    def sync(self, link, snapshot_path):
+        """
+        Sends a new follower a snapshot of the boards, then streams it every later change.
+        Followers can be on other machines, so the snapshot travels over the link instead of by path.
+        """
+        descriptor, path = tempfile.mkstemp(suffix='.snapshot')
+        os.close(descriptor)
+        try:
+            with self.lock:
+                write_snapshot(path, self.public_board, self.private_boards, self.seq)
+                with open(path, 'rb') as snapshot:
+                    for chunk in iter(lambda: snapshot.read(SNAPSHOT_CHUNK_SIZE), b""):
+                        link.send(self.pack_message(('snapshot', base64.b64encode(chunk).decode('ascii'))))
+                link.send(self.pack_message(('synced', self.seq)))
+                link.applied_seq = self.seq
+                self.links.append(link)
+        finally:
+            os.remove(path)
+        print(f"[*] Follower {link.address} synced at change {link.applied_seq}")
+
+    def handle_message(self, link, message):
+        if message[0] == 'applied':
+            link.applied_seq = message[1]
+            link.reported_at = time.monotonic()
+
+    def relay(self, message):
+        super().relay(message)
+        if message[0] == 'signal':
+            # A follower's client disconnected; tell this server's clients too
+            _, _, signal_code, kwargs = message
+            key = kwargs.get('target_board')
+            target_board = resolve_board_key(key, self.public_board, self.private_boards)
+            if key is None or target_board is not None:
+                deliver_signal(None, signal_code, **dict(kwargs, target_board=target_board))
+
+    def publish_signal(self, sender_socket, signal_code, kwargs):
+        # Clients connected here, then the followers' clients
+        deliver_signal(socket_server.signal_sessions.get(sender_socket), signal_code, **kwargs)
+        super().publish_signal(sender_socket, signal_code, kwargs)
+
+    def status(self):
+        """
+        Answers %replication on the leader: how far behind each follower was when it last reported.
+        """
+        with self.lock:
+            seq = self.seq
+            links = list(self.links)
+        lines = [f"Leader at change {seq} with {len(links)} follower(s)."]
+        now = time.monotonic()
+        for link in links:
+            lines.append(f"{link.address}: {seq - link.applied_seq} change(s) behind "
+                         f"(applied change {link.applied_seq}, reported {now - link.reported_at:.1f}s ago)")
+        return "\n".join(lines)
+
+class Follower(WorkerLink):
+    """
+    A read replica's link to its leader. Keeps a replica of the leader's boards current from its stream of
+    changes and answers read-only commands from it; commands that change the boards are forwarded to the
+    leader, as a worker process forwards them to its broker. Signals arrive on the same stream and are delivered
+    to the clients connected here.
+    """
+    pack_message = staticmethod(pack_replication_message)
+    read_messages = staticmethod(read_replication_messages)
+    peer_name = 'leader'
+
+    def __init__(self, leader):
+        super().__init__(leader, 0)
+        self.leader = leader  # Leader's client address, 'host:port'
+        self.label = f"replica of {leader}"
+        self.connected = True
+        self.leader_seq = 0  # Latest change the leader reported
+        self.heard_at = time.monotonic()  # When the leader was last heard from
+        self.on_close = self._disconnected
+
+    def connect(self, leader):
+        sock = socket.create_connection(replication_address(leader))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def sync(self, retention=None, archives=None):
+        """
+        Builds the replica from the snapshot the leader sends, then starts applying the leader's stream.
+        Returns the public board and the group registry.
+        """
+        self._send(('hello', None))
+        self.messages = self.read_messages(self.sock)
+        descriptor, path = tempfile.mkstemp(suffix='.snapshot')
+        try:
+            with os.fdopen(descriptor, 'wb') as snapshot:
+                for message in self.messages:
+                    if message[0] != 'snapshot':
+                        break
+                    snapshot.write(base64.b64decode(message[1]))
+                else:
+                    raise ConnectionError("The leader closed the link during the sync.")
+            _, self.applied_seq = message
+            self.leader_seq = self.applied_seq
+            self.public_board = BulletinBoard(retention=retention, archives=archives)
+            self.private_boards = GroupRegistry(retention=retention, archives=archives)
+            load_snapshot(path, self.public_board, self.private_boards)
+        finally:
+            os.remove(path)
+        threading.Thread(target=self._read, daemon=True).start()
+        return self.public_board, self.private_boards
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == 'heartbeat':
+            self.leader_seq = message[1]
+            self._send(('applied', self.applied_seq))
+        else:
+            super()._handle(message)
+            if kind == 'record':
+                self.leader_seq = max(self.leader_seq, self.applied_seq)
+        self.heard_at = time.monotonic()
+
+    def _disconnected(self):
+        # Reads keep being served from the replica as it was; writes fail until the follower is restarted
+        self.connected = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        for request_id in list(self.pending):
+            waiter = self.pending.pop(request_id, None)
+            if waiter:
+                waiter[1] = (ConnectionError("The leader is unavailable."), None)
+                waiter[0].set()
+
+    def execute(self, client_socket, command, params):
+        """
+        Forwards a command that changes the boards to the leader and returns its response.
+        """
+        if not self.connected:
+            return "Error: The leader is unavailable."
+        # The leader names each signal's sender by session token, which WorkerLink.execute gives every client
+        # whose signals are delivered here, so the sender can be left out
+        try:
+            return super().execute(client_socket, command, params)
+        except OSError:
+            return "Error: The leader is unavailable."
+
+    def publish_session(self, client_socket, username):
+        # A follower pairs each client's connections itself, so sessions aren't shared; only forget the token
+        # of a session that ended
+        if username is None:
+            token = client_sessions.get(client_socket, {}).get('token')
+            if token:
+                self.forget_signal_key(token, client_socket)
+
+    def status(self):
+        """
+        Answers %replication on a follower: how far behind the leader the replica is.
+        """
+        state = "connected" if self.connected else "disconnected"
+        return (f"Replica of {self.leader} ({state}): applied change {self.applied_seq} of {self.leader_seq} "
+                f"({self.leader_seq - self.applied_seq} behind), leader last heard {time.monotonic() - self.heard_at:.1f}s ago.")
+
+def start_leader(host, port, public_board, private_boards):
+    """
+    Makes this server the leader of a set of read replicas: its boards stream every change to the followers
+    that connect on port + REPLICATION_PORT_OFFSET.
+    """
+    leader = ReplicationLeader(public_board, private_boards, socket_server.post_log)
+    public_board.log = leader
+    private_boards.attach_log(leader)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port + REPLICATION_PORT_OFFSET))
+    listener.listen(16)
+    socket_server.coordinator = socket_server.replication = leader.start(listener)
+    return leader
+
+def start_follower(leader, hot_posts=None):
+    """
+    Makes this server a read replica of the leader at 'host:port'. Returns its replica of the boards.
+    """
+    retention = Retention(hot_posts, tempfile.mkdtemp(prefix='bulletin-spill-')) if hot_posts else None
+    follower = Follower(leader)
+    public_board, private_boards = follower.sync(retention)
+    socket_server.coordinator = socket_server.replication = follower
+    print(f"[*] Following {leader} from change {follower.applied_seq}")
+    return public_board, private_boards
@@ -0,0 +1,100 @@
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+# Words are runs of letters, digits and underscores; matching ignores case
+WORD = re.compile(r"\w+")
+
+def tokenize(text):
+    """
+    Returns the set of distinct lowercase words in text.
+    """
+    return set(WORD.findall(text.lower()))
+
+def match_postings(word_postings):
+    """
+    Yields the IDs found in every one of the ascending word_postings sequences, highest first. It walks the
+    shortest sequence from the end and checks the others with binary search.
+    """
+    word_postings = sorted(word_postings, key=len)
+    rarest, others = word_postings[0], word_postings[1:]
+    # Candidates only get smaller, so each binary search can stop where the previous one for that word landed
+    bounds = [len(postings) for postings in others]
+    for position in range(len(rarest) - 1, -1, -1):
+        message_id = rarest[position]
+        matched = True
+        for number in range(len(others)):
+            postings = others[number]
+            bound = bounds[number]
+            found = bounds[number] = bisect_left(postings, message_id, 0, bound)
+            if found == bound or postings[found] != message_id:
+                matched = False
+                break
+        if matched:
+            yield message_id
+
+class SearchIndex:
+    """
+    Inverted index from each word to the IDs of the posts that contain it, kept as a sorted array per word.
+    Posts are added as they are made, so searching never scans the board.
+    A search matches the posts containing every word of the query, newest first: it walks the shortest
+    postings array from the end and checks the other words with binary search, stopping as soon as the
+    requested page is full. With an archive, its postings (written by build_archive.py) are searched in
+    place as well and the two streams of matches are merged, so archived posts are never indexed in memory.
+    """
+    def __init__(self, archive=None):
+        self.postings = {}  # word -> array of message IDs in ascending order
+        self.archive = archive  # ArchiveReader whose postings are searched too, or None
+        self.lock = threading.Lock()
+
+    def add(self, message_id, *texts):
+        """
+        Indexes the words of the given texts (e.g. subject and content) under message_id.
+        """
+        words = set()
+        for text in texts:
+            words |= tokenize(text)
+        with self.lock:
+            for word in words:
+                postings = self.postings.get(word)
+                if postings is None:
+                    postings = self.postings[word] = array('I')
+                if postings and postings[-1] > message_id:
+                    # Posts recovered or made concurrently can arrive out of ID order
+                    insort(postings, message_id)
+                else:
+                    postings.append(message_id)
+
+    def search(self, query, offset, count):
+        """
+        Returns up to count IDs of posts containing every word in query, newest first, skipping the first
+        offset matches, and the offset the next page starts at (0 when there are no more matches).
+        """
+        words = tokenize(query)
+        if not words or count <= 0:
+            return [], 0
+        with self.lock:
+            word_postings = [self.postings.get(word) for word in words]
+        sources = []
+        if all(postings is not None for postings in word_postings):
+            sources.append(match_postings(word_postings))
+        if self.archive is not None:
+            archived_postings = [self.archive.postings(word) for word in words]
+            if all(postings is not None for postings in archived_postings):
+                sources.append(match_postings(archived_postings))
+        results = []
+        skipped = 0
+        previous = None
+        for message_id in heapq.merge(*sources, reverse=True):
+            if message_id == previous:
+                continue  # In memory and in the archive (the example posts every board starts with)
+            previous = message_id
+            if skipped < offset:
+                skipped += 1
+            elif len(results) == count:
+                return results, offset + count  # Found one more match, so there is another page
+            else:
+                results.append(message_id)
+        return results, 0
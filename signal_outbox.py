@@ -0,0 +1,301 @@
+import asyncio
+import socket
+import threading
+from collections import deque
+from socket_protocol import RESPONSE_CHANNEL, SIGNAL_CHANNEL, tag_frames
+
+# Most buffers one sendmsg() call accepts (IOV_MAX on Linux)
+MAX_SEND_BUFFERS = 1024
+
+# What to do when a client's outbox is full
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+DISCONNECT = 'disconnect'
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Signals queued per client before the overflow policy applies. Frames are shared between
+# clients, so a full outbox holds references rather than copies.
+DEFAULT_MAX_QUEUED = 1024
+
+def send_frames(sock, frames):
+    """
+    Writes a batch of frames with scatter/gather I/O, so frames shared between clients are sent
+    straight from their one copy instead of being joined into a new buffer per client.
+    """
+    if not hasattr(sock, 'sendmsg'):
+        # No sendmsg() (e.g. Windows), so fall back to one joined write
+        sock.sendall(b"".join(frames))
+        return
+    views = [memoryview(frame) for frame in frames]
+    index = 0
+    while index < len(views):
+        sent = sock.sendmsg(views[index:index + MAX_SEND_BUFFERS])
+        # Skip every buffer that went out completely and trim the one that was sent partially
+        while sent and index < len(views):
+            if sent >= len(views[index]):
+                sent -= len(views[index])
+                index += 1
+            else:
+                views[index] = views[index][sent:]
+                sent = 0
+
+class MultiplexedSocket:
+    """
+    A client connection that carries its responses and its signals as channel-tagged frames. Its command
+    handler and its signal outbox's writer both write to it, so each write holds the connection's lock to keep
+    frames whole. Otherwise it stands in for the socket it wraps (reads, close, session key).
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+
+    def sendall(self, frame):
+        # Responses are written by the command handler as one encoded frame
+        with self.lock:
+            send_frames(self.sock, [RESPONSE_CHANNEL, frame])
+
+    def send_signals(self, frames):
+        with self.lock:
+            send_frames(self.sock, tag_frames(SIGNAL_CHANNEL, frames))
+
+    def recv(self, size):
+        return self.sock.recv(size)
+
+    def shutdown(self, how):
+        self.sock.shutdown(how)
+
+    def close(self):
+        self.sock.close()
+
+class SignalCounters:
+    """
+    Server-wide totals of signals lost or merged because a client's outbox was full.
+    """
+    def __init__(self):
+        self.dropped = 0
+        self.coalesced = 0
+        self.disconnected = 0
+        self.lock = threading.Lock()
+
+    def add(self, dropped=0, coalesced=0, disconnected=0):
+        with self.lock:
+            self.dropped += dropped
+            self.coalesced += coalesced
+            self.disconnected += disconnected
+
+    def snapshot(self):
+        with self.lock:
+            return {'dropped': self.dropped, 'coalesced': self.coalesced, 'disconnected': self.disconnected}
+
+signal_counters = SignalCounters()
+
+class BoundedOutbox:
+    """
+    Bounded queue of encoded signal frames for one client, with a policy for when it fills up:
+    drop_oldest discards the oldest queued signal, coalesce replaces a queued signal with the same
+    key (e.g. presence updates for one user) before dropping the oldest, and disconnect drops the client.
+    Subclasses supply the writer and call _enqueue()/_take_batch() under their own synchronization.
+    """
+    def __init__(self, max_queued=DEFAULT_MAX_QUEUED, overflow_policy=DROP_OLDEST):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+        self.max_queued = max_queued
+        self.overflow_policy = overflow_policy
+        self.queue = deque()  # [coalesce_key, frame] entries waiting to be written
+        self.queued_by_key = {}  # coalesce_key -> its entry in the queue
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def _enqueue(self, payload, coalesce_key):
+        """
+        Adds a frame to the queue, applying the overflow policy. Returns False if the client must be dropped.
+        """
+        if self.overflow_policy == COALESCE and coalesce_key is not None:
+            entry = self.queued_by_key.get(coalesce_key)
+            if entry is not None:
+                # Newer state for the same key replaces the queued one in place
+                entry[1] = payload
+                self.coalesced += 1
+                signal_counters.add(coalesced=1)
+                return True
+
+        if len(self.queue) >= self.max_queued:
+            if self.overflow_policy == DISCONNECT:
+                self.dropped += len(self.queue) + 1
+                signal_counters.add(dropped=len(self.queue) + 1, disconnected=1)
+                self.queue.clear()
+                self.queued_by_key.clear()
+                return False
+            # drop_oldest, and coalesce when nothing could be merged
+            oldest = self.queue.popleft()
+            if self.queued_by_key.get(oldest[0]) is oldest:
+                del self.queued_by_key[oldest[0]]
+            self.dropped += 1
+            signal_counters.add(dropped=1)
+
+        entry = [coalesce_key, payload]
+        self.queue.append(entry)
+        if self.overflow_policy == COALESCE and coalesce_key is not None:
+            self.queued_by_key[coalesce_key] = entry
+        return True
+
+    def _take_batch(self):
+        """
+        Removes and returns every queued frame.
+        """
+        batch = [payload for _, payload in self.queue]
+        self.queue.clear()
+        self.queued_by_key.clear()
+        return batch
+
+class SignalOutbox(BoundedOutbox):
+    """
+    Outbound signal queue for one client's signal socket (or MultiplexedSocket), drained by its own writer thread.
+    put() never blocks, so a slow client can't stall the thread that is broadcasting.
+    """
+    def __init__(self, sock, max_queued=DEFAULT_MAX_QUEUED, overflow_policy=DROP_OLDEST):
+        super().__init__(max_queued, overflow_policy)
+        self.sock = sock
+        self.ready = threading.Condition()
+        self.writer_thread = threading.Thread(target=self._drain, daemon=True)
+        self.writer_thread.start()
+
+    def put(self, payload, coalesce_key=None):
+        """
+        Queues an encoded signal frame for this client. Returns False if the outbox is closed or overflowed.
+        """
+        with self.ready:
+            if self.closed:
+                return False
+            accepted = self._enqueue(payload, coalesce_key)
+            if not accepted:
+                self.closed = True
+            self.ready.notify()
+        if not accepted:
+            # Disconnect policy: unblock the writer and end the client's signal connection
+            self._abort()
+        return accepted
+
+    def close(self):
+        """
+        Stops the writer thread once whatever is already queued has been written.
+        """
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+    def _abort(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _drain(self):
+        while True:
+            with self.ready:
+                while not self.queue and not self.closed:
+                    self.ready.wait()
+                if not self.queue:
+                    return  # Closed and fully drained
+                # Take everything queued so far and write it with one call
+                batch = self._take_batch()
+            try:
+                if isinstance(self.sock, MultiplexedSocket):
+                    self.sock.send_signals(batch)
+                else:
+                    send_frames(self.sock, batch)
+            except OSError as e:
+                print(f"Error sending to client: {e}")
+                self.close()
+                return
+
+class AsyncSignalOutbox(BoundedOutbox):
+    """
+    Outbound signal queue for one client's signal stream, drained by its own task on the event loop.
+    With a channel, the stream is a multiplexed connection and each signal is tagged with it; writes from
+    the loop never interleave, so responses and signals need no lock.
+    put() must be called from the event loop thread.
+    """
+    def __init__(self, writer, max_queued=DEFAULT_MAX_QUEUED, overflow_policy=DROP_OLDEST, channel=None):
+        super().__init__(max_queued, overflow_policy)
+        self.writer = writer
+        self.channel = channel
+        self.ready = asyncio.Event()
+        self.writer_task = asyncio.get_running_loop().create_task(self._drain())
+
+    def put(self, payload, coalesce_key=None):
+        """
+        Queues an encoded signal frame for this client. Returns False if the outbox is closed or overflowed.
+        """
+        if self.closed:
+            return False
+        if not self._enqueue(payload, coalesce_key):
+            # Disconnect policy: drop the client's signal connection
+            self.closed = True
+            self.ready.set()
+            self.writer.transport.abort()
+            return False
+        self.ready.set()
+        return True
+
+    def close(self):
+        """
+        Stops the writer task once whatever is already queued has been written.
+        """
+        self.closed = True
+        self.ready.set()
+
+    async def _drain(self):
+        try:
+            while True:
+                if not self.queue:
+                    if self.closed:
+                        return  # Closed and fully drained
+                    await self.ready.wait()
+                    self.ready.clear()
+                    continue
+                batch = self._take_batch()
+                self.writer.writelines(tag_frames(self.channel, batch) if self.channel else batch)
+                # Waits only while this client's transport buffer is full; other tasks keep running
+                await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            print(f"Error sending to client: {e}")
+            self.closed = True
+
+class SubscriberIndex:
+    """
+    Maps each username to the signal outboxes of its connected sessions.
+    Broadcasting to a board walks the board's member set and looks each member up here,
+    so fan-out costs O(members) instead of a pass over every connected client.
+    """
+    def __init__(self):
+        self.outboxes_by_user = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, username, outbox):
+        with self.lock:
+            self.outboxes_by_user.setdefault(username, set()).add(outbox)
+
+    def unsubscribe(self, username, outbox):
+        with self.lock:
+            outboxes = self.outboxes_by_user.get(username)
+            if outboxes:
+                outboxes.discard(outbox)
+                if not outboxes:
+                    del self.outboxes_by_user[username]
+
+    def outboxes_for(self, usernames):
+        """
+        Returns the outboxes of every connected session belonging to one of the given users.
+        """
+        recipients = []
+        with self.lock:
+            for username in list(usernames):
+                outboxes = self.outboxes_by_user.get(username)
+                if outboxes:
+                    recipients.extend(outboxes)
+        return recipients
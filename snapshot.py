@@ -0,0 +1,185 @@
+import mmap
+import os
+import struct
+import threading
+from post_log import fsync_directory
+from private_board import PrivateBoard
+
+# File in the data directory that holds the latest snapshot
+SNAPSHOT_NAME = 'boards.snapshot'
+
+# Snapshot layout (all integers big-endian, every string is a u32 byte length followed by UTF-8):
+#   header   magic, seq of the last logged change included, highest group ID ever handed out
+#   users    u32 count, then each username
+#   posts    u32 count, then each post as u32 id, u32 byte lengths of sender, date, subject and content,
+#            then those four fields back to back (so a post is decoded with one unpack)
+#   groups   u32 count, then each group as u32 id + name, u32 member count + members, posts as above
+SNAPSHOT_MAGIC = b'BBSNAP01'
+HEADER = struct.Struct('!8sQI')
+COUNT = struct.Struct('!I')
+POST_HEADER = struct.Struct('!IIIII')
+
+def _pack_string(text):
+    data = text.encode('utf-8')
+    return COUNT.pack(len(data)) + data
+
+def _write_posts(snapshot_file, messages):
+    snapshot_file.write(COUNT.pack(len(messages)))
+    for message in messages:
+        fields = [message[key].encode('utf-8') for key in ('sender', 'date', 'subject', 'content')]
+        snapshot_file.write(POST_HEADER.pack(message['id'], *map(len, fields)) + b"".join(fields))
+
+def write_snapshot(path, public_board, private_boards, seq):
+    """
+    Writes the state of every board to path, recording seq as the last logged change it contains.
+    The snapshot is written to a temporary file and renamed into place, so a crash leaves the old one intact.
+    Boards may keep changing while this runs; anything logged after seq is replayed on top when loading.
+    """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as snapshot_file:
+        snapshot_file.write(HEADER.pack(SNAPSHOT_MAGIC, seq, PrivateBoard.last_group_id))
+        # list() copies each collection in one step, so concurrent changes can't break the iteration
+        users = list(public_board.users)
+        snapshot_file.write(COUNT.pack(len(users)))
+        for user in users:
+            snapshot_file.write(_pack_string(user))
+        _write_posts(snapshot_file, list(public_board.messages))
+        boards = list(private_boards)
+        snapshot_file.write(COUNT.pack(len(boards)))
+        for board in boards:
+            members = list(board.members)
+            snapshot_file.write(COUNT.pack(board.group_id) + _pack_string(board.group_name) + COUNT.pack(len(members)))
+            for member in members:
+                snapshot_file.write(_pack_string(member))
+            _write_posts(snapshot_file, list(board.messages))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temporary_path, path)
+    fsync_directory(path)
+
+class SnapshotReader:
+    """
+    Walks a memory-mapped snapshot, decoding values in place without reading the file into memory first.
+    """
+    def __init__(self, view):
+        self.view = view
+        self.offset = 0
+
+    def count(self):
+        value, = COUNT.unpack_from(self.view, self.offset)
+        self.offset += COUNT.size
+        return value
+
+    def string(self):
+        length = self.count()
+        text = str(self.view[self.offset:self.offset + length], 'utf-8')
+        self.offset += length
+        return text
+
+    def posts(self):
+        view = self.view
+        offset = self.offset + COUNT.size
+        messages = []
+        for _ in range(self.count()):
+            message_id, sender_length, date_length, subject_length, content_length = POST_HEADER.unpack_from(view, offset)
+            offset += POST_HEADER.size
+            end = offset + sender_length + date_length + subject_length + content_length
+            # Decode the four fields at once; the text can be sliced by byte length only when it is ASCII
+            text = str(view[offset:end], 'utf-8')
+            date_start = sender_length
+            subject_start = date_start + date_length
+            content_start = subject_start + subject_length
+            if len(text) != end - offset:
+                text = view[offset:end]
+            message = {'id': message_id, 'sender': text[:date_start], 'date': text[date_start:subject_start],
+                       'subject': text[subject_start:content_start], 'content': text[content_start:]}
+            if not isinstance(text, str):
+                message = {key: value if key == 'id' else str(value, 'utf-8') for key, value in message.items()}
+            messages.append(message)
+            offset = end
+        self.offset = offset
+        return messages
+
+def read_snapshot_seq(path):
+    """
+    Returns the seq of the last logged change the snapshot at path contains, reading only its header.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+        return 0
+    with open(path, 'rb') as snapshot_file:
+        magic, seq, _ = HEADER.unpack(snapshot_file.read(HEADER.size))
+    return seq if magic == SNAPSHOT_MAGIC else 0
+
+def load_snapshot(path, public_board, private_boards):
+    """
+    Restores the boards from the snapshot at path and returns the seq of the last logged change it contains
+    (0 when there is no snapshot). The boards must not have a log attached yet.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    with open(path, 'rb') as snapshot_file, mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        magic, seq, last_group_id = HEADER.unpack_from(view, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a bulletin board snapshot")
+        reader = SnapshotReader(view)
+        reader.offset = HEADER.size
+        for _ in range(reader.count()):
+            public_board.add_user(reader.string())
+        for message in reader.posts():
+            public_board.restore_post(message)
+        for _ in range(reader.count()):
+            group_id = reader.count()
+            group_name = reader.string()
+            board = private_boards.get(group_id) or private_boards.create_group(group_name, group_id)
+            board.members.update(reader.string() for _ in range(reader.count()))
+            for message in reader.posts():
+                board.restore_post(message)
+    # Keep removed groups' IDs retired, even when the highest one no longer has a board
+    PrivateBoard.reserve_group_id(last_group_id)
+    return seq
+
+class Snapshotter:
+    """
+    Background thread that snapshots the boards every interval seconds once at least min_changes
+    changes have been logged since the last snapshot, then truncates the log behind the snapshot.
+    """
+    def __init__(self, data_dir, public_board, private_boards, log, interval=60.0, min_changes=1000, last_seq=0):
+        self.path = os.path.join(data_dir, SNAPSHOT_NAME)
+        self.public_board = public_board
+        self.private_boards = private_boards
+        self.log = log
+        self.interval = interval
+        self.min_changes = min_changes
+        self.snapshot_seq = last_seq  # seq covered by the snapshot on disk
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def take_snapshot(self):
+        """
+        Writes a snapshot of the boards now and drops the log records it covers. Returns the snapshot's seq.
+        """
+        # Everything logged up to seq has already been applied to the boards, so the snapshot includes it
+        seq = self.log.last_seq
+        write_snapshot(self.path, self.public_board, self.private_boards, seq)
+        self.log.truncate_through(seq)
+        self.snapshot_seq = seq
+        return seq
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if self.log.last_seq - self.snapshot_seq >= self.min_changes:
+                try:
+                    self.take_snapshot()
+                except OSError as e:
+                    print(f"Error writing snapshot: {e}")
+                except Exception as e:
+                    # Keep running: if this thread ended, the post log would never be truncated again
+                    print(f"Unexpected error taking snapshot: {e!r}")
@@ -1,72 +1,175 @@
-import socket
-import threading
+import argparse
 import asyncio
-from socket_protocol import format_client_command, parse_bulletin_message
+import os
+import secrets
+import sys
+import threading
+from collections import deque
+from client_cache import ResponseCache
+from socket_protocol import MAX_PAGE_SIZE, RECV_BUFFER_SIZE, SEARCH_PAGE_SIZE, FrameDecoder, encode_frame
+from socket_protocol import RESPONSE_CHANNEL, SIGNAL_CHANNEL, ChannelFrameDecoder, format_client_command
+from socket_protocol import parse_message_page
 
 username = None  # Global variable to track the joined username
+multiplex = False  # Whether to connect with one multiplexed connection (set by --multiplex)
 
-def connect_to_server(host, port):
+class ServerConnection:
     """
-    Establishes a connection to the server and returns the connected socket.
-    Also establishes a daemon thread to listen for broadcasted signals.
+    A connection to the server on asyncio streams. A reader task per stream dispatches every frame that
+    arrives: responses complete the commands waiting for them in the order the commands were sent (the server
+    answers each connection's commands in order), and signals are shown as soon as they come in. Several
+    commands can be outstanding at once. The connection's cache remembers posts and listings already received.
+    """
+    def __init__(self, reader, writer, signal_reader=None, signal_writer=None):
+        self.writer = writer
+        self.signal_writer = signal_writer
+        self.unanswered = deque()  # Futures of sent commands, completed by the reader as responses arrive
+        self.unclaimed = deque()  # The same futures, handed out in send order by next_response()
+        self.closed = False
+        self.cache = ResponseCache()  # Posts and versioned listings received on this connection
+        if signal_reader is None:
+            # Multiplexed: one stream, one reader task for both responses and signals
+            self.tasks = [asyncio.create_task(self._read(reader, ChannelFrameDecoder()))]
+        else:
+            self.tasks = [asyncio.create_task(self._read(reader, FrameDecoder(), RESPONSE_CHANNEL)),
+                          asyncio.create_task(self._read(signal_reader, FrameDecoder(), SIGNAL_CHANNEL))]
+
+    def sendall(self, data):
+        """
+        Sends one encoded command. Its response is the one returned by the matching next_response() call.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        if self.closed:
+            waiter.set_result(None)
+        else:
+            self.unanswered.append(waiter)
+            # The transport buffers the data, so sending never blocks the event loop
+            self.writer.write(data)
+        self.unclaimed.append(waiter)
+
+    def answer(self, response):
+        """
+        Queues a response the client already has (from its cache) in place of sending a command. The matching
+        next_response() call returns it once the commands sent before it are answered, so responses still come
+        back in the order they were asked for.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        if self.unanswered:
+            self.unanswered[-1].add_done_callback(lambda _: waiter.set_result(response))
+        else:
+            waiter.set_result(response)
+        self.unclaimed.append(waiter)
+
+    async def next_response(self):
+        """
+        Waits for the response to the oldest command whose response hasn't been asked for yet.
+        Returns None if the connection closed first.
+        """
+        return await self.unclaimed.popleft()
+
+    async def _read(self, reader, decoder, channel=None):
+        """
+        Reads one stream until it closes. A plain stream's frames all belong to channel; a multiplexed stream
+        tags each frame with its own.
+        """
+        try:
+            while True:
+                data = await reader.read(RECV_BUFFER_SIZE)
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    self._dispatch(*((channel, frame) if channel else frame))
+        except (ConnectionError, OSError, ValueError) as e:
+            print(f"Connection error: {e}")
+        finally:
+            if channel != SIGNAL_CHANNEL:
+                self._lost()
+
+    def _dispatch(self, channel, payload):
+        if channel == SIGNAL_CHANNEL:
+            show_signal(payload.decode('utf-8').strip())
+        elif self.unanswered:
+            self.unanswered.popleft().set_result(payload.decode('utf-8'))
+
+    def _lost(self):
+        # Commands still waiting get None, as if each had been answered by a closed connection
+        self.closed = True
+        while self.unanswered:
+            waiter = self.unanswered.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def close(self):
+        """
+        Closes the connection and stops its reader tasks.
+        """
+        self._lost()
+        for task in self.tasks:
+            task.cancel()
+        self.writer.close()
+        if self.signal_writer:
+            self.signal_writer.close()
+
+async def connect_to_server(host, port, multiplexed=False):
+    """
+    Establishes a connection to the server and returns it as a ServerConnection, whose reader tasks
+    listen for broadcasted signals. With multiplexed, signals arrive on the same connection as responses
+    (the server must run with --multiplex); otherwise a second connection to port + 1 carries them.
     """
-    # Create a socket object using IPv4 (AF_INET) and TCP (SOCK_STREAM)
-    client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
     # Attempt to establish a connection to the specified host and port
-    client_socket.connect((host, port))
+    reader, writer = await asyncio.open_connection(host, port)
+
+    if multiplexed:
+        # No second connection to open or pair, so no session token either
+        print("Connected to the server (multiplexed).")
+        return ServerConnection(reader, writer)
 
     # Second connection: dedicated signal listening
-    signal_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     print("Host and port:",host,port)
-    signal_socket.connect((host, port+1))
+    signal_reader, signal_writer = await asyncio.open_connection(host, port+1)
+
+    # Name both connections with one random token, so a server running several worker processes can pair
+    # them even when different workers accept them; the server confirms the token with one response frame
+    session_token = secrets.token_hex(8)
+    signal_writer.write(encode_frame(f"SESSION {session_token}"))
+    connection = ServerConnection(reader, writer, signal_reader, signal_writer)
+    send_command(connection, '%session', session_token)
+    await connection.next_response()
 
     # If successful, print a confirmation message
     print("Connected to the server.")
+    return connection
 
-    # Start a daemon thread to listen for signals
-    listener_thread = threading.Thread(target=listen_for_signals, args=(signal_socket,), daemon=True)
-    listener_thread.start()
-
-    # Return the connected socket for further communication
-    return client_socket
-
-def listen_for_signals(signal_socket):
+def show_signal(message):
     """
-    Listens for signal messages from the server.
+    Prints a signal received from the server.
     """
-    try:
-        while True:
-            message = signal_socket.recv(1024).decode('utf-8').strip()
-            if message:
-                #print(f"Received: {message}")
+    if message:
+        #print(f"Received: {message}")
 
-                if message.startswith("JOIN_SIGNAL"):
-                    _, username = message.split(maxsplit=1)
-                    print(f"\nUser joined: {username}\nEnter command: ")
+        if message.startswith("JOIN_SIGNAL"):
+            _, username = message.split(maxsplit=1)
+            print(f"\nUser joined: {username}\nEnter command: ")
 
-                elif message.startswith("LEAVE_SIGNAL"):
-                    _, username = message.split(maxsplit=1)
-                    print(f"\nUser left: {username}\nEnter command: ")
+        elif message.startswith("LEAVE_SIGNAL"):
+            _, username = message.split(maxsplit=1)
+            print(f"\nUser left: {username}\nEnter command: ")
 
-                elif message.startswith("GROUP_JOIN_SIGNAL"):
-                    _, group, username = message.split(maxsplit=2)
-                    print(f"\nUser {username} joined group {group}\nEnter command: ")
+        elif message.startswith("GROUP_JOIN_SIGNAL"):
+            _, group, username = message.split(maxsplit=2)
+            print(f"\nUser {username} joined group {group}\nEnter command: ")
 
-                elif message.startswith("GROUP_LEAVE_SIGNAL"):
-                    _, group, username = message.split(maxsplit=2)
-                    print(f"\nUser {username} left group {group}\nEnter command: ")
+        elif message.startswith("GROUP_LEAVE_SIGNAL"):
+            _, group, username = message.split(maxsplit=2)
+            print(f"\nUser {username} left group {group}\nEnter command: ")
 
-                elif message.startswith("POST_SIGNAL"):
-                    _, post_summary = message.split(maxsplit=1)
-                    print(f"\nPost summary: {post_summary}\nEnter command: ")
+        elif message.startswith("POST_SIGNAL"):
+            _, post_summary = message.split(maxsplit=1)
+            print(f"\nPost summary: {post_summary}\nEnter command: ")
 
-                elif message.startswith("GROUP_POST_SIGNAL"):
-                    _, post_summary = message.split(maxsplit=1)
-                    print(f"\nPost summary: {post_summary}\nEnter command: ")
-
-    except (socket.error, Exception) as e:
-        print(f"Signal listening error: {e}")
+        elif message.startswith("GROUP_POST_SIGNAL"):
+            _, post_summary = message.split(maxsplit=1)
+            print(f"\nPost summary: {post_summary}\nEnter command: ")
 
 def send_command(client_socket, command, *params):
     """
@@ -77,8 +180,8 @@ def send_command(client_socket, command, *params):
 
     # Send only if formatted_command is not empty
     if formatted_command:
-        # Encode the formatted command as a UTF-8 byte string and send it through the socket
-        client_socket.send(formatted_command.encode('utf-8'))
+        # Encode the formatted command as one length-prefixed frame and send it through the socket
+        client_socket.sendall(encode_frame(formatted_command))
 
         # Print the formatted command to the console for confirmation and debugging
         #print(f"Sent: {formatted_command.strip()}") # Debugging message
@@ -87,48 +190,141 @@ def send_command(client_socket, command, *params):
 
 async def receive_response(client_socket):
     """
-    Receives and processes all responses from the server until no more data is available.
-    If the response is a bulletin message, it parses and formats it accordingly.
+    Receives the response to the oldest command sent on the connection that hasn't been received yet.
+    Call it right after send_command() (before awaiting anything else) so that concurrent commands each
+    get their own response.
     """
-    loop = asyncio.get_event_loop()
-    buffer = ""  # Accumulates data
+    response = await client_socket.next_response()
+    if response is None:
+        print("Connection closed by the server.")
+    return response
 
-    try:
-        while True:
-            # Attempt to receive up to 1024 bytes from the server
-            response_part = await loop.sock_recv(client_socket, 1024)
-
-            if not response_part:
-                break  # Connection closed by the server
-            
-            # Decode
-            buffer += response_part.decode('utf-8')
-
-            # Process complete message
-            while "\r\n" in buffer:
-                message, buffer = buffer.split("\r\n", 1)
-            return message
-    except Exception as e:
-        print("Error during receive:", e)
-
-    # Combine all parts to form the complete response
-    response = ''.join(message)
-    print(f"Raw Full Response:", response)
-
-    # Handle and display the response as appropriate
-    if response.startswith('%post '):
-        parsed_message = parse_bulletin_message(response)
-        if parsed_message:
-            print("Parsed Bulletin Message:")
-            for key, value in parsed_message.items():
-                print(f"{key}: {value}")
-        else:
-            print("Failed to parse bulletin message.")
+async def request_post(client_socket, key, command, *params):
+    """
+    Returns the response to a %message or %groupmessage command, from the connection's cache if the post was
+    read before. Posts never change, so a cached one is never asked for again.
+    """
+    cached = client_socket.cache.get_post(key)
+    if cached is not None:
+        client_socket.answer(cached)
     else:
-        print("Response:", response)
-
+        send_command(client_socket, command, *params)
+    response = await receive_response(client_socket)
+    if cached is None and response is not None and not response.startswith("Error") and response != "Message not found.":
+        client_socket.cache.store_post(key, response)
     return response
 
+async def request_listing(client_socket, key, command, *params):
+    """
+    Returns a listing (%users, %groups, %groupusers), sending the version cached on the connection so the
+    server only sends the listing again if it changed.
+    """
+    version = client_socket.cache.listing_version(key)
+    send_command(client_socket, command, *params, f"@{version}")
+    response = await receive_response(client_socket)
+    return client_socket.cache.resolve_listing(key, response)
+
+class ConsoleInput:
+    """
+    Reads lines typed at the console without blocking the event loop, so signals and responses are handled
+    while the user types. On POSIX the loop watches stdin itself; where it can't (the Windows console, or
+    stdin redirected from a file) a daemon thread reads stdin instead.
+    """
+    def __init__(self):
+        self.reader = None
+        self.lines = None
+        self.nonblocking_fd = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        try:
+            reader = asyncio.StreamReader()
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+            self.reader = reader
+            self.nonblocking_fd = sys.stdin.fileno()
+        except (NotImplementedError, ValueError, OSError):
+            self.lines = asyncio.Queue()
+            threading.Thread(target=self._read_stdin, args=(loop,), daemon=True).start()
+        return self
+
+    def _read_stdin(self, loop):
+        for line in sys.stdin:
+            loop.call_soon_threadsafe(self.lines.put_nowait, line)
+        loop.call_soon_threadsafe(self.lines.put_nowait, "")
+
+    async def readline(self):
+        """
+        Returns the next line without its line ending. Raises EOFError once stdin is closed.
+        """
+        if self.reader:
+            line = (await self.reader.readline()).decode('utf-8')
+        else:
+            line = await self.lines.get()
+        if not line:
+            raise EOFError
+        return line.rstrip("\r\n")
+
+    def close(self):
+        # The loop made stdin non-blocking, which the terminal shares with the shell we return to
+        if self.nonblocking_fd is not None:
+            os.set_blocking(self.nonblocking_fd, True)
+
+async def stream_pages(client_socket, command, params, from_id, count):
+    """
+    Fetches count messages starting at from_id one page (at most MAX_PAGE_SIZE messages) at a time and
+    prints each page as it arrives. The next page is requested before the current one is printed.
+    """
+    remaining = count
+    send_command(client_socket, command, *params, str(from_id), str(min(remaining, MAX_PAGE_SIZE)))
+    while True:
+        response = await receive_response(client_socket)
+        if response is None:
+            return
+        page = parse_message_page(response)
+        if page is None:
+            # Not a page, e.g. an error from the server
+            print(response)
+            return
+        lines, next_id = page
+        remaining -= len(lines)
+        more = bool(lines) and next_id != 0 and remaining > 0
+        if more:
+            send_command(client_socket, command, *params, str(next_id), str(min(remaining, MAX_PAGE_SIZE)))
+        for line in lines:
+            print(line)
+        if not more:
+            if remaining == count:
+                print("No messages found.")
+            return
+
+def split_search_terms(words):
+    """
+    Splits the words after a search command into the result offset (an optional leading "@<offset>") and the terms.
+    """
+    if words and words[0].startswith('@') and words[0][1:].isdigit():
+        return int(words[0][1:]), " ".join(words[1:])
+    return 0, " ".join(words)
+
+async def show_search_page(client_socket, command, params, offset, terms):
+    """
+    Requests one page of search results and prints it, followed by the command that shows the next page.
+    """
+    send_command(client_socket, command, *params, str(offset), str(SEARCH_PAGE_SIZE), terms)
+    response = await receive_response(client_socket)
+    if response is None:
+        return
+    page = parse_message_page(response)
+    if page is None:
+        print(response)
+        return
+    lines, next_offset = page
+    if not lines:
+        print("No matching messages.")
+    for line in lines:
+        print(line)
+    if next_offset:
+        print(f"More results: {command} {' '.join(params + [f'@{next_offset}', terms])}")
+
 async def parse_command(command, client_socket):
     """
     Parses and sends commands based on user input.
@@ -145,7 +341,7 @@ async def parse_command(command, client_socket):
         try:
             port = int(port)  # Convert port to integer
             # Attempt to connect to the server
-            client_socket = connect_to_server(host, port)
+            client_socket = await connect_to_server(host, port, multiplex)
         except Exception as e:
             print(f"Failed to connect: {e}")
             client_socket = None
@@ -199,8 +395,45 @@ async def parse_command(command, client_socket):
 
     # Handle the %users command to request the list of users.
     elif command.startswith('%users'):
-        # Send the %users command to the server without additional parameters
-        send_command(client_socket, '%users')
+        # Send the %users command to the server with the version of the list cached so far
+        response = await request_listing(client_socket, 'users', '%users')
+        print(response)
+        return client_socket
+
+    # Handle the %replication command to show how far a read replica (or a leader's followers) is behind
+    elif command.startswith('%replication'):
+        send_command(client_socket, '%replication')
+        response = await receive_response(client_socket)
+        print(response)
+        return client_socket
+
+    # Handle the %admin command to unlock the server's admin commands with its admin token
+    elif command.startswith('%admin'):
+        parts = command.split()
+        if len(parts) != 2:
+            print("Usage: %admin <token>")
+            return client_socket
+
+        send_command(client_socket, '%admin', parts[1])
+        response = await receive_response(client_socket)
+        print(response)
+        return client_socket
+
+    # Handle the %stats command to show the server's command latencies, traffic and signal queues
+    elif command.startswith('%stats'):
+        send_command(client_socket, '%stats')
+        response = await receive_response(client_socket)
+        print(response)
+        return client_socket
+
+    # Handle the %profile command to profile the server for a number of seconds
+    elif command.startswith('%profile'):
+        parts = command.split()
+        if len(parts) != 2 or not parts[1].isdigit():
+            print("Usage: %profile <seconds>")
+            return client_socket
+
+        send_command(client_socket, '%profile', parts[1])
         response = await receive_response(client_socket)
         print(response)
         return client_socket
@@ -213,6 +446,26 @@ async def parse_command(command, client_socket):
         print(response)
         return client_socket
 
+    # Handle the %messages command to read a range of messages, streamed one page at a time.
+    elif command.startswith('%messages'):
+        parts = command.split()
+        if len(parts) != 3 or not parts[1].isdigit() or not parts[2].isdigit():
+            print("Usage: %messages <from_id> <count>")
+            return client_socket
+
+        await stream_pages(client_socket, '%messages', [], int(parts[1]), int(parts[2]))
+        return client_socket
+
+    # Handle the %search command to find public messages containing every given word.
+    elif command.startswith('%search'):
+        offset, terms = split_search_terms(command.split()[1:])
+        if not terms:
+            print("Usage: %search [@<offset>] <terms>")
+            return client_socket
+
+        await show_search_page(client_socket, '%search', [], offset, terms)
+        return client_socket
+
     # Handle the %message command to request a specific message by ID.
     elif command.startswith('%message'):
         # Split the command into parts
@@ -224,9 +477,8 @@ async def parse_command(command, client_socket):
             return client_socket
         
         message_id = parts[1]
-        # Send the %message command to retrieve the message with the specified ID.
-        send_command(client_socket, '%message', message_id)
-        response = await receive_response(client_socket)
+        # Send the %message command to retrieve the message with the specified ID, unless it's cached
+        response = await request_post(client_socket, (None, message_id), '%message', message_id)
         print(response)
         return client_socket
 
@@ -238,7 +490,7 @@ async def parse_command(command, client_socket):
         response = await receive_response(client_socket)
         print(response)
 
-        # Close the socket connection
+        # Close the connection and stop its reader tasks
         client_socket.close()
         client_socket = False
         username = None
@@ -248,25 +500,36 @@ async def parse_command(command, client_socket):
 
     ### Part 2 Commands ###
     
+    # Handle the %groupsearch command to find a group's messages containing every given word
+    # (checked before %groups, which it starts with)
+    elif command.startswith('%groupsearch'):
+        parts = command.split()
+        offset, terms = split_search_terms(parts[2:])
+        if len(parts) < 3 or not parts[1].isdigit() or not terms:
+            print("Usage: %groupsearch <group_id> [@<offset>] <terms>")
+            return client_socket
+
+        await show_search_page(client_socket, '%groupsearch', [parts[1]], offset, terms)
+        return client_socket
+
     # Handle the %groups command to list available groups
     elif command.startswith('%groups'):
         # Send the %groups command to retrieve the list of groups from the server
-        send_command(client_socket, '%groups')
-        response = await receive_response(client_socket)
+        response = await request_listing(client_socket, 'groups', '%groups')
         print(response)
         return client_socket
 
-    # Handle the %groupjoin command to join a specified group by ID
+    # Handle the %groupjoin command to join a specified group by ID or name
     elif command.startswith('%groupjoin'):
-        # Split the command into parts
-        parts = command.split()
+        # Split the command into the command and the group ID or name
+        parts = command.split(maxsplit=1)
 
         # Check if Group ID is provided
         if len(parts) != 2:
-            print("Usage: %groupjoin <group_id>")
+            print("Usage: %groupjoin <group_id or group_name>")
             return client_socket
 
-        group_id = parts[1]
+        group_id = parts[1].strip()
         # Send the %groupjoin command with the specified group ID to join the group
         send_command(client_socket, '%groupjoin', group_id)
         response = await receive_response(client_socket)
@@ -309,11 +572,8 @@ async def parse_command(command, client_socket):
             _, group_id = command.split(maxsplit=1)
             group_id = group_id.strip()
 
-            # Send the %groupusers command with the group ID to the server
-            send_command(client_socket, f"%groupusers {group_id}")
-
-            # Receive and display the response from the server
-            response = await receive_response(client_socket)
+            # Send the %groupusers command with the group ID to the server, and receive and display the response
+            response = await request_listing(client_socket, ('groupusers', group_id), '%groupusers', group_id)
             print(f"Users in group {group_id}:\n{response}")
             return client_socket
         except ValueError:
@@ -340,6 +600,16 @@ async def parse_command(command, client_socket):
             print("Usage: %groupleave <group_id>")
             return client_socket
 
+    # Handle the %groupmessages command to read a range of a group's messages, streamed one page at a time
+    elif command.startswith('%groupmessages'):
+        parts = command.split()
+        if len(parts) != 4 or not all(part.isdigit() for part in parts[1:]):
+            print("Usage: %groupmessages <group_id> <from_id> <count>")
+            return client_socket
+
+        await stream_pages(client_socket, '%groupmessages', [parts[1]], int(parts[2]), int(parts[3]))
+        return client_socket
+
     # Handle the %groupmessage command to fetch a specific message from a group
     elif command.startswith('%groupmessage'):
         try:
@@ -353,12 +623,8 @@ async def parse_command(command, client_socket):
                 print("Error: Group ID and Message ID must be numeric.")
                 return client_socket
 
-            # Construct the command to send to the server
-            final_message = f"%groupmessage {group_id} {message_id}"
-            send_command(client_socket, final_message)
-
-            # Await and print the response from the server
-            response = await receive_response(client_socket)
+            # Send the command to the server unless the message is cached, and print the response
+            response = await request_post(client_socket, (group_id, message_id), '%groupmessage', group_id, message_id)
             print(response)
             return client_socket
 
@@ -366,6 +632,30 @@ async def parse_command(command, client_socket):
             print("Usage: %groupmessage <group_id> <message_id>")
             return client_socket
 
+    # Handle the %groupcreate command to create a new group at runtime
+    elif command.startswith('%groupcreate'):
+        parts = command.split(maxsplit=1)
+        if len(parts) != 2:
+            print("Usage: %groupcreate <group_name>")
+            return client_socket
+
+        send_command(client_socket, '%groupcreate', parts[1].strip())
+        response = await receive_response(client_socket)
+        print(response)
+        return client_socket
+
+    # Handle the %groupremove command to remove an empty group
+    elif command.startswith('%groupremove'):
+        parts = command.split()
+        if len(parts) != 2 or not parts[1].isdigit():
+            print("Usage: %groupremove <group_id>")
+            return client_socket
+
+        send_command(client_socket, '%groupremove', parts[1])
+        response = await receive_response(client_socket)
+        print(response)
+        return client_socket
+
     # Handle unknown commands
     else:
         print("Unknown command.")
@@ -374,24 +664,62 @@ async def parse_command(command, client_socket):
 async def main():
     # Start with no connection
     client_socket = None
+    console = await ConsoleInput().start()
+
+    # Commands sent but not yet answered. Each runs as its own task, so the next command can be typed and
+    # sent while earlier ones are outstanding; their responses are printed in the order they were sent.
+    in_flight = set()
+    reading = False  # Whether the loop is waiting for the next line
+
+    def prompt():
+        print("Enter command: ", end="", flush=True)
+
+    def command_done(task):
+        in_flight.discard(task)
+        # Prompt again once the last outstanding response is printed
+        if reading and not in_flight:
+            prompt()
 
     # Prompt user for username
     global username
-    username = input("Enter username: ")
+    print("Enter username: ", end="", flush=True)
+    try:
+        username = await console.readline()
 
-    # Command loop
-    while True:
-        command = input("Enter command: ")
-        # Call parse_command to handle the command and update client_socket
-        if command.startswith('%connect') or client_socket:
-            client_socket = await parse_command(command, client_socket)
-        else:
-            # Notify user to connect first if client_socket is None and not using %connect
-            print("Please connect to the server first using %connect <address> <port>.")
-            continue
-        # Break the loop if parse_command returns False (i.e., on %exit command)
-        if client_socket is False:
-            break
+        # Command loop
+        prompt()
+        while True:
+            reading = True
+            command = await console.readline()
+            reading = False
+            if not command.startswith('%connect') and not client_socket:
+                # Notify user to connect first if client_socket is None and not using %connect
+                print("Please connect to the server first using %connect <address> <port>.")
+                prompt()
+                continue
+            if command.startswith(('%connect', '%exit')):
+                # These replace the connection, so every outstanding command is answered first
+                if in_flight:
+                    await asyncio.gather(*in_flight)
+                client_socket = await parse_command(command, client_socket)
+                # Break the loop if parse_command returns False (i.e., on %exit command)
+                if client_socket is False:
+                    break
+                prompt()
+            else:
+                task = asyncio.create_task(parse_command(command, client_socket))
+                in_flight.add(task)
+                task.add_done_callback(command_done)
+    except EOFError:
+        # stdin closed; let what was already sent be answered
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        console.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulletin board client")
+    parser.add_argument('--multiplex', action='store_true',
+                        help="Receive responses and signals on one connection (for servers run with --multiplex)")
+    multiplex = parser.parse_args().multiplex
     asyncio.run(main())
\ No newline at end of file
@@ -1,3 +1,140 @@
+import struct
+
+# Every frame on the wire is a 4-byte big-endian payload length followed by the UTF-8 payload
+FRAME_HEADER = struct.Struct('!I')
+# Largest payload accepted in one frame; bounds the memory a single connection can buffer
+MAX_FRAME_SIZE = 1024 * 1024
+# Bytes requested per recv() call when reading frames from a socket
+RECV_BUFFER_SIZE = 64 * 1024
+# Most messages returned by one %messages / %groupmessages request, and the most bytes of them
+MAX_PAGE_SIZE = 500
+MAX_PAGE_BYTES = MAX_FRAME_SIZE // 2
+# Search results shown per page by the client
+SEARCH_PAGE_SIZE = 20
+
+def encode_frame(payload):
+    """
+    Wraps a message (str or bytes) in a length-prefixed frame ready to be sent on a socket.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {len(payload)} bytes exceeds the {MAX_FRAME_SIZE} byte limit.")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def encode_response(payload):
+    """
+    Frames a response the server sends. Unlike encode_frame, a response too large for one frame (a listing of
+    a very busy board) doesn't fail the connection: it is cut after the last whole line that fits and ends
+    with a line saying how much was left out.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    if len(payload) > MAX_FRAME_SIZE:
+        notice = f"\n[Truncated: the response was {len(payload)} bytes, over the {MAX_FRAME_SIZE} byte limit.]"
+        notice = notice.encode('utf-8')
+        limit = MAX_FRAME_SIZE - len(notice)
+        cut = payload.rfind(b"\n", 0, limit + 1)
+        if cut < 0:
+            # One line longer than a frame: cut it, but never inside a UTF-8 character
+            cut = limit
+            while cut and payload[cut] & 0xC0 == 0x80:
+                cut -= 1
+        payload = payload[:cut] + notice
+    return encode_frame(payload)
+
+class FrameDecoder:
+    """
+    Incrementally splits a byte stream into complete frames.
+    Feed it whatever recv() returned; partial frames are kept until the rest arrives.
+    """
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.buffer = bytearray()  # Received bytes not yet returned as a frame
+        self.max_frame_size = max_frame_size
+
+    def feed(self, data):
+        """
+        Adds received bytes and returns the payloads (bytes) of every frame completed by them.
+        """
+        self.buffer += data
+        frames = []
+        offset = 0
+        # Slice out every complete frame in the buffer, then drop the consumed bytes in one go
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, offset)
+            if length > self.max_frame_size:
+                raise ValueError(f"Frame of {length} bytes exceeds the {self.max_frame_size} byte limit.")
+            start = offset + FRAME_HEADER.size
+            end = start + length
+            if end > len(self.buffer):
+                break  # Wait for the rest of this frame
+            frames.append(bytes(self.buffer[start:end]))
+            offset = end
+        del self.buffer[:offset]
+        return frames
+
+def read_frames(sock, decoder=None):
+    """
+    Yields frame payloads received on a blocking socket until the peer closes the connection.
+    """
+    decoder = decoder or FrameDecoder()
+    while True:
+        data = sock.recv(RECV_BUFFER_SIZE)
+        if not data:
+            return  # Connection closed by the peer
+        yield from decoder.feed(data)
+
+# On a multiplexed connection every frame the server sends is preceded by one byte naming its channel, so
+# responses and signals share the client's one connection. Clients send plain frames, which are always commands.
+# A plain frame starts with a zero byte (frames are far below 16 MiB), so it is never mistaken for a tagged one.
+RESPONSE_CHANNEL = b'R'
+SIGNAL_CHANNEL = b'S'
+CHANNELS = (RESPONSE_CHANNEL, SIGNAL_CHANNEL)
+CHANNEL_FRAME_HEADER = struct.Struct('!cI')
+
+def tag_frames(channel, frames):
+    """
+    Returns the buffers that send already encoded frames on a channel. The channel byte is a buffer of its
+    own, so a frame shared between clients is written as it is rather than copied with its tag.
+    """
+    buffers = []
+    for frame in frames:
+        buffers.append(channel)
+        buffers.append(frame)
+    return buffers
+
+def encode_channel_frame(channel, payload):
+    """
+    Wraps a message in a frame tagged with its channel, for a multiplexed connection.
+    """
+    return channel + encode_frame(payload)
+
+class ChannelFrameDecoder(FrameDecoder):
+    """
+    Splits the byte stream of a multiplexed connection into (channel, payload) pairs.
+    """
+    def feed(self, data):
+        """
+        Adds received bytes and returns the (channel, payload) of every frame completed by them.
+        """
+        self.buffer += data
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= CHANNEL_FRAME_HEADER.size:
+            channel, length = CHANNEL_FRAME_HEADER.unpack_from(self.buffer, offset)
+            if channel not in CHANNELS:
+                raise ValueError(f"Unknown channel {channel!r}; is the server running with --multiplex?")
+            if length > self.max_frame_size:
+                raise ValueError(f"Frame of {length} bytes exceeds the {self.max_frame_size} byte limit.")
+            start = offset + CHANNEL_FRAME_HEADER.size
+            end = start + length
+            if end > len(self.buffer):
+                break  # Wait for the rest of this frame
+            frames.append((channel, bytes(self.buffer[start:end])))
+            offset = end
+        del self.buffer[:offset]
+        return frames
+
 def format_client_command(command, *params):
     """
     Formats a command message that the client will send to the server.
@@ -33,10 +170,14 @@ def parse_client_command(message):
     params = command_parts[1].split()  # Split the parameters by spaces
 
     # Handling specific commands based on their structure.
-    if command in ['%join', '%users', '%leave', '%exit', '%groups']:
+    if command in ['%join', '%leave', '%exit', '%replication', '%stats']:
         # Commands that do not require parameters
         return command, []
 
+    elif command in ['%users', '%groups']:
+        # Listings, optionally followed by the version the client has cached (@<version>)
+        return command, params[:1] if params[0].startswith('@') else []
+
     elif command == '%connect':
         # Ensure there are at least 3 parts: address, port, and username
         if len(params) < 3:
@@ -52,10 +193,42 @@ def parse_client_command(message):
         # Return the command along with the address, port, and username
         return command, [address, port, username]
 
-    elif command in ['%message', '%groupjoin', '%groupusers', '%groupleave']:
+    elif command == '%messages':
+        # Command expecting two parameters: the first message ID and how many messages
+        if len(params) < 2:
+            return command, []
+        return command, params[:2]
+
+    elif command == '%groupmessages':
+        # Command expecting three parameters: the group ID, the first message ID and how many messages
+        if len(params) < 3:
+            return command, []
+        return command, params[:3]
+
+    elif command == '%search':
+        # Offset and count of the page, then the search terms
+        if len(params) < 3:
+            return command, []
+        return command, [params[0], params[1], " ".join(params[2:])]
+
+    elif command == '%groupsearch':
+        # Group ID, offset and count of the page, then the search terms
+        if len(params) < 4:
+            return command, []
+        return command, [params[0], params[1], params[2], " ".join(params[3:])]
+
+    elif command == '%groupusers':
+        # The group ID, optionally followed by the version of its members list the client has cached
+        return command, [params[0].strip()] + [param for param in params[1:2] if param.startswith('@')]
+
+    elif command in ['%message', '%groupleave', '%groupremove', '%session', '%admin', '%profile']:
         # Commands expecting exactly one parameter
         return command, [params[0].strip()] if params else []
 
+    elif command in ['%groupjoin', '%groupcreate']:
+        # Commands taking a group ID or a group name, which may contain spaces
+        return command, [" ".join(params)]
+
     elif command == '%post':
         # Ensure we have the expected number of parameters (sender, post_date, subject|content)
         if len(params) < 4:
@@ -111,6 +284,78 @@ def parse_client_command(message):
         print("Unknown command.")
         return command, []
 
+def format_message_page(messages, next_id):
+    """
+    Formats a page of messages as one response: a "PAGE <count> <next_id>" header line followed by one line
+    per message. Messages that would push the page past MAX_PAGE_BYTES are left for the next page.
+    next_id is where the following page starts, or 0 when there are no more messages.
+    """
+    lines = []
+    size = 0
+    for message in messages:
+        line = f"{message['id']} {message['sender']} on {message['date']}: {message['subject']} | {message['content']}"
+        size += len(line.encode('utf-8')) + 1
+        if lines and size > MAX_PAGE_BYTES:
+            next_id = message['id']
+            break
+        lines.append(line)
+    return "\n".join([f"PAGE {len(lines)} {next_id}"] + lines)
+
+def format_search_page(messages, offset, next_offset):
+    """
+    Formats a page of search results like format_message_page(), one "<id> <sender> on <date>: <subject>" line
+    per match; next_offset is the rank the following page starts at, or 0 when there are no more matches.
+    """
+    lines = []
+    size = 0
+    for message in messages:
+        line = f"{message['id']} {message['sender']} on {message['date']}: {message['subject']}"
+        size += len(line.encode('utf-8')) + 1
+        if lines and size > MAX_PAGE_BYTES:
+            next_offset = offset + len(lines)
+            break
+        lines.append(line)
+    return "\n".join([f"PAGE {len(lines)} {next_offset}"] + lines)
+
+def parse_message_page(response):
+    """
+    Splits a page response into its message lines and the ID the next page starts at (0 at the end).
+    Returns None if the response isn't a page (e.g. an error message).
+    """
+    header, _, body = response.partition("\n")
+    parts = header.split()
+    if len(parts) != 3 or parts[0] != "PAGE" or not parts[1].isdigit() or not parts[2].isdigit():
+        return None
+    return (body.split("\n") if body else []), int(parts[2])
+
+def format_listing(version, listing):
+    """
+    Formats a listing (%users, %groups, %groupusers) for a client that caches it: a "VERSION <version>" header
+    line followed by the listing. The client sends the version back as @<version> the next time it asks.
+    """
+    return f"VERSION {version}\n{listing}"
+
+def format_not_modified(version):
+    """
+    Formats the reply to a listing request whose cached version is still current.
+    """
+    return f"NOT_MODIFIED {version}"
+
+def parse_listing(response):
+    """
+    Splits a listing response into its version and the listing, which is None for a NOT_MODIFIED reply.
+    Returns None if the response isn't versioned (e.g. an error, or a server that doesn't version listings).
+    """
+    header, newline, listing = response.partition("\n")
+    parts = header.split()
+    if len(parts) != 2:
+        return None
+    if parts[0] == "VERSION" and newline:
+        return parts[1], listing
+    if parts[0] == "NOT_MODIFIED" and not newline:
+        return parts[1], None
+    return None
+
 def parse_bulletin_message(message):
     """
     Parses a bulletin board message sent by the server to the client.
@@ -1,62 +1,274 @@
+import argparse
+import asyncio
+import os
+import queue
+import secrets
 import socket
+import tempfile
 import threading
-from socket_protocol import parse_client_command
+import time
+from socket_protocol import FRAME_HEADER, MAX_PAGE_SIZE, encode_frame, format_message_page, format_search_page, parse_client_command
+from socket_protocol import encode_response, format_listing, format_not_modified, read_frames
 from bulletin_board import BulletinBoard
 from private_board import PrivateBoard
+from group_registry import GroupRegistry
+from post_log import POST_LOG_NAME, PostLog, replay_log
+from archive import ARCHIVE_DIR_NAME, ArchiveSet
+from message_store import Retention
+from snapshot import SNAPSHOT_NAME, Snapshotter, load_snapshot, read_snapshot_seq
+from signal_outbox import DEFAULT_MAX_QUEUED, DROP_OLDEST, OVERFLOW_POLICIES, MultiplexedSocket, SignalOutbox
+from signal_outbox import SubscriberIndex
+from metrics import metrics, start_stats_endpoint
+from profiler import MAX_PROFILE_SECONDS, profiler, span_end, span_start
 
-# Unique delimiter
-CRLF = "\r\n"
+# Server engines selectable at startup
+SERVER_MODES = ('threaded', 'asyncio', 'multiprocess', 'cluster')
+
+# Private groups every server starts with
+DEFAULT_GROUP_NAMES = ["Group Alpha", "Group Beta", "Group Gamma", "Group Delta", "Group Epsilon"]
+
+# Subdirectory of the data directory holding the segments of messages spilled out of memory
+SPILL_DIR_NAME = 'spill'
+
+# Prefixes every listing version this process hands out. The boards count versions from 0 at startup, so
+# without it a client could revalidate against a restarted server (or another node) that reached the same count.
+LISTING_EPOCH = secrets.token_hex(4)
 
 # Dictionary to keep track of session data for each client
 client_sessions = {}
-# Dictionary to keep track of signal session data for each client
+# Dictionary to keep track of the signal outbox for each client
 signal_sessions = {}
+# Signal outboxes by username, used to fan out to a board's members only
+subscribers = SubscriberIndex()
+# Bound and overflow policy for every client's signal outbox (set by start_server)
+outbox_settings = {'max_queued': DEFAULT_MAX_QUEUED, 'overflow_policy': DROP_OLDEST}
+# Log that persists every change to the boards (None when the server runs without a data directory)
+post_log = None
+# Background thread that snapshots the boards and truncates the post log behind each snapshot
+snapshotter = None
+# In multiprocess mode, the broker (main process) or broker link (worker) that shares board changes, sessions
+# and signals between the server's processes (see multiprocess_server.py); in cluster mode, this server's
+# cluster node (see cluster.py); None in a single-process server
+coordinator = None
+# The replication leader or follower answering %replication (see replication.py); None when not replicating
+replication = None
+# Seconds a signal connection waits for the command connection that names its session token
+SESSION_PAIR_TIMEOUT = 10.0
+# Threaded engine: command connections by the session token they sent with %session, until their signal
+# connection claims them, and signal connections accepted before that (token -> queue the command connection
+# is handed over in). Both are guarded by pairing_lock.
+sessions_by_token = {}
+pending_signals = {}
+pairing_lock = threading.Lock()
+# Token a client sends with %admin to use the admin commands (%stats, %profile); None leaves them disabled (set by start_server)
+admin_settings = {'token': None}
+
+def is_admin(client_socket):
+    """
+    Returns whether the client has sent %admin with the server's admin token on this connection.
+    """
+    return client_sessions.get(client_socket, {}).get('admin', False)
+
+def set_session_username(client_socket, username):
+    """
+    Stores the session's username and moves its signal outbox to the new name in the subscriber index.
+    """
+    session = client_sessions[client_socket]
+    outbox = signal_sessions.get(client_socket)
+    if outbox is not None and session.get('username'):
+        subscribers.unsubscribe(session['username'], outbox)
+    session['username'] = username
+    if outbox is not None and username:
+        subscribers.subscribe(username, outbox)
+    if coordinator:
+        # The client's signal connection may be held by another worker process
+        coordinator.publish_session(client_socket, username)
+
+def register_signal_session(client_socket, outbox):
+    """
+    Pairs a client's signal outbox with its command connection and subscribes it under the session's username.
+    """
+    signal_sessions[client_socket] = outbox
+    username = client_sessions.get(client_socket, {}).get('username')
+    if username:
+        subscribers.subscribe(username, outbox)
+
+def register_multiplexed_client(sock):
+    """
+    Wraps a client connection accepted in multiplexed mode, whose signals are sent on the connection itself,
+    and registers its signal outbox. Returns the wrapper, which stands in for the connection from then on.
+    """
+    client_socket = MultiplexedSocket(sock)
+    register_signal_session(client_socket, SignalOutbox(client_socket, **outbox_settings))
+    return client_socket
+
+def drop_signal_session(client_socket):
+    """
+    Unsubscribes and closes a client's signal outbox once its signal connection ends.
+    """
+    outbox = signal_sessions.pop(client_socket, None)
+    if outbox is not None:
+        username = client_sessions.get(client_socket, {}).get('username')
+        if username:
+            subscribers.unsubscribe(username, outbox)
+        outbox.close()
+
+def log_position():
+    """
+    Returns the sequence number of the last logged change, or None when nothing is persisted.
+    """
+    return post_log.last_seq if post_log else None
+
+def wait_until_durable(position):
+    """
+    Blocks until every change logged after position is on disk, so a response is only sent once what it
+    confirms would survive a crash. Returns False if the log could not be written.
+    """
+    if post_log and post_log.last_seq != position:
+        return post_log.wait_committed(post_log.last_seq)
+    return True
 
 def broadcast_message(sender_socket, signal_code, **kwargs):
     """
     Broadcasts a message to all connected clients except the sender with a specified signal.
+    Signals for a board only go to its members; each recipient's outbox is written by its own writer,
+    so the broadcasting thread never waits on a slow client.
     """
-    for client_socket, signal_socket in signal_sessions.items():
-        if client_socket != sender_socket:  # Exclude the sender
-            # Determine if the client should receive this message
-            if "target_board" in kwargs:
-                target_board = kwargs["target_board"]
-                if isinstance(target_board, PrivateBoard):
-                    # Ensure the client is a member of the private board
-                    if client_sessions.get(client_socket, {}).get("username") not in target_board.members:
-                        continue
-                elif isinstance(target_board, BulletinBoard):
-                    if client_sessions.get(client_socket, {}).get("username") not in target_board.users:
-                        continue
+    span_started = span_start()
+    if coordinator:
+        # Members may be connected to any worker process, so every process delivers to its own clients
+        coordinator.publish_signal(sender_socket, signal_code, kwargs)
+    else:
+        deliver_signal(signal_sessions.get(sender_socket), signal_code, **kwargs)
+    span_end('broadcast', span_started)
 
-            try:
-                # Construct the message based on the signal_code and kwargs
-                if signal_code in {"JOIN_SIGNAL", "LEAVE_SIGNAL"}:
-                    message = f"{signal_code} {kwargs['username']}"
-                elif signal_code in {"GROUP_JOIN_SIGNAL", "GROUP_LEAVE_SIGNAL"}:
-                    target_board = kwargs["target_board"]
-                    group_id = target_board.group_id
-                    message = f"{signal_code} {group_id} {kwargs['username']}"
-                elif signal_code == "POST_SIGNAL":
-                    message = f"{signal_code} {kwargs['post_summary']}"
-                elif signal_code == "GROUP_POST_SIGNAL":
-                    message = f"{signal_code} {kwargs['post_summary']}"
-                else:
-                    print(f"Unknown signal code: {signal_code}")
-                    continue
+def deliver_signal(sender_outbox, signal_code, **kwargs):
+    """
+    Queues a signal on the outbox of every recipient connected to this process, except sender_outbox.
+    """
+    # Determine which clients should receive this message
+    target_board = kwargs.get("target_board")
+    if isinstance(target_board, PrivateBoard):
+        # Only the members of the private board
+        recipients = subscribers.outboxes_for(target_board.members)
+    elif isinstance(target_board, BulletinBoard):
+        # Only the users who joined the public board
+        recipients = subscribers.outboxes_for(target_board.users)
+    else:
+        # No board given (e.g. a client disconnected), so tell everyone
+        recipients = list(signal_sessions.values())
+
+    signal = format_signal(signal_code, **kwargs)
+    if signal is None:
+        return
+    message, coalesce_key = signal
+
+    # Encode it into one immutable frame shared by every recipient's queue (never copied per client)
+    payload = encode_frame(message)
+    sent = 0
+    for outbox in recipients:
+        if outbox is not sender_outbox:  # Exclude the sender
+            outbox.put(payload, coalesce_key)
+            sent += 1
+    metrics.record_broadcast(sent, len(payload))
+
+def format_signal(signal_code, **kwargs):
+    """
+    Returns the text of a signal and its coalesce key (None when it can't be coalesced),
+    or None for an unknown signal code.
+    """
+    # Presence signals carry a coalesce key so a backed-up client only keeps the latest state per user.
+    coalesce_key = None
+    if signal_code in {"JOIN_SIGNAL", "LEAVE_SIGNAL"}:
+        message = f"{signal_code} {kwargs['username']}"
+        coalesce_key = ('presence', kwargs['username'])
+    elif signal_code in {"GROUP_JOIN_SIGNAL", "GROUP_LEAVE_SIGNAL"}:
+        group_id = kwargs['target_board'].group_id
+        message = f"{signal_code} {group_id} {kwargs['username']}"
+        coalesce_key = ('group_presence', group_id, kwargs['username'])
+    elif signal_code == "POST_SIGNAL":
+        message = f"{signal_code} {kwargs['post_summary']}"
+    elif signal_code == "GROUP_POST_SIGNAL":
+        message = f"{signal_code} {kwargs['post_summary']}"
+    else:
+        print(f"Unknown signal code: {signal_code}")
+        return None
+    return message, coalesce_key
+
+def pair_session(token, client_socket):
+    """
+    Hands a command connection that named its session token to the signal connection waiting on that token,
+    or keeps it for the signal connection that hasn't been accepted yet. The two listeners accept
+    independently, so either can come first.
+    """
+    with pairing_lock:
+        waiter = pending_signals.pop(token, None)
+        if waiter is None:
+            sessions_by_token[token] = client_socket
+            return
+    waiter.put(client_socket)
+
+def claim_session(token):
+    """
+    Returns the command connection that sent %session with token, waiting up to SESSION_PAIR_TIMEOUT seconds
+    for it, or None if none does.
+    """
+    with pairing_lock:
+        client_socket = sessions_by_token.pop(token, None)
+        if client_socket is not None:
+            return client_socket
+        waiter = pending_signals[token] = queue.Queue(maxsize=1)
+    try:
+        return waiter.get(timeout=SESSION_PAIR_TIMEOUT)
+    except queue.Empty:
+        with pairing_lock:
+            if pending_signals.get(token) is waiter:
+                del pending_signals[token]
+    try:
+        # Paired just as the wait ran out
+        return waiter.get_nowait()
+    except queue.Empty:
+        return None
+
+def handle_signal_connection(signal_socket):
+    """
+    Pairs a signal connection with its command connection through the session token the client sends first
+    (SESSION <token>), then serves it with handle_signal_client. A signal connection accepted before its command
+    connection sent %session waits for it; clients that send no token can't be paired and get no signals.
+    """
+    frames = read_frames(signal_socket)
+    client_socket = None
+    try:
+        hello = next(frames, b"").decode('utf-8').split()
+        if len(hello) == 2 and hello[0] == 'SESSION':
+            client_socket = claim_session(hello[1])
+            if client_socket is None:
+                print(f"No command connection named session {hello[1]}; closing its signal connection")
+    except (OSError, ValueError) as e:
+        print(f"Error in signal connection: {e}")
+    if client_socket is None or client_socket not in client_sessions:
+        # No token, no matching command connection, or it closed while this one waited
+        signal_socket.close()
+        return
+    register_signal_session(client_socket, SignalOutbox(signal_socket, **outbox_settings))
+    handle_signal_client(signal_socket, client_socket, frames)
 
-                # Send the constructed message
-                signal_socket.send((message + CRLF).encode('utf-8'))
-            except socket.error as e:
-                print(f"Error sending to client: {e}")
+def accept_signal_connections(signal_listener):
+    """
+    Accepts signal connections and pairs each one with its command connection on a thread of its own.
+    """
+    while True:
+        signal_socket, _ = signal_listener.accept()
+        threading.Thread(target=handle_signal_connection, args=(signal_socket,), daemon=True).start()
 
-def handle_signal_client(signal_socket, client_socket):
+def handle_signal_client(signal_socket, client_socket, frames):
     """
     Handle incoming signal connections and passes them to the broadcast function.
+    frames reads the connection from where pairing it stopped.
     """
     try:
-        while True:
-            message = signal_socket.recv(1024).decode('utf-8').strip()
+        for frame in frames:
+            message = frame.decode('utf-8').strip()
             if message:
                 print(f"Received signal: {message}")
 
@@ -93,362 +305,737 @@ def handle_signal_client(signal_socket, client_socket):
     except Exception as e:
         print(f"Error in signal thread: {e}")
     finally:
+        drop_signal_session(client_socket)
         signal_socket.close()
-        del signal_sessions[client_socket]
 
-def handle_client(client_socket, public_board, private_boards):
+def stats_report():
     """
-    Continuously listens for client commands, processes them, and sends responses back.
+    Answers %stats (and the --stats-port endpoint): this process's metrics and its clients' signal queues.
     """
-    
-    # Initialize client session data
-    client_sessions[client_socket] = {'username': None}
-    try:
-        # Continuously listen for client commands in a loop
-        while True:
-            # Receive up to 1024 bytes from the client
-            message = client_socket.recv(1024).decode('utf-8')
+    return metrics.report(list(signal_sessions.values()))
 
-            # If we receive an empty message, continue waiting for a valid message
-            if not message.strip():
-                continue
+def record_command(command, started, frame, encoded, response):
+    """
+    Records a command answered since started (perf_counter) in the metrics, with its request and response frames.
+    """
+    error = isinstance(response, str) and response.startswith("Error")
+    metrics.record_command(command, time.perf_counter() - started, len(frame) + FRAME_HEADER.size, len(encoded), error)
 
-            # Parse the command and parameters from the client's message
-            print(f"Raw message received: {message}")  # Debugging info
-            command, params = parse_client_command(message)
-            print(f"Command: {command}, Params: {params}")  # Debugging line
+def listing_response(params, version, build):
+    """
+    Answers a listing command (%users, %groups, %groupusers) whose text build() returns. A client that caches
+    listings ends its request with @<version>, the version it holds (empty the first time): it gets
+    NOT_MODIFIED while the listing is unchanged and otherwise the listing headed by its current version.
+    Clients that send no version get the plain listing.
+    """
+    if not params or not params[-1].startswith('@'):
+        return build()
+    version = f"{LISTING_EPOCH}.{version}"
+    if params[-1][1:] == version:
+        return format_not_modified(version)
+    return format_listing(version, build())
+
+def execute_command(client_socket, command, params, public_board, private_boards):
+    """
+    Runs a single parsed client command against the boards and returns the response text
+    (as bytes for responses built from cached payloads).
+    Shared by the threaded and asyncio server engines; client_socket only identifies the session.
+    """
+    if coordinator and coordinator.forwards(command, params):
+        # A worker process sends commands that change the boards to the broker, which runs them in order;
+        # a cluster node sends commands for boards held by another node to that node
+        return coordinator.execute(client_socket, command, params)
 
-            # Handle the different commands the client can send
-            if command == '%connect':
-                # Connect command expects three parameters from client: address, port, and username
-                if len(params) == 3:
-                    address = params[0]
-                    port = params[1]
-                    username = params[2]
+    # Username stored in the session by %connect (None until the client connects)
+    username = client_sessions[client_socket].get('username')
 
-                    # Set username in session data
-                    client_sessions[client_socket]['username'] = username
+    # Handle the different commands the client can send
+    if command == '%connect':
+        # Connect command expects three parameters from client: address, port, and username
+        if len(params) == 3:
+            address = params[0]
+            port = params[1]
+            username = params[2]
+
+            # Set username in session data
+            set_session_username(client_socket, username)
+
+            response = f"Connected to the bulletin board server at {address}:{port}."
+        else:
+            response = "Error: %connect requires address and port."
+
+    elif command == '%session':
+        # Token the client also sends on its signal connection, so the two can be paired even when they
+        # are accepted by different worker processes
+        if len(params) == 1:
+            client_sessions[client_socket]['token'] = params[0]
+            response = f"Session {params[0]}."
+        else:
+            response = "Error: %session requires a token."
+
+    elif command == '%admin':
+        # Unlocks the admin commands for this connection; compared in constant time so the token can't be guessed
+        # one character at a time
+        if len(params) != 1:
+            response = "Error: %admin requires a token."
+        elif admin_settings['token'] is None:
+            response = "Error: This server has no admin token; start it with --admin-token."
+        elif secrets.compare_digest(params[0].encode(), admin_settings['token'].encode()):
+            client_sessions[client_socket]['admin'] = True
+            response = "Admin commands enabled."
+        else:
+            response = "Error: Wrong admin token."
+
+    elif command == '%join':
+        if not username:
+            # Without a name there is nothing to add to the board (or to its log and snapshots)
+            response = "Error: You must connect with a username first using %connect."
+        else:
+            print("Calling add_user with:", username)
+            # Add the user to the bulletin board
+            span_started = span_start()
+            response = public_board.add_user(username)
+            span_end('board.add_user', span_started)
+            # Follow it with the active users and latest messages, served from the board's cached bytes
+            response = response.encode('utf-8') + public_board.welcome.get()
+
+            # Broadcast to other users
+            broadcast_message(client_socket, 'JOIN_SIGNAL', username=username, target_board=public_board)
+
+    elif command == '%post':
+        # Ensure the client has provided the correct number of parameters (sender, post_date, subject, content)
+        if len(params) == 4:
+            sender = params[0]
+            post_date = params[1]
+            subject = params[2]
+            content = params[3]
+
+            # Verify that the sender has joined the bulletin board
+            if sender not in public_board.list_users():
+                response = "Error: You must join the bulletin board first using %join."
+            else:
+                # Generate a unique message ID and add the post to the bulletin board
+                span_started = span_start()
+                message_id = public_board.add_post(sender, post_date, subject, content)
+                span_end('board.add_post', span_started)
+                print(f"Calling add_post with: sender={sender}, post_date={post_date}, subject={subject}")
+                
+                response = f"Message ID: {message_id}, Sender: {sender}, Post Date: {post_date}, Subject: {subject}"
+                print(f"[DEBUG] %post response: {response}")
 
-                    response = f"Connected to the bulletin board server at {address}:{port}."
-                else:
-                    response = "Error: %connect requires address and port."
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%join':
-                print("Calling add_user with:", username)
-                # Add the user to the bulletin board
-                response = public_board.add_user(username)
-                users_active = f" Users active on this board: {public_board.list_users()}"
-                last_two_messages = (
-                    f"\n{public_board.get_message_content(len(public_board.messages))}"
-                    f"\n{public_board.get_message_content(len(public_board.messages)-1)}"
-                )
-                # Concatenate additional information to the response
-                response += users_active + last_two_messages
-
-                client_socket.send((response + CRLF).encode('utf-8'))
                 # Broadcast to other users
-                broadcast_message(client_socket, 'JOIN_SIGNAL', username=username, target_board=public_board)
-
-            elif command == '%post':
-                # Ensure the client has provided the correct number of parameters (sender, post_date, subject, content)
-                if len(params) == 4:
-                    sender = params[0]
-                    post_date = params[1]
-                    subject = params[2]
-                    content = params[3]
-
-                    # Verify that the sender has joined the bulletin board
-                    if sender not in public_board.list_users():
-                        response = "Error: You must join the bulletin board first using %join."
-                    else:
-                        # Generate a unique message ID and add the post to the bulletin board
-                        message_id = public_board.add_post(sender, post_date, subject, content)
-                        print(f"Calling add_post with: sender={sender}, post_date={post_date}, subject={subject}")
-                        
-                        response = f"Message ID: {message_id}, Sender: {sender}, Post Date: {post_date}, Subject: {subject}"
-                        print(f"[DEBUG] %post response: {response}")
-
-                        # Broadcast to other users
-                        broadcast_message(client_socket, "POST_SIGNAL", target_board=public_board, post_summary=response)
+                broadcast_message(client_socket, "POST_SIGNAL", target_board=public_board, post_summary=response)
+        else:
+            # Error message if the wrong number of parameters is provided
+            response = "Error: Incorrect parameters for %post. Usage: %post <subject>|<content>."
+
+    elif command == '%users':
+        def list_users():
+            # Retrieve the list of users from the bulletin board
+            users = public_board.list_users()
+            # Format the list of users as a newline-separated string if there are any users
+            # If the list is empty, send a response indicating no users are in the group
+            return "\n".join(users) if users else "No users in the group."
+        response = listing_response(params, public_board.users_version, list_users)
+
+    # Handle the %leave command to remove the user
+    elif command == '%leave':
+        username = client_sessions[client_socket].get('username')
+        if username:
+            span_started = span_start()
+            public_board.remove_user(username)
+            span_end('board.remove_user', span_started)
+            response = f"{username} has left the bulletin board."
+            # Clear session data
+            set_session_username(client_socket, None)
+            # Broadcast to other users
+            broadcast_message(client_socket, 'LEAVE_SIGNAL', username=username, target_board=public_board)
+        else:
+            response = "Error: You are not currently joined to leave."
+
+    elif command == '%message':
+        # Message command expects one parameter: message_id
+        if len(params) == 1:
+            message_id = int(params[0])
+            # Retrieve the content of the specified message from the bulletin board
+            span_started = span_start()
+            message_content = public_board.get_message_content(message_id)
+            span_end('board.get_message_content', span_started)
+            # If the message is found, send its content; otherwise, indicate that it wasn't found
+            response = message_content if message_content else "Message not found."
+        else:
+            # Error message if the wrong number of parameters is provided
+            response = "Error: %message requires a message ID."
+
+    elif command == '%messages':
+        # Messages command expects two parameters: the first message ID and how many messages to return
+        if len(params) == 2 and params[0].isdigit() and params[1].isdigit():
+            # Pages are capped so one request can't make the server build an unbounded response
+            count = min(int(params[1]), MAX_PAGE_SIZE)
+            span_started = span_start()
+            messages, next_id = public_board.get_messages(int(params[0]), count)
+            span_end('board.get_messages', span_started)
+            response = format_message_page(messages, next_id)
+        else:
+            response = "Error: %messages requires a starting message ID and a count."
+
+    elif command == '%search':
+        # Search command expects the offset and size of the page, then the search terms
+        if len(params) == 3 and params[0].isdigit() and params[1].isdigit():
+            offset = int(params[0])
+            count = min(int(params[1]), MAX_PAGE_SIZE)
+            span_started = span_start()
+            messages, next_offset = public_board.search_messages(params[2], offset, count)
+            span_end('board.search_messages', span_started)
+            response = format_search_page(messages, offset, next_offset)
+        else:
+            response = "Error: %search requires an offset, a count and search terms."
+
+    elif command == '%replication':
+        # How far behind the leader a read replica is, or on a leader how far behind each follower is
+        response = replication.status() if replication else "Error: This server is not replicating."
+
+    elif command == '%stats':
+        # Per-command counts and latencies, traffic, connections, fan-out and signal queues of this process
+        if is_admin(client_socket):
+            response = stats_report()
+        else:
+            response = "Error: %stats is an admin command; send %admin <token> first."
+
+    elif command == '%profile':
+        # Samples every thread's stack and times the hot-path spans for a bounded window, then writes the profile
+        if not is_admin(client_socket):
+            response = "Error: %profile is an admin command; send %admin <token> first."
+        elif len(params) == 1 and params[0].isdigit() and 1 <= int(params[0]) <= MAX_PROFILE_SECONDS:
+            response = profiler.start(int(params[0]))
+        else:
+            response = f"Error: %profile requires a number of seconds from 1 to {MAX_PROFILE_SECONDS}."
+
+    elif command == '%exit':
+        # Exit command terminates client session
+        # Send a farewell message to the client
+        response = "Goodbye!"
+
+    ### Part 2 commands ###
+    
+    elif command == '%groups':
+        def list_groups():
+            # private_boards is the GroupRegistry holding every PrivateBoard
+            if private_boards:
+                # Retrieve group names and IDs from each PrivateBoard instance
+                groups = [f"ID: {board.group_id}, Name: {board.group_name}" for board in private_boards]
+                # Format the list as a newline-separated string if there are groups available
+                return "\n".join(groups)
+            # Indicate that no groups are available
+            return "No groups available."
+        response = listing_response(params, private_boards.version, list_groups)
+
+    elif command == '%groupjoin':
+        # Group Join command expects one parameter: group_id or group_name
+        if not username:
+            response = "Error: You must connect with a username first using %connect."
+        elif len(params) == 1:
+            # Look the group up by ID or by name in the registry
+            matching_group = private_boards.resolve(params[0])
+            group_id = matching_group.group_id if matching_group else params[0]
+            if matching_group:
+                # Attempt to join the specified group by ID
+                span_started = span_start()
+                response = matching_group.join_group(username, group_id)
+                span_end('board.join_group', span_started)
+                # Follow it with the group's members and latest messages, served from the board's cached bytes
+                response = response.encode('utf-8') + matching_group.welcome.get()
+
+                # Broadcast to other users
+                broadcast_message(client_socket, 'GROUP_JOIN_SIGNAL', username=username, target_board=matching_group)
+            else:
+                # Error message if the group does not exist
+                response = f"Error: Group '{group_id}' does not exist."
+        else:
+            # Error message if the wrong number of parameters is provided
+            response = "Error: %groupjoin requires group ID."
+
+    elif command == '%groupcreate':
+        # Group Create command expects one parameter: the new group's name
+        if len(params) == 1:
+            group_name = params[0]
+            span_started = span_start()
+            try:
+                # The registry checks the name and creates the group in one step, so two clients creating the
+                # same name at once can't both get past the check
+                new_board = private_boards.create_group(group_name)
+            except ValueError:
+                response = f"Error: Group '{group_name}' already exists."
+            else:
+                response = f"Created group {new_board.group_id}: {group_name}."
+            span_end('board.create_group', span_started)
+        else:
+            response = "Error: %groupcreate requires a group name."
+
+    elif command == '%groupremove':
+        # Group Remove command expects one parameter: group_id
+        if len(params) == 1 and params[0].isdigit():
+            group_id = int(params[0])
+            target_board = private_boards.get(group_id)
+            if not target_board:
+                response = f"Error: Group '{group_id}' does not exist."
+            elif target_board.members:
+                # Only empty groups can be removed so no member silently loses access
+                response = f"Error: Group '{group_id}' still has members."
+            else:
+                span_started = span_start()
+                private_boards.remove_group(group_id)
+                span_end('board.remove_group', span_started)
+                response = f"Removed group {group_id}."
+        else:
+            response = "Error: %groupremove requires a numeric group ID."
+
+    elif command == '%grouppost':
+        # Unpack parsed parameters: sender, post_date, group_id, subject, content
+        if len(params) != 5:
+            response = "Error: Invalid parameters for %grouppost."
+        else:
+            sender, post_date, group_id, subject, content = params
+            group_id = int(group_id)
+
+            # Validate the sender is in the session and joined the server
+            if not client_sessions[client_socket].get('username') or client_sessions[client_socket]['username'] != sender:
+                response = "Error: You must join the bulletin board first using %groupjoin <group_id>."
+            else:
+                # Check if the group exists in the registry
+                target_board = private_boards.get(group_id)
+
+                if target_board is None:
+                    response = f"Error: Group '{group_id}' does not exist."
+                elif sender not in target_board.members:
+                    # Ensure the sender is a member of the group
+                    response = f"Error: You are not a member of the group '{group_id}'."
                 else:
-                    # Error message if the wrong number of parameters is provided
-                    response = "Error: Incorrect parameters for %post. Usage: %post <subject>|<content>."
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%users':
-                # Retrieve the list of users from the bulletin board
-                users = public_board.list_users()
-                # Format the list of users as a newline-separated string if there are any users
-                # If the list is empty, send a response indicating no users are in the group
-                response = "\n".join(users) if users else "No users in the group."
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            # Handle the %leave command to remove the user
-            elif command == '%leave':
-                username = client_sessions[client_socket].get('username')
-                if username:
-                    public_board.remove_user(username)
-                    response = f"{username} has left the bulletin board."
-                    # Clear session data
-                    client_sessions[client_socket]['username'] = None
+                    # Add the post to the specified group's private board
+                    span_started = span_start()
+                    message_id = target_board.post_to_group(sender, post_date, subject, content)
+                    span_end('board.post_to_group', span_started)
+                    response = f"Message ID: {message_id}, Group ID: {group_id}, Sender: {sender}, Post Date: {post_date}, Subject: {subject}"
                     # Broadcast to other users
-                    broadcast_message(client_socket, 'LEAVE_SIGNAL', username=username, target_board=public_board)
-                else:
-                    response = "Error: You are not currently joined to leave."
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%message':
-                # Message command expects one parameter: message_id
-                if len(params) == 1:
-                    message_id = int(params[0])
-                    # Retrieve the content of the specified message from the bulletin board
-                    message_content = public_board.get_message_content(message_id)
-                    # If the message is found, send its content; otherwise, indicate that it wasn't found
-                    response = message_content if message_content else "Message not found."
-                else:
-                    # Error message if the wrong number of parameters is provided
-                    response = "Error: %message requires a message ID."
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%exit':
-                # Exit command terminates client session
-                # Send a farewell message to the client
-                response = "Goodbye!"
-                client_socket.send((response + CRLF).encode('utf-8'))
-                # Break the loop to end the connection with the client.
-                break
+                    broadcast_message(client_socket, 'GROUP_POST_SIGNAL', target_board=target_board, post_summary=response)
 
-            ### Part 2 commands ###
+    elif command == '%groupusers':
+        # Ensure the command has the group ID, optionally followed by the client's cached version
+        if len(params) in (1, 2):
+            group_id = int(params[0].strip())
+
+            # Find the target group by group ID
+            target_board = private_boards.get(group_id)
             
-            elif command == '%groups':
-                # Ensure private_boards is a list of PrivateBoard instances
-                if private_boards:
-                    # Retrieve group names and IDs from each PrivateBoard instance
-                    groups = [f"ID: {board.group_id}, Name: {board.group_name}" for board in private_boards]
-                    # Format the list as a newline-separated string if there are groups available
-                    response = "\n".join(groups)
-                else:
-                    # Indicate that no groups are available
-                    response = "No groups available."
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%groupjoin':
-                # Group Join command expects one parameter: group_id or group_name
-                if len(params) == 1:
-                    group_id = int(params[0])
-
-                    # Check if client already has a username from %join
-                    if client_sessions[client_socket]['username']:
-                        username = client_sessions[client_socket]['username']
-
-                    # Check if the group exists in private_boards
-                    matching_group = next((board for board in private_boards if board.group_id == group_id), None)
-                    if matching_group:
-                        # Attempt to join the specified group by ID
-                        response = matching_group.join_group(username, group_id)
-                        group_users_active = f" Users active in group {group_id}: {matching_group.members}"
-                        last_two_group_messages = (
-                        f"\n{matching_group.get_group_message(group_id, len(matching_group.messages))}"
-                        f"\n{matching_group.get_group_message(group_id, len(matching_group.messages) - 1)}"
-                        )
-                        # Concatenate additional information to the response
-                        response += group_users_active + last_two_group_messages
-
-                        # Broadcast to other users
-                        broadcast_message(client_socket, 'GROUP_JOIN_SIGNAL', username=username, target_board=matching_group)
-                    else:
-                        # Error message if the group does not exist
-                        response = f"Error: Group '{group_id}' does not exist."
-                else:
-                    # Error message if the wrong number of parameters is provided
-                    response = "Error: %groupjoin requires group ID."
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%grouppost':
-                # Unpack parsed parameters: sender, post_date, group_id, subject, content
-                if len(params) != 5:
-                    response = "Error: Invalid parameters for %grouppost."
-                else:
-                    sender, post_date, group_id, subject, content = params
-                    group_id = int(group_id)
-
-                    # Validate the sender is in the session and joined the server
-                    if not client_sessions[client_socket].get('username') or client_sessions[client_socket]['username'] != sender:
-                        response = "Error: You must join the bulletin board first using %groupjoin <group_id>."
-                    else:
-                        # Check if the group exists in `private_boards`
-                        target_board = next((board for board in private_boards if board.group_id == group_id), None)
-
-                        if target_board is None:
-                            response = f"Error: Group '{group_id}' does not exist."
-                        elif sender not in target_board.members:
-                            # Ensure the sender is a member of the group
-                            response = f"Error: You are not a member of the group '{group_id}'."
-                        else:
-                            # Add the post to the specified group's private board
-                            message_id = target_board.post_to_group(sender, post_date, subject, content)
-                            response = f"Message ID: {message_id}, Group ID: {group_id}, Sender: {sender}, Post Date: {post_date}, Subject: {subject}"
-                            # Broadcast to other users
-                            broadcast_message(client_socket, 'GROUP_POST_SIGNAL', target_board=target_board, post_summary=response)
-
-
-                # Send the response back to the client
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%groupusers':
-                # Ensure the command has exactly one parameter (the group ID/name)
-                if len(params) == 1:
-                    group_id = int(params[0].strip())
-
-                    # Find the target group by group ID
-                    target_board = next((board for board in private_boards if board.group_id == group_id), None)
-                    
-                    if not target_board:
-                        # If the group does not exist, send an error message
-                        response = f"Error: Group '{group_id}' does not exist."
-                    else:
-                        # Retrieve the list of users in the group
-                        users = target_board.members
-                        # Format the list of users as a newline-separated string, or send an appropriate response if empty
-                        response = "\n".join(users) if users else f"No users in group '{group_id}'."
-                else:
-                    # Error response for incorrect usage
-                    response = "Error: %groupusers requires exactly one parameter: group ID."
-
-                # Send the response back to the client
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%groupleave':
-                # Ensure the command has exactly one parameter (the group ID/name)
-                if len(params) == 1:
-                    group_id = int(params[0].strip())
-
-                    # Find the target group by group ID
-                    target_board = next((board for board in private_boards if board.group_id == group_id), None)
-
-                    if not target_board:
-                        # If the group does not exist, send an error message
-                        response = f"Error: Group '{group_id}' does not exist."
-                    else:
-                        # Check if the user is part of the group
-                        if username in target_board.members:
-                            # Remove the user from the group
-                            target_board.members.remove(username)
-                            response = f"{username} has left group {group_id}."
-                            # Broadcast to other users
-                            broadcast_message(client_socket, 'GROUP_LEAVE_SIGNAL', username=username, target_board=target_board)
-                        else:
-                            # User is not a member of the group
-                            response = f"Error: {username} is not a member of group '{group_id}'."
+            if not target_board:
+                # If the group does not exist, send an error message
+                response = f"Error: Group '{group_id}' does not exist."
+            else:
+                def list_members():
+                    # Retrieve the list of users in the group
+                    users = target_board.members
+                    # Format the list of users as a newline-separated string, or send an appropriate response if empty
+                    return "\n".join(users) if users else f"No users in group '{group_id}'."
+                response = listing_response(params, target_board.members_version, list_members)
+        else:
+            # Error response for incorrect usage
+            response = "Error: %groupusers requires exactly one parameter: group ID."
+
+    elif command == '%groupleave':
+        # Ensure the command has exactly one parameter (the group ID/name)
+        if len(params) == 1:
+            group_id = int(params[0].strip())
+
+            # Find the target group by group ID
+            target_board = private_boards.get(group_id)
+
+            if not target_board:
+                # If the group does not exist, send an error message
+                response = f"Error: Group '{group_id}' does not exist."
+            else:
+                # Check if the user is part of the group
+                span_started = span_start()
+                removed = target_board.remove_member(username)
+                span_end('board.remove_member', span_started)
+                if removed:
+                    # The user was removed from the group
+                    response = f"{username} has left group {group_id}."
+                    # Broadcast to other users
+                    broadcast_message(client_socket, 'GROUP_LEAVE_SIGNAL', username=username, target_board=target_board)
                 else:
-                    # Error response for incorrect usage
-                    response = "Error: %groupleave requires exactly one parameter: group ID."
-
-                # Send the response back to the client
-                client_socket.send((response + CRLF).encode('utf-8'))
-
-            elif command == '%groupmessage':
-                # Ensure the command has the correct number of parameters
-                if len(params) == 2:
-                    group_id, message_id = params
-                    group_id = group_id.strip()
-                    message_id = message_id.strip()
-
-                    # Validate numeric parameters
-                    if not group_id.isdigit() or not message_id.isdigit():
-                        response = "Error: Group ID and Message ID must be numeric."
-                    else:
-                        group_id = int(group_id)
-                        # Find the target group by group ID
-                        target_board = next((board for board in private_boards if board.group_id == group_id), None)
-                        
-                        if not target_board:
-                            response = f"Error: Group '{group_id}' does not exist."
-                        else:
-                            # Retrieve the message from the group
-                            message = target_board.get_group_message(int(group_id), int(message_id))
-                            response = message  # The `get_group_message` method returns the appropriate message or an error
+                    # User is not a member of the group
+                    response = f"Error: {username} is not a member of group '{group_id}'."
+        else:
+            # Error response for incorrect usage
+            response = "Error: %groupleave requires exactly one parameter: group ID."
+
+    elif command == '%groupmessage':
+        # Ensure the command has the correct number of parameters
+        if len(params) == 2:
+            group_id, message_id = params
+            group_id = group_id.strip()
+            message_id = message_id.strip()
+
+            # Validate numeric parameters
+            if not group_id.isdigit() or not message_id.isdigit():
+                response = "Error: Group ID and Message ID must be numeric."
+            else:
+                group_id = int(group_id)
+                # Find the target group by group ID
+                target_board = private_boards.get(group_id)
+                
+                if not target_board:
+                    response = f"Error: Group '{group_id}' does not exist."
                 else:
-                    response = "Error: %groupmessage requires exactly 2 parameters: group ID and message ID."
+                    # Retrieve the message from the group
+                    span_started = span_start()
+                    message = target_board.get_group_message(int(group_id), int(message_id))
+                    span_end('board.get_group_message', span_started)
+                    response = message  # The `get_group_message` method returns the appropriate message or an error
+        else:
+            response = "Error: %groupmessage requires exactly 2 parameters: group ID and message ID."
 
-                # Send the response back to the client
-                client_socket.send((response + CRLF).encode('utf-8'))
+    elif command == '%groupmessages':
+        # Group messages command expects three parameters: group ID, first message ID and how many messages
+        if len(params) == 3 and all(param.isdigit() for param in params):
+            group_id = int(params[0])
+            target_board = private_boards.get(group_id)
+            if not target_board:
+                response = f"Error: Group '{group_id}' does not exist."
+            else:
+                count = min(int(params[2]), MAX_PAGE_SIZE)
+                span_started = span_start()
+                messages, next_id = target_board.get_group_messages(int(params[1]), count)
+                span_end('board.get_group_messages', span_started)
+                response = format_message_page(messages, next_id)
+        else:
+            response = "Error: %groupmessages requires a group ID, a starting message ID and a count."
 
+    elif command == '%groupsearch':
+        # Group search command expects the group ID, the offset and size of the page, then the search terms
+        if len(params) == 4 and all(param.isdigit() for param in params[:3]):
+            group_id = int(params[0])
+            target_board = private_boards.get(group_id)
+            if not target_board:
+                response = f"Error: Group '{group_id}' does not exist."
+            elif username not in target_board.members:
+                # A group's posts are private to its members, and so is finding them
+                response = f"Error: {username} is not a member of group '{group_id}'."
             else:
-                # Send an error response if the command is not recognized
-                response = "Unknown command."
-                client_socket.send((response + CRLF).encode('utf-8'))
+                offset = int(params[1])
+                count = min(int(params[2]), MAX_PAGE_SIZE)
+                span_started = span_start()
+                messages, next_offset = target_board.search_group_messages(params[3], offset, count)
+                span_end('board.search_group_messages', span_started)
+                response = format_search_page(messages, offset, next_offset)
+        else:
+            response = "Error: %groupsearch requires a group ID, an offset, a count and search terms."
+
+    else:
+        # Send an error response if the command is not recognized
+        response = "Unknown command."
+
+    return response
+
+def handle_client(client_socket, public_board, private_boards, pair_signals=False):
+    """
+    Continuously listens for client commands, processes them, and sends responses back.
+    With pair_signals, the session token the client sends with %session pairs this connection with its
+    signal connection (see handle_signal_connection).
+    """
+    
+    # Initialize client session data
+    client_sessions[client_socket] = {'username': None}
+    metrics.connection_opened()
+    try:
+        # Continuously listen for client commands; each frame holds exactly one command
+        # and the loop ends when the client closes the connection
+        for frame in read_frames(client_socket):
+            started = time.perf_counter()
+            message = frame.decode('utf-8')
+
+            # If we receive an empty message, continue waiting for a valid message
+            if not message.strip():
+                continue
+
+            # Parse the command and parameters from the client's message
+            # Debugging info, without the token of %admin so it doesn't end up in the server's output
+            admin = message.startswith('%admin')
+            print(f"Raw message received: {'%admin <token>' if admin else message}")
+            span_started = span_start()
+            command, params = parse_client_command(message)
+            span_end('parse', span_started)
+            print(f"Command: {command}, Params: {['<token>'] if admin else params}")  # Debugging line
+
+            # Run the command against the boards and send the response back once its changes are durable
+            position = log_position()
+            response = execute_command(client_socket, command, params, public_board, private_boards)
+            if command == '%session' and pair_signals and 'token' in client_sessions[client_socket]:
+                pair_session(client_sessions[client_socket]['token'], client_socket)
+            if not wait_until_durable(position):
+                response = "Error: The change could not be saved."
+            encoded = encode_response(response)
+            client_socket.sendall(encoded)
+            record_command(command, started, frame, encoded, response)
+
+            # Exit command terminates the client session, so break the loop to end the connection
+            if command == '%exit':
+                break
     
     except ValueError as ve:
         print(f"ValueError encountered: {ve}")
         response = "Error: Invalid parameters."
-        client_socket.send((response + CRLF).encode('utf-8'))
+        client_socket.sendall(encode_frame(response))
     except socket.error as se:
         print(f"Socket error: {se}")
         response = "Error: Socket communication failure."
-        client_socket.send((response + CRLF).encode('utf-8'))
+        client_socket.sendall(encode_frame(response))
     except Exception as e:
         print(f"Unexpected error handling client: {e}")
     finally:
+        metrics.connection_closed()
         # Notify others that the user has disconnected
         username = client_sessions[client_socket].get('username')
         if username:
             broadcast_message(client_socket, 'LEAVE_SIGNAL', username=username)
 
-        # Clean up session data
+        # Clean up session data, including a session token no signal connection claimed
         if client_socket in client_sessions:
+            token = client_sessions[client_socket].get('token')
+            with pairing_lock:
+                if sessions_by_token.get(token) is client_socket:
+                    del sessions_by_token[token]
+            set_session_username(client_socket, None)
             del client_sessions[client_socket]
+        # A multiplexed connection's signals end with it (a signal connection drops its own outbox)
+        drop_signal_session(client_socket)
         # Ensure the client socket is closed, whether or not an error occurred
         # This releases resources associated with the client connection
         client_socket.close()
         print("Client disconnected.")
 
-def start_server(host, port):
+def create_boards(group_names=DEFAULT_GROUP_NAMES, data_dir=None, durable=True, hot_posts=None, owns_group=None):
+    """
+    Creates the public board and the registry of private group boards shared by every client.
+    With a data_dir, the boards are rebuilt from the snapshot and post log kept there and every later change is
+    appended to the log (the log is reachable as public_board.log). durable=False skips the fsyncs.
+    With hot_posts, each board keeps only its newest hot_posts messages in memory and spills older ones to
+    segment files under data_dir (or a temporary directory without one).
+    Posts archived under data_dir by build_archive.py are read from the archives instead of being loaded into memory.
+    In cluster mode, owns_group(group_id) tells whether this node holds a starting group (numbered from 1 in
+    group_names order); the others are created by the nodes that hold them.
+    """
+    retention = None
+    if hot_posts:
+        spill_dir = os.path.join(data_dir, SPILL_DIR_NAME) if data_dir else tempfile.mkdtemp(prefix='bulletin-spill-')
+        retention = Retention(hot_posts, spill_dir)
+    archives = ArchiveSet(os.path.join(data_dir, ARCHIVE_DIR_NAME)) if data_dir else None
+
+    # Initialize a BulletinBoard instance to store messages from clients for the public bulletin board
+    public_board = BulletinBoard(retention=retention, archives=archives)
+
+    # Initialize the group registry; more groups can be created at runtime
+    private_boards = GroupRegistry(retention=retention, archives=archives)
+
+    last_seq = 0
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        log_path = os.path.join(data_dir, POST_LOG_NAME)
+        # Rebuild the boards from the latest snapshot plus the log records after it, before attaching
+        # the log so replayed changes aren't logged twice
+        snapshot_seq = load_snapshot(os.path.join(data_dir, SNAPSHOT_NAME), public_board, private_boards)
+        last_seq = replay_log(log_path, public_board, private_boards, after_seq=snapshot_seq)
+        log = PostLog(log_path, durable=durable, last_seq=last_seq)
+        public_board.log = log
+        private_boards.attach_log(log)
+
+    if not last_seq:
+        # Fresh start: create the starting private boards (logged, so they come back on restart)
+        for group_id, group_name in enumerate(group_names, 1):
+            if owns_group is None:
+                private_boards.create_group(group_name)
+            elif owns_group(group_id):
+                private_boards.create_group(group_name, group_id)
+
+    return public_board, private_boards
+
+def start_server(host, port, mode='threaded', signal_queue_limit=DEFAULT_MAX_QUEUED, overflow_policy=DROP_OLDEST,
+                 data_dir=None, durable=True, snapshot_interval=60.0, snapshot_min_changes=1000, hot_posts=None,
+                 workers=None, cluster_nodes=None, node=None, serve_replicas=False, follow=None, multiplex=False,
+                 stats_port=None, profile_dir=None, spans=False, admin_token=None):
     """
     Initializes and starts the server, listening for client connections.
-    Spawns a new thread for each connected client to handle communications.
+    In threaded mode a new thread is spawned for each connected client to handle communications;
+    in asyncio mode every client is served by one event loop (see async_server.py);
+    in multiprocess mode worker processes (default: one per CPU) share the port (see multiprocess_server.py);
+    in cluster mode this server is the node named node (default 'host:port') of the servers in cluster_nodes,
+    which split the boards between them and forward commands to each other (see cluster.py).
+    With serve_replicas, followers can connect on port + 3 and receive every change to the boards; with follow
+    ('host:port' of such a leader), this server is a read replica that answers read-only commands from its copy
+    of the leader's boards and forwards the rest to the leader (see replication.py).
+    With multiplex, each client's responses and signals share its one connection as channel-tagged frames and
+    no signal port is opened; clients must connect with --multiplex as well.
+    signal_queue_limit and overflow_policy bound each client's outbox of pending signals.
+    With a data_dir, posts, joins and group membership are logged there and survive a restart.
+    Every snapshot_interval seconds, once snapshot_min_changes changes have been logged, the boards are
+    snapshotted and the log is truncated behind the snapshot, so startup only replays the log tail.
+    With hot_posts, each board keeps that many of its newest messages in memory and reads older ones from disk.
+    With stats_port, the %stats report is also served as plain text on 127.0.0.1:stats_port (in multiprocess
+    mode, worker N serves its own on stats_port + N).
+    %profile writes its profiles to profile_dir (default: data_dir, else the temporary directory). With spans,
+    the time spent parsing, in board calls and broadcasting is measured all the time rather than only while a
+    profile is being taken.
+    %stats and %profile answer only clients that have sent %admin with admin_token; without one they are refused
+    to everyone.
     """
+    if mode not in SERVER_MODES:
+        raise ValueError(f"Unknown server mode '{mode}', expected one of {SERVER_MODES}")
+    if overflow_policy not in OVERFLOW_POLICIES:
+        raise ValueError(f"Unknown overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+    if (serve_replicas or follow) and mode != 'threaded':
+        raise ValueError("Replication runs on the threaded engine only.")
+    if serve_replicas and follow:
+        raise ValueError("A server can't both follow a leader and serve replicas.")
+    if follow and data_dir:
+        raise ValueError("A follower keeps no data of its own; its boards come from the leader.")
+    outbox_settings.update(max_queued=signal_queue_limit, overflow_policy=overflow_policy)
+    admin_settings.update(token=admin_token)
+    profiler.profile_dir = profile_dir or data_dir or profiler.profile_dir
+    profiler.keep_spans(spans)
+
+    global post_log, snapshotter
+    owns_group = None
+    if mode == 'cluster':
+        # Imported here because cluster builds on the command handling in this module
+        from cluster import HashRing, group_key
+        node = node or f"{host}:{port}"
+        ring = HashRing(cluster_nodes or [node])
+        owns_group = lambda group_id: ring.owner(group_key(group_id)) == node
+    if follow:
+        # Imported here because replication builds on the command handling in this module
+        from replication import start_follower
+        public_board, private_boards = start_follower(follow, hot_posts)
+    else:
+        public_board, private_boards = create_boards(data_dir=data_dir, durable=durable, hot_posts=hot_posts,
+                                                     owns_group=owns_group)
+    post_log = public_board.log
+    if post_log:
+        snapshot_seq = read_snapshot_seq(os.path.join(data_dir, SNAPSHOT_NAME))
+        snapshotter = Snapshotter(data_dir, public_board, private_boards, post_log, snapshot_interval,
+                                  snapshot_min_changes, snapshot_seq).start()
+    if serve_replicas:
+        from replication import start_leader
+        start_leader(host, port, public_board, private_boards)
+
+    if stats_port and mode != 'multiprocess':
+        # Worker processes serve their own (see multiprocess_server.run_worker)
+        start_stats_endpoint(stats_port, stats_report)
+        print(f"[*] Serving stats on 127.0.0.1:{stats_port}")
+
+    if mode == 'asyncio':
+        # Imported here because async_server builds on the command handling in this module
+        from async_server import start_async_server
+        asyncio.run(start_async_server(host, port, public_board, private_boards, multiplex))
+        return
+
+    if mode == 'multiprocess':
+        from multiprocess_server import start_multiprocess_server
+        start_multiprocess_server(host, port, public_board, private_boards, workers or os.cpu_count() or 1,
+                                  data_dir=data_dir, hot_posts=hot_posts, multiplex=multiplex, stats_port=stats_port,
+                                  profile_dir=profiler.profile_dir, spans=spans)
+        return
+
+    if mode == 'cluster':
+        from cluster import start_cluster_node
+        start_cluster_node(node, ring, public_board, private_boards)
 
     # Create a new socket using IPv4 (AF_INET) and TCP (SOCK_STREAM)
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    # Derive the signal socket's port (this assumes the signal port is offset by 1)
-    signal_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
     # Bind the server to the specified host and port
     server.bind((host, port))
-    signal_socket.bind((host, port+1))  # Connect to the signal socket
-
-    # Start listening for incoming connections; '5' is the max number of queued connections
-    server.listen(5)
-    # Accept incoming signal connection
-    signal_socket.listen(5)
-    print(f"[*] Listening on {host}:{port}")
+    # Start listening for incoming connections; '128' is the max number of queued connections, enough for a
+    # burst of clients connecting at once without the kernel dropping their handshakes
+    server.listen(128)
 
-    # Initialize a BulletinBoard instance to store messages from clients for the public bulletin board
-    public_board = BulletinBoard()
+    if multiplex:
+        print(f"[*] Listening on {host}:{port} (multiplexed)")
+        # One accept per client: its signals are sent on its command connection, so there is nothing to pair
+        while True:
+            sock, client_address = server.accept()
+            client_socket = register_multiplexed_client(sock)
+            print(f"[*] Accepted connection from {client_address}")
+            threading.Thread(target=handle_client, args=(client_socket, public_board, private_boards)).start()
 
-    # Initialize 5 BulletinBoard instances to store messages from clients for the private bulletin boards
-    custom_group_names = ["Alpha", "Beta", "Gamma", "Delta", "Epsilon"]
-    private_boards = [PrivateBoard(f"Group {name}") for name in custom_group_names]
+    # Derive the signal socket's port (this assumes the signal port is offset by 1)
+    signal_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    signal_socket.bind((host, port+1))  # Connect to the signal socket
+    # Accept incoming signal connections; each is paired with its command connection by session token, since
+    # two clients connecting at once can have their connections accepted in any order
+    signal_socket.listen(128)
+    threading.Thread(target=accept_signal_connections, args=(signal_socket,), daemon=True).start()
+    print(f"[*] Listening on {host}:{port}")
 
     # Continuously accept new client connections
     while True:
         # Accept a new client connection; returns a new socket and the address of the client
         client_socket, client_address = server.accept()
-        signal_client_socket, _ = signal_socket.accept()
-        signal_sessions[client_socket] = signal_client_socket
         print(f"[*] Accepted connection from {client_address}")
 
         # Create a new thread to handle communication with this client
         # Each client connection is managed independently to allow simultaneous clients
-        client_handler_thread = threading.Thread(target=handle_client, args=(client_socket, public_board, private_boards))
-        # Start a thread to handle incoming signals from the client
-        signal_thread = threading.Thread(target=handle_signal_client, args=(signal_client_socket, client_socket), daemon=True)
-
-        # Start the client handler thread
+        client_handler_thread = threading.Thread(target=handle_client, args=(client_socket, public_board, private_boards),
+                                                 kwargs={'pair_signals': True})
         client_handler_thread.start()
-        signal_thread.start()
 
 if __name__ == "__main__":
-    start_server('127.0.0.1', 5000)  # or 'localhost' instead of '127.0.0.1'
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bulletin board server")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to bind (or 'localhost')")
+    parser.add_argument('--port', type=int, default=5000, help="Command port; signals use port + 1 unless --multiplex")
+    parser.add_argument('--mode', choices=SERVER_MODES, default='threaded',
+                        help="threaded: one thread per client, asyncio: one event loop for all clients, "
+                             "multiprocess: worker processes sharing the port, "
+                             "cluster: one node of a cluster splitting the boards between servers")
+    parser.add_argument('--signal-queue-limit', type=int, default=DEFAULT_MAX_QUEUED,
+                        help="Signals queued per client before the overflow policy applies")
+    parser.add_argument('--overflow-policy', choices=OVERFLOW_POLICIES, default=DROP_OLDEST,
+                        help="What to do when a client stops reading signals")
+    parser.add_argument('--data-dir', help="Directory for the post log; without it nothing survives a restart")
+    parser.add_argument('--no-fsync', action='store_true',
+                        help="Write the post log without fsync (faster, but a crash can lose recent posts)")
+    parser.add_argument('--snapshot-interval', type=float, default=60.0,
+                        help="Seconds between checks for whether to snapshot the boards and truncate the post log")
+    parser.add_argument('--snapshot-min-changes', type=int, default=1000,
+                        help="Logged changes needed since the last snapshot before another is taken")
+    parser.add_argument('--hot-posts', type=int,
+                        help="Messages each board keeps in memory; older ones are read from disk (default: keep all)")
+    parser.add_argument('--workers', type=int, help="Worker processes in multiprocess mode (default: one per CPU)")
+    parser.add_argument('--cluster-nodes', help="Comma-separated host:port of every node in cluster mode; "
+                                                "each node also uses port + 1 for signals and port + 2 for other nodes")
+    parser.add_argument('--node', help="This server's host:port in --cluster-nodes (default: --host:--port)")
+    parser.add_argument('--serve-replicas', action='store_true',
+                        help="Stream every change to read replicas, which connect on port + 3")
+    parser.add_argument('--follow', metavar='HOST:PORT',
+                        help="Run as a read replica of the leader at HOST:PORT, forwarding writes to it")
+    parser.add_argument('--multiplex', action='store_true',
+                        help="Send each client's responses and signals over its one connection (no signal port); "
+                             "clients must use --multiplex too")
+    parser.add_argument('--stats-port', type=int,
+                        help="Also serve the %%stats report as plain text on 127.0.0.1:PORT "
+                             "(in multiprocess mode, worker N on PORT + N)")
+    parser.add_argument('--profile-dir', help="Directory %%profile writes profiles to (default: --data-dir, "
+                                              "else the temporary directory)")
+    parser.add_argument('--spans', action='store_true',
+                        help="Always time parsing, board calls and broadcasts for %%stats, not only while profiling")
+    parser.add_argument('--admin-token', default=os.environ.get('BULLETIN_ADMIN_TOKEN'),
+                        help="Token clients send with %%admin to use %%stats and %%profile (default: $BULLETIN_ADMIN_TOKEN; "
+                             "without one they are refused)")
+    args = parser.parse_args()
+    # Run through the imported module rather than this __main__ copy, so the async engine (which imports
+    # socket_server) sees the same settings, sessions and log
+    import socket_server
+    socket_server.start_server(args.host, args.port, args.mode, args.signal_queue_limit, args.overflow_policy,
+                               args.data_dir, not args.no_fsync, args.snapshot_interval, args.snapshot_min_changes,
+                               args.hot_posts, args.workers,
+                               args.cluster_nodes.split(',') if args.cluster_nodes else None, args.node,
+                               args.serve_replicas, args.follow, args.multiplex, args.stats_port,
+                               args.profile_dir, args.spans, args.admin_token)
@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import unittest
+from archive import ArchiveReader, ArchiveSet, write_archive
+from build_archive import build_archives
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from post_log import PostLog, replay_log
+from private_board import PrivateBoard
+
+def make_message(message_id, content="Hello"):
+    return {'id': message_id, 'sender': "Alice", 'date': "2024-12-02 16:38:44", 'subject': f"Subject {message_id}",
+            'content': content}
+
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an empty directory for archives."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'public.archive')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_read(self):
+        """Test that archived messages are found by ID, including around gaps."""
+        write_archive(self.path, [make_message(3), make_message(4, "Grüße 日本"), make_message(7)])
+        reader = ArchiveReader(self.path)
+        self.assertEqual((reader.first_id, reader.last_id), (3, 7))
+        self.assertEqual(reader.get(3), make_message(3))
+        self.assertEqual(reader.get(4)['content'], "Grüße 日本")
+        self.assertIsNone(reader.get(5))
+        self.assertIsNone(reader.get(2))
+        self.assertIsNone(reader.get(8))
+        self.assertIn(7, reader)
+        self.assertEqual([message['id'] for message in reader], [3, 4, 7])
+        reader.close()
+
+    def test_postings(self):
+        """Test that the archive holds the IDs of the posts containing each word, in ID order."""
+        write_archive(self.path, [make_message(3, "deploy notes"), make_message(4, "Grüße"), make_message(7, "deploy")])
+        reader = ArchiveReader(self.path)
+        self.assertEqual(list(reader.postings("deploy")), [3, 7])
+        self.assertEqual(list(reader.postings("grüße")), [4])
+        self.assertEqual(list(reader.postings("subject")), [3, 4, 7])
+        self.assertIsNone(reader.postings("missing"))
+        reader.close()
+
+    def test_empty_archive(self):
+        """Test that an archive without messages can be read."""
+        write_archive(self.path, [])
+        reader = ArchiveReader(self.path)
+        self.assertIsNone(reader.get(1))
+        self.assertEqual(list(reader), [])
+        reader.close()
+
+    def test_not_an_archive(self):
+        """Test that other files are rejected."""
+        with open(self.path, 'wb') as other_file:
+            other_file.write(b"x" * 64)
+        with self.assertRaises(ValueError):
+            ArchiveReader(self.path)
+
+    def test_board_reads_archive(self):
+        """Test that a board serves archived posts, doesn't restore them into memory and numbers new posts after them."""
+        write_archive(self.path, [make_message(message_id) for message_id in range(1, 11)])
+        board = BulletinBoard(archives=ArchiveSet(self.directory))
+        self.assertFalse(board.restore_post(make_message(5)))
+        self.assertNotIn(5, board.messages)
+        self.assertEqual(board.get_message_content(5), "Alice on 2024-12-02 16:38:44: Hello")
+        self.assertEqual(board.add_post("Bob", "2024-12-02 16:50:00", "New", "newest"), 11)
+        # Rows start after the archived IDs, and the example posts are read from the archive
+        self.assertEqual(len(board.messages.ids), 1)
+        self.assertEqual(board.get_message_content(2), "Alice on 2024-12-02 16:38:44: Hello")
+        board.archive.close()
+
+    def test_group_pages_and_searches_archive(self):
+        """Test that a group's archived posts are paged through and found by search."""
+        group_id = PrivateBoard.last_group_id + 1
+        write_archive(os.path.join(self.directory, f'group-{group_id}.archive'),
+                      [make_message(message_id, f"archived {message_id}") for message_id in range(3, 9)])
+        board = PrivateBoard("Archived group", group_id=group_id, archives=ArchiveSet(self.directory))
+        board.post_to_group("Bob", "2024-12-02 16:50:00", "New", "fresh post")
+        messages, next_id = board.get_group_messages(1, 50)
+        self.assertEqual([message['id'] for message in messages], list(range(1, 10)))
+        self.assertEqual(next_id, 0)
+        messages, _ = board.search_group_messages("archived", 0, 50)
+        self.assertEqual([message['id'] for message in messages], list(range(8, 2, -1)))
+        # Found through the archive's postings; opening the archive indexed nothing in memory
+        self.assertNotIn("archived", board.search_index.postings)
+        board.archive.close()
+
+class TestBuildArchive(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a data directory whose log holds 20 public posts."""
+        self.data_dir = tempfile.mkdtemp()
+        log = PostLog(os.path.join(self.data_dir, 'posts.log'), durable=False)
+        board = BulletinBoard(log=log)
+        board.add_user("Alice")
+        for number in range(3, 21):
+            board.add_post("Alice", "2024-12-02 16:38:44", f"Subject {number}", f"post {number}")
+        self.assertTrue(log.wait_committed(log.last_seq))
+        log.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_builds_and_merges(self):
+        """Test that all but the newest posts are archived, and later runs keep what earlier ones archived."""
+        self.assertEqual(build_archives(self.data_dir, keep=5)[0], ('public.archive', 15))
+        archives = ArchiveSet(os.path.join(self.data_dir, 'archive'))
+        reader = archives.open()
+        self.assertEqual((reader.first_id, reader.last_id), (1, 15))
+        reader.close()
+        # Once a restarted server snapshots, archived posts are gone from the snapshot and log
+        os.remove(os.path.join(self.data_dir, 'posts.log'))
+        self.assertEqual(build_archives(self.data_dir, keep=5), [('public.archive', 15)])
+        reader = archives.open()
+        self.assertEqual(reader.get(12)['content'], "post 12")
+        reader.close()
+
+    def test_restarted_board_pages_and_searches_archive(self):
+        """Test that after archiving, paging and search still cover every post, archived or not."""
+        build_archives(self.data_dir, keep=5)
+        board = BulletinBoard(archives=ArchiveSet(os.path.join(self.data_dir, 'archive')))
+        self.addCleanup(board.archive.close)
+        replay_log(os.path.join(self.data_dir, 'posts.log'), board, GroupRegistry())
+
+        messages, next_id = board.get_messages(1, 50)
+        self.assertEqual([message['id'] for message in messages], list(range(1, 21)))
+        self.assertEqual(next_id, 0)
+        # A page that ends in the archive continues from where it stopped
+        messages, next_id = board.get_messages(13, 3)
+        self.assertEqual([message['id'] for message in messages], [13, 14, 15])
+        self.assertEqual(next_id, 16)
+        messages, _ = board.get_messages(next_id, 3)
+        self.assertEqual([message['id'] for message in messages], [16, 17, 18])
+
+        messages, _ = board.search_messages("post", 0, 50)
+        self.assertEqual([message['id'] for message in messages], list(range(20, 2, -1)))
+        messages, _ = board.search_messages("hello", 0, 50)
+        self.assertEqual([message['id'] for message in messages], [2, 1])
+        # Pages of matches continue across the archived and in-memory posts
+        messages, next_offset = board.search_messages("post", 3, 4)
+        self.assertEqual([message['id'] for message in messages], [17, 16, 15, 14])
+        self.assertEqual(next_offset, 7)
+
+    def test_leaves_torn_log_alone(self):
+        """Test that a partial last record (a live server mid-write) is skipped rather than cut off."""
+        log_path = os.path.join(self.data_dir, 'posts.log')
+        with open(log_path, 'ab') as log_file:
+            log_file.write(b'{"seq": 99, "type": "po')
+        size = os.path.getsize(log_path)
+        build_archives(self.data_dir, keep=5)
+        self.assertEqual(os.path.getsize(log_path), size)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+import async_server
+import socket_server
+from bulletin_board import BulletinBoard
+from socket_protocol import encode_frame
+
+class TestAsyncServer(unittest.IsolatedAsyncioTestCase):
+
+    def make_reader(self, *chunks):
+        """Builds a StreamReader that yields the given chunks and then EOF."""
+        reader = asyncio.StreamReader()
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        return reader
+
+    def make_writer(self):
+        """Builds a mock StreamWriter with an awaitable drain()."""
+        writer = MagicMock()
+        writer.drain = MagicMock(side_effect=lambda: asyncio.sleep(0))
+        return writer
+
+    async def test_exit_command(self):
+        """Test that %exit is answered and ends the session."""
+        writer = self.make_writer()
+        await async_server.handle_client_async(self.make_reader(encode_frame('%exit')), writer, BulletinBoard(), [])
+        writer.write.assert_called_with(encode_frame('Goodbye!'))
+        writer.close.assert_called()
+
+    async def test_unknown_command(self):
+        """Test that an unknown command gets an error response."""
+        writer = self.make_writer()
+        await async_server.handle_client_async(self.make_reader(encode_frame('%unknown')), writer, BulletinBoard(), [])
+        writer.write.assert_called_with(encode_frame('Unknown command.'))
+
+    async def test_pipelined_commands(self):
+        """Test that several commands arriving in one read are all answered in order."""
+        writer = self.make_writer()
+        data = encode_frame('%users') + encode_frame('%exit')
+        await async_server.handle_client_async(self.make_reader(data), writer, BulletinBoard(), [])
+        self.assertEqual(writer.write.call_args_list[0].args[0], encode_frame('No users in the group.'))
+        self.assertEqual(writer.write.call_args_list[1].args[0], encode_frame('Goodbye!'))
+
+    async def test_session_cleaned_up_on_disconnect(self):
+        """Test that session data is removed when the client closes the connection."""
+        writer = self.make_writer()
+        await async_server.handle_client_async(self.make_reader(), writer, BulletinBoard(), [])
+        self.assertEqual(socket_server.client_sessions, {})
+        self.assertEqual(async_server.sessions_by_token, {})
+
+    async def pair(self, signal_first):
+        """Opens a split client's two connections in the given order and returns the outbox its signals go to."""
+        signal_reader = asyncio.StreamReader()
+        signal_reader.feed_data(encode_frame('SESSION tok123'))
+        command_reader = asyncio.StreamReader()
+        command_reader.feed_data(encode_frame('%session tok123'))
+        handlers = [async_server.handle_signal_client_async(signal_reader, self.make_writer()),
+                    async_server.handle_client_async(command_reader, self.make_writer(), BulletinBoard(), [])]
+        if not signal_first:
+            handlers.reverse()
+        tasks = [asyncio.create_task(handler) for handler in handlers]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        paired = dict(socket_server.signal_sessions)
+        signal_reader.feed_eof()
+        command_reader.feed_eof()
+        await asyncio.gather(*tasks)
+        return paired
+
+    async def test_signal_connection_before_session(self):
+        """Test that a signal connection accepted before its command connection waits for it and is paired."""
+        paired = await self.pair(signal_first=True)
+        self.assertEqual(len(paired), 1)
+        self.assertEqual(async_server.pending_signals, {})
+        self.assertEqual(socket_server.signal_sessions, {})
+
+    async def test_signal_connection_after_session(self):
+        """Test that a signal connection accepted after its command connection's %session is paired by token."""
+        paired = await self.pair(signal_first=False)
+        self.assertEqual(len(paired), 1)
+        self.assertEqual(async_server.sessions_by_token, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
+import shutil
+import tempfile
 import unittest
 from bulletin_board import BulletinBoard
+from message_store import Retention
 
 class TestBulletinBoard(unittest.TestCase):
 
@@ -48,6 +51,26 @@ class TestBulletinBoard(unittest.TestCase):
         content = self.board.get_message_content(999)
         self.assertIsNone(content)
 
+    def test_get_message_content_uses_index(self):
+        """Test that every posted message can be looked up by its ID."""
+        ids = [self.board.add_post("Alice", "2024-10-01", f"Subject {i}", f"Content {i}") for i in range(100)]
+        self.assertEqual(self.board.get_message_content(ids[42]), "Alice on 2024-10-01: Content 42")
+        self.assertIn(ids[99], self.board.messages)
+
+    def test_old_messages_read_from_disk(self):
+        """Test that messages pushed out of memory by retention are still readable."""
+        spill_dir = tempfile.mkdtemp()
+        board = BulletinBoard(retention=Retention(2, spill_dir))
+        try:
+            for number in range(10):
+                board.add_post("Alice", "2024-12-02 16:38:44", f"Subject {number}", f"Content {number}")
+            self.assertEqual(len(board.messages.ids), 2)
+            self.assertEqual(board.get_message_content(1), "user1 on 2024-12-02 16:38:44: hello world")
+            self.assertEqual(board.get_message_content(3), "Alice on 2024-12-02 16:38:44: Content 0")
+        finally:
+            board.messages.segment.close()
+            shutil.rmtree(spill_dir)
+
     def test_list_users(self):
         """Test listing users."""
         self.board.add_user("Alice")
@@ -0,0 +1,38 @@
+import unittest
+from client_cache import ResponseCache
+from socket_protocol import format_listing, format_not_modified
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_posts_kept_until_evicted(self):
+        """Test that posts are served from the cache and the least recently read is dropped first."""
+        cache = ResponseCache(max_posts=2)
+        self.assertIsNone(cache.get_post((None, '1')))
+        cache.store_post((None, '1'), "user1 on 2024-12-02: hello")
+        cache.store_post(('3', '1'), "user3 on 2024-12-02: private")
+        self.assertEqual(cache.get_post((None, '1')), "user1 on 2024-12-02: hello")
+        cache.store_post((None, '2'), "user2 on 2024-12-02: again")
+        self.assertIsNone(cache.get_post(('3', '1')))
+        self.assertEqual(cache.hits, 1)
+
+    def test_listing_revalidated(self):
+        """Test that a listing is cached with its version and reused when the server says NOT_MODIFIED."""
+        cache = ResponseCache()
+        self.assertEqual(cache.listing_version('users'), "")
+        self.assertEqual(cache.resolve_listing('users', format_listing("a1.1", "Alice")), "Alice")
+        self.assertEqual(cache.listing_version('users'), "a1.1")
+        self.assertEqual(cache.resolve_listing('users', format_not_modified("a1.1")), "Alice")
+        self.assertEqual(cache.resolve_listing('users', format_listing("a1.2", "Alice\nBob")), "Alice\nBob")
+        self.assertEqual(cache.not_modified, 1)
+
+    def test_unversioned_responses_pass_through(self):
+        """Test that errors and listings from a server that doesn't version them are shown and not cached."""
+        cache = ResponseCache()
+        self.assertEqual(cache.resolve_listing(('groupusers', '9'), "Error: Group '9' does not exist."),
+                         "Error: Group '9' does not exist.")
+        self.assertEqual(cache.resolve_listing('groups', "ID: 1, Name: Group Alpha"), "ID: 1, Name: Group Alpha")
+        self.assertIsNone(cache.resolve_listing('groups', None))
+        self.assertEqual(cache.listings, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import socket
+import time
+import unittest
+import socket_server
+from bulletin_board import BulletinBoard
+from cluster import PEER_PORT_OFFSET, ClusterNode, HashRing, group_key
+from group_registry import GroupRegistry
+from private_board import PrivateBoard
+
+class TestHashRing(unittest.TestCase):
+
+    def test_every_node_gets_keys(self):
+        """Test that keys spread over every node and land on the same node every time."""
+        ring = HashRing(["a:1", "b:1", "c:1"])
+        owners = [ring.owner(group_key(group_id)) for group_id in range(3000)]
+        for node in ring.nodes:
+            self.assertGreater(owners.count(node), 600)
+        self.assertEqual(owners, [HashRing(["c:1", "a:1", "b:1"]).owner(group_key(group_id)) for group_id in range(3000)])
+
+    def test_adding_a_node_moves_few_keys(self):
+        """Test that a new node only takes keys over from the others."""
+        before = HashRing(["a:1", "b:1", "c:1"])
+        after = HashRing(["a:1", "b:1", "c:1", "d:1"])
+        moved = 0
+        for group_id in range(3000):
+            old, new = before.owner(group_key(group_id)), after.owner(group_key(group_id))
+            if old != new:
+                self.assertEqual(new, "d:1")
+                moved += 1
+        self.assertLess(moved, 1200)
+
+class TestClusterNode(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up two nodes in this process, each with its own boards, linked over localhost."""
+        listeners = []
+        for _ in range(2):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(4)
+            listeners.append(listener)
+        # Node names are client addresses; the peer port is PEER_PORT_OFFSET above
+        names = [f"127.0.0.1:{listener.getsockname()[1] - PEER_PORT_OFFSET}" for listener in listeners]
+        ring = HashRing(names)
+        cls.nodes = [ClusterNode(name, ring, BulletinBoard(), GroupRegistry()) for name in names]
+        for node, listener in zip(cls.nodes, listeners):
+            node.start(listener)
+        deadline = time.monotonic() + 5
+        while not all(link.sock for node in cls.nodes for link in node.links.values()):
+            if time.monotonic() > deadline:
+                raise RuntimeError("nodes did not connect")
+            time.sleep(0.01)
+
+    def setUp(self):
+        self.local, self.remote = self.nodes
+        self.client = object()
+        socket_server.client_sessions[self.client] = {'username': "Alice"}
+
+    def tearDown(self):
+        socket_server.client_sessions.pop(self.client, None)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out waiting for the other node")
+            time.sleep(0.01)
+
+    def remote_group(self, group_name):
+        """Creates a group on the remote node under an ID that hashes to it."""
+        group_id = PrivateBoard.last_group_id + 1
+        while not self.remote.owns(group_key(group_id)):
+            group_id += 1
+        return self.remote.private_boards.create_group(group_name, group_id)
+
+    def test_forwards_commands_for_remote_boards(self):
+        """Test that a command for a group on the other node runs there."""
+        board = self.remote_group("Remote Forward")
+        self.assertTrue(self.local.forwards('%groupjoin', [str(board.group_id)]))
+        self.assertFalse(self.remote.forwards('%groupjoin', [str(board.group_id)]))
+        response = self.local.execute(self.client, '%groupjoin', [str(board.group_id)])
+        self.assertTrue(response.startswith(f"Alice joined group {board.group_id}."))
+        self.assertIn("Alice", board.members)
+        self.assertIsNone(self.local.private_boards.get(board.group_id))
+
+    def test_join_by_name(self):
+        """Test that a group joined by name is found on the node holding it."""
+        board = self.remote_group("Remote By Name")
+        response = self.local.execute(self.client, '%groupjoin', ["Remote By Name"])
+        self.assertTrue(response.startswith(f"Alice joined group {board.group_id}."))
+        self.assertEqual(self.local.execute(self.client, '%groupjoin', ["Nowhere"]), "Error: Group 'Nowhere' does not exist.")
+
+    def test_create_and_list_groups(self):
+        """Test that a new group is created on the node its ID hashes to and listed by every node."""
+        response = self.local.execute(self.client, '%groupcreate', ["Created Anywhere"])
+        group_id = int(response.split()[2].rstrip(':'))
+        owner = self.local if self.local.owns(group_key(group_id)) else self.remote
+        self.assertEqual(owner.private_boards.get(group_id).group_name, "Created Anywhere")
+        self.assertEqual(self.remote.execute(self.client, '%groupcreate', ["Created Anywhere"]),
+                         "Error: Group 'Created Anywhere' already exists.")
+        for node in self.nodes:
+            self.assertIn(f"ID: {group_id}, Name: Created Anywhere", node.execute(self.client, '%groups', []))
+
+    def test_forwarded_errors_are_raised(self):
+        """Test that an exception from a forwarded command is raised on the node the client is connected to."""
+        origin = self.remote if self.local.owns('public') else self.local
+        self.assertTrue(origin.forwards('%message', ["not-a-number"]))
+        with self.assertRaises(ValueError):
+            origin.execute(self.client, '%message', ["not-a-number"])
+
+    def test_presence_reaches_other_nodes(self):
+        """Test that the users of a node's sessions are counted on the other node, for routing signals."""
+        self.local.publish_session(self.client, "Alice")
+        self.wait_for(lambda: self.remote.peer_users[self.local.name].get("Alice") == 1)
+        self.local.publish_session(self.client, None)
+        self.wait_for(lambda: "Alice" not in self.remote.peer_users[self.local.name])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from private_board import PrivateBoard
+from group_registry import GroupRegistry
+
+def slow_board(*args, **kwargs):
+    # Widens the window between the name check and the registration
+    time.sleep(0.01)
+    return PrivateBoard(*args, **kwargs)
+
+class TestGroupRegistry(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a registry with two starting groups."""
+        self.registry = GroupRegistry(["Group Alpha", "Group Beta"])
+
+    def test_lookup_by_id_and_name(self):
+        """Test that a group can be found by its ID and by its name."""
+        board = self.registry.get_by_name("Group Beta")
+        self.assertIs(self.registry.get(board.group_id), board)
+        self.assertIs(self.registry.resolve(str(board.group_id)), board)
+        self.assertIs(self.registry.resolve("Group Beta"), board)
+
+    def test_missing_group(self):
+        """Test that unknown IDs and names return None."""
+        self.assertIsNone(self.registry.get(-1))
+        self.assertIsNone(self.registry.resolve("Group Omega"))
+
+    def test_create_group(self):
+        """Test creating a group at runtime."""
+        board = self.registry.create_group("Group Gamma")
+        self.assertEqual(len(self.registry), 3)
+        self.assertIn(board.group_id, self.registry)
+        self.assertEqual([b.group_name for b in self.registry], ["Group Alpha", "Group Beta", "Group Gamma"])
+
+    def test_create_duplicate_group(self):
+        """Test that group names must be unique."""
+        with self.assertRaises(ValueError):
+            self.registry.create_group("Group Alpha")
+
+    def test_remove_group(self):
+        """Test removing a group drops it from both indexes."""
+        board = self.registry.get_by_name("Group Alpha")
+        self.assertIs(self.registry.remove_group(board.group_id), board)
+        self.assertIsNone(self.registry.get(board.group_id))
+        self.assertIsNone(self.registry.get_by_name("Group Alpha"))
+        self.assertIsNone(self.registry.remove_group(board.group_id))
+
+    def test_concurrent_create_same_name(self):
+        """Test that when several threads create the same name at once, exactly one group is created."""
+        created, refused = [], []
+
+        def create():
+            try:
+                created.append(self.registry.create_group("Group Zeta"))
+            except ValueError:
+                refused.append(True)
+
+        with patch('group_registry.PrivateBoard', side_effect=slow_board):
+            threads = [threading.Thread(target=create) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual((len(created), len(refused)), (1, 3))
+        self.assertIs(self.registry.get_by_name("Group Zeta"), created[0])
+        self.assertEqual(len(self.registry), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import unittest
+import async_server
+import load_generator
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+
+class TestLoadGenerator(unittest.IsolatedAsyncioTestCase):
+
+    async def start_server(self):
+        """Starts the asyncio engine in this process with multiplexed connections and returns its port."""
+        public_board = BulletinBoard()
+        private_boards = GroupRegistry(["Group Alpha", "Group Beta"])
+        server = await asyncio.start_server(
+            lambda reader, writer: async_server.handle_client_async(reader, writer, public_board, private_boards,
+                                                                    multiplex=True),
+            '127.0.0.1', 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        return server.sockets[0].getsockname()[1]
+
+    def make_args(self, scenario, **overrides):
+        args = argparse.Namespace(scenario=scenario, clients=3, commands=4, groups=2, groups_per_client=1, seed=1,
+                                  drain=0.2, multiplex=True)
+        vars(args).update(overrides)
+        return args
+
+    async def test_post_heavy_measures_latency_and_lag(self):
+        """Test that every post is timed and its signal's lag is measured at each other client."""
+        port = await self.start_server()
+        stats = await load_generator.run_scenario('127.0.0.1', port, self.make_args('post-heavy'))
+        self.assertEqual(len(stats.latencies['%post']), 12)
+        self.assertEqual(len(stats.latencies['%message']), 3)
+        self.assertEqual(sum(stats.errors.values()), 0)
+        self.assertEqual(len(stats.lags['POST_SIGNAL']), 12 * 2)
+        self.assertEqual([name for name, _, _ in stats.phases], ['connect+join', 'post'])
+
+    async def test_many_groups_posts_to_joined_groups(self):
+        """Test that clients join the created groups by name and post to them without errors."""
+        port = await self.start_server()
+        stats = await load_generator.run_scenario('127.0.0.1', port, self.make_args('many-groups'))
+        self.assertEqual(len(stats.latencies['%groupcreate']), 2)
+        self.assertEqual(len(stats.latencies['%grouppost']), 12)
+        self.assertEqual(sum(stats.errors.values()), 0)
+
+    def test_same_seed_same_choices(self):
+        """Test that a client's choices depend only on the seed and its number."""
+        stats = load_generator.LoadStats()
+        first = load_generator.LoadClient(7, stats, seed=3)
+        second = load_generator.LoadClient(7, stats, seed=3)
+        self.assertEqual([first.random.random() for _ in range(5)], [second.random.random() for _ in range(5)])
+
+if __name__ == '__main__':
+    unittest.main()
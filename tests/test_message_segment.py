@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+from message_segment import MessageSegment
+
+class TestMessageSegment(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an empty segment in a temporary directory."""
+        self.directory = tempfile.mkdtemp()
+        self.segment = MessageSegment(os.path.join(self.directory, 'public'))
+
+    def tearDown(self):
+        self.segment.close()
+        shutil.rmtree(self.directory)
+
+    def test_append_and_get(self):
+        """Test that appended messages are found by ID, whatever order they were spilled in."""
+        self.segment.append(5, "Alice", "2024-12-02 16:38:44", "Five", "Hello")
+        self.segment.append(2, "Bob", "yesterday", "Two", "Bye")
+        self.assertEqual(self.segment.get(2), {'id': 2, 'sender': "Bob", 'date': "yesterday",
+                                               'subject': "Two", 'content': "Bye"})
+        self.assertEqual(self.segment.get(5)['subject'], "Five")
+        self.assertIn(5, self.segment)
+        self.assertNotIn(3, self.segment)
+        self.assertNotIn(6, self.segment)
+        self.assertNotIn(0, self.segment)
+        self.assertEqual(len(self.segment), 2)
+
+    def test_non_ascii(self):
+        """Test that fields are split by byte length, not character count."""
+        self.segment.append(1, "Zoë", "2024-12-02 16:38:44", "Grüße", "日本語 text")
+        self.assertEqual(self.segment.get(1)['sender'], "Zoë")
+        self.assertEqual(self.segment.get(1)['subject'], "Grüße")
+        self.assertEqual(self.segment.get(1)['content'], "日本語 text")
+
+    def test_recreated_on_open(self):
+        """Test that opening a segment starts from empty files."""
+        self.segment.append(1, "Alice", "2024-12-02 16:38:44", "s", "c")
+        self.segment.close()
+        self.segment = MessageSegment(os.path.join(self.directory, 'public'))
+        self.assertIsNone(self.segment.get(1))
+
+if __name__ == '__main__':
+    unittest.main()
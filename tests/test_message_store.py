@@ -0,0 +1,128 @@
+import shutil
+import tempfile
+import unittest
+from message_store import MessageStore, Retention, date_to_timestamp, open_message_store, timestamp_to_date
+
+class TestMessageStore(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an empty store."""
+        self.store = MessageStore()
+
+    def test_add_and_get(self):
+        """Test that a stored message comes back as the same dict."""
+        self.assertTrue(self.store.add(1, "Alice", "2024-12-02 16:38:44", "Subject", "Hello"))
+        self.assertEqual(self.store.get(1), {'id': 1, 'sender': "Alice", 'date': "2024-12-02 16:38:44",
+                                             'subject': "Subject", 'content': "Hello"})
+        self.assertIsNone(self.store.get(2))
+        self.assertIsNone(self.store.get(0))
+
+    def test_duplicate_id(self):
+        """Test that an ID can only hold one message."""
+        self.store.add(1, "Alice", "2024-12-02 16:38:44", "Subject", "Hello")
+        self.assertFalse(self.store.add(1, "Bob", "2024-12-02 16:38:44", "Other", "Bye"))
+        self.assertEqual(len(self.store), 1)
+
+    def test_out_of_order_ids(self):
+        """Test that messages can arrive out of ID order and are iterated in ID order."""
+        self.store.add(3, "Carol", "2024-12-02 16:38:44", "Third", "c")
+        self.assertNotIn(2, self.store)
+        self.store.add(1, "Alice", "2024-12-02 16:38:44", "First", "a")
+        self.assertEqual([message['id'] for message in self.store], [1, 3])
+        self.assertEqual(len(self.store), 2)
+
+    def test_page(self):
+        """Test that pages follow ID order and report where the next page starts."""
+        for message_id in range(1, 11):
+            self.store.add(message_id, "Alice", "2024-12-02 16:38:44", f"Subject {message_id}", "c")
+        messages, next_id = self.store.page(3, 4)
+        self.assertEqual([message['id'] for message in messages], [3, 4, 5, 6])
+        self.assertEqual(next_id, 7)
+        messages, next_id = self.store.page(8, 100)
+        self.assertEqual([message['id'] for message in messages], [8, 9, 10])
+        self.assertEqual(next_id, 0)
+
+    def test_senders_are_interned(self):
+        """Test that each sender name is stored once."""
+        for message_id in range(1, 101):
+            self.store.add(message_id, "Alice" if message_id % 2 else "Bob", "2024-12-02 16:38:44", "s", "c")
+        self.assertEqual(self.store.sender_names, ["Alice", "Bob"])
+
+    def test_dates(self):
+        """Test that standard dates become timestamps and anything else is kept as text."""
+        self.assertEqual(timestamp_to_date(date_to_timestamp("2024-12-02 16:38:44")), "2024-12-02 16:38:44")
+        self.assertIsNone(date_to_timestamp("2024-10-01"))
+        self.assertIsNone(date_to_timestamp("yesterday"))
+        self.store.add(1, "Alice", "2024-10-01", "Subject", "Hello")
+        self.assertEqual(self.store.get(1)['date'], "2024-10-01")
+
+    def test_base_id(self):
+        """Test that rows start at base_id, and a later post below it still fits without losing the others."""
+        store = MessageStore(base_id=1001)
+        store.add(1001, "Alice", "2024-12-02 16:38:44", "First", "a")
+        store.add(1002, "Alice", "yesterday", "Second", "b")
+        self.assertEqual(len(store.ids), 2)
+        self.assertEqual([message['id'] for message in store], [1001, 1002])
+        self.assertIsNone(store.get(5))
+
+        self.assertTrue(store.add(998, "Bob", "2024-12-02 16:38:44", "Late", "c"))
+        self.assertEqual(len(store.ids), 5)
+        self.assertEqual(store.get(998)['subject'], "Late")
+        self.assertEqual(store.get(1002)['date'], "yesterday")
+        self.assertEqual([message['id'] for message in store], [998, 1001, 1002])
+        messages, next_id = store.page(1, 2)
+        self.assertEqual([message['id'] for message in messages], [998, 1001])
+        self.assertEqual(next_id, 1002)
+
+class TestHotRing(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a store that keeps three messages in memory and spills the rest."""
+        self.spill_dir = tempfile.mkdtemp()
+        self.store = open_message_store('public', retention=Retention(3, self.spill_dir))
+
+    def tearDown(self):
+        self.store.segment.close()
+        shutil.rmtree(self.spill_dir)
+
+    def test_older_messages_spill(self):
+        """Test that only the newest messages stay in memory and older ones are still found."""
+        for message_id in range(1, 11):
+            self.store.add(message_id, "Alice", "2024-12-02 16:38:44", f"Subject {message_id}", f"Content {message_id}")
+        self.assertEqual(len(self.store.ids), 3)
+        self.assertEqual(sorted(self.store.ids), [8, 9, 10])
+        self.assertEqual(len(self.store.segment), 7)
+        self.assertEqual(len(self.store), 10)
+        self.assertEqual(self.store.get(2), {'id': 2, 'sender': "Alice", 'date': "2024-12-02 16:38:44",
+                                             'subject': "Subject 2", 'content': "Content 2"})
+        self.assertEqual([message['id'] for message in self.store], list(range(1, 11)))
+        messages, next_id = self.store.page(6, 3)
+        self.assertEqual([message['id'] for message in messages], [6, 7, 8])
+        self.assertEqual(next_id, 9)
+
+    def test_late_old_message(self):
+        """Test that a message older than the ones in memory goes straight to disk, once."""
+        for message_id in (2, 3, 4, 5):
+            self.store.add(message_id, "Alice", "2024-12-02 16:38:44", "s", "c")
+        self.assertTrue(self.store.add(1, "Bob", "yesterday", "Late", "c"))
+        self.assertFalse(self.store.add(1, "Bob", "yesterday", "Late", "c"))
+        self.assertFalse(self.store.add(2, "Bob", "yesterday", "Again", "c"))
+        self.assertEqual(self.store.get(1)['date'], "yesterday")
+        self.assertEqual(self.store.get(2)['subject'], "s")
+        self.assertEqual(len(self.store), 5)
+
+    def test_raw_dates_follow_their_row(self):
+        """Test that a date kept as text is spilled with its message and not reused by the next one."""
+        self.store.add(1, "Alice", "yesterday", "s", "c")
+        self.store.add(4, "Alice", "2024-12-02 16:38:44", "s", "c")
+        self.assertEqual(self.store.get(1)['date'], "yesterday")
+        self.assertEqual(self.store.get(4)['date'], "2024-12-02 16:38:44")
+        self.assertEqual(self.store.raw_dates, {})
+
+    def test_needs_a_segment(self):
+        """Test that a bounded store must have somewhere to spill to."""
+        with self.assertRaises(ValueError):
+            MessageStore(hot_limit=3)
+
+if __name__ == '__main__':
+    unittest.main()
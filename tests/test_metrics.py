@@ -0,0 +1,61 @@
+import unittest
+import urllib.request
+from metrics import MAX_COMMANDS, Histogram, MetricsRegistry, bucket_index, bucket_upper_bound
+from metrics import start_stats_endpoint
+
+class TestMetrics(unittest.TestCase):
+
+    def test_buckets_are_contiguous(self):
+        """Test that every value lands in a bucket whose upper bound is within 1/16 of it."""
+        previous = -1
+        for value in range(0, 100000):
+            index = bucket_index(value)
+            self.assertIn(index, (previous, previous + 1))
+            previous = index
+            upper = bucket_upper_bound(index)
+            self.assertGreaterEqual(upper, value)
+            self.assertLessEqual(upper - value, max(1, value // 16))
+
+    def test_percentiles(self):
+        """Test that percentiles come from the bucket holding that rank and never exceed the max."""
+        histogram = Histogram()
+        for value in range(1, 1001):
+            histogram.record(value)
+        self.assertAlmostEqual(histogram.percentile(0.5), 500, delta=500 / 16)
+        self.assertAlmostEqual(histogram.percentile(0.99), 990, delta=990 / 16)
+        self.assertEqual(histogram.percentile(1.0), 1000)
+        self.assertEqual(Histogram().percentile(0.5), 0)
+
+    def test_report(self):
+        """Test that the report covers commands, traffic, connections, fan-out and signal queues."""
+        registry = MetricsRegistry()
+        registry.connection_opened()
+        registry.record_command('%post', 0.002, 60, 90)
+        registry.record_command('%post', 0.004, 60, 90, error=True)
+        registry.record_broadcast(12, 40)
+        report = registry.report([[b"frame"] * 3, []]).split("\n")
+        self.assertIn("connections 1", report)
+        self.assertIn("bytes_in 120", report)
+        self.assertIn("signal_bytes_out 480", report)
+        self.assertIn("signal_queues clients=2 queued=3 max=3", report)
+        post = next(line for line in report if line.startswith("command %post "))
+        self.assertIn("count=2 errors=1", post)
+
+    def test_command_names_are_bounded(self):
+        """Test that arbitrary command words from clients can't grow the registry without bound."""
+        registry = MetricsRegistry()
+        for number in range(MAX_COMMANDS + 10):
+            registry.record_command(f"%made-up-{number}", 0.001, 10, 10)
+        self.assertEqual(len(registry.commands), MAX_COMMANDS + 1)
+        self.assertEqual(registry.commands['other'].count, 10)
+
+    def test_stats_endpoint(self):
+        """Test that the endpoint serves the report as plain text."""
+        server = start_stats_endpoint(0, lambda: "connections 3")
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/") as response:
+            self.assertEqual(response.read(), b"connections 3")
+
+if __name__ == '__main__':
+    unittest.main()
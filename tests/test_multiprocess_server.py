@@ -0,0 +1,80 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import socket_server
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from multiprocess_server import Broker, WorkerLink
+
+class TestMultiprocessServer(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a broker on a Unix socket and one worker link synced from it, both in this process."""
+        self.directory = tempfile.mkdtemp()
+        self.public_board = BulletinBoard()
+        self.private_boards = GroupRegistry(["Group Alpha"])
+        self.broker = Broker(self.public_board, self.private_boards)
+        self.public_board.log = self.broker
+        self.private_boards.attach_log(self.broker)
+        link_path = os.path.join(self.directory, 'broker.sock')
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(link_path)
+        self.listener.listen(1)
+        threading.Thread(target=self.broker.serve, args=(self.listener,), daemon=True).start()
+        self.link = WorkerLink(link_path, 0)
+        self.replica, self.replica_groups = self.link.sync(os.path.join(self.directory, 'worker-0.snapshot'))
+        self.client = object()
+        socket_server.client_sessions[self.client] = {'username': "Alice", 'token': "token-a"}
+
+    def tearDown(self):
+        socket_server.client_sessions.pop(self.client, None)
+        self.link.sock.close()
+        self.listener.close()
+        shutil.rmtree(self.directory)
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out waiting for the worker")
+            time.sleep(0.01)
+
+    def test_replica_starts_from_snapshot(self):
+        """Test that a worker's replica holds the broker's state at sync time."""
+        self.assertIsNotNone(self.replica_groups.get_by_name("Group Alpha"))
+        self.assertEqual(self.replica.get_message_content(2), self.public_board.get_message_content(2))
+
+    def test_changes_stream_to_replica(self):
+        """Test that changes made on the broker are applied to the replica in order."""
+        self.public_board.add_user("Bob")
+        message_id = self.public_board.add_post("Bob", "2024-12-02 16:38:44", "Subject", "Hello")
+        self.wait_for(lambda: self.link.applied_seq == self.broker.seq)
+        self.assertIn("Bob", self.replica.users)
+        self.assertEqual(self.replica.get_message_content(message_id), "Bob on 2024-12-02 16:38:44: Hello")
+
+    def test_forwarded_commands(self):
+        """Test that forwarded commands run on the broker and their changes are on the replica by the reply."""
+        response = self.link.execute(self.client, '%join', [])
+        self.assertTrue(response.startswith(b"Alice joined the public bulletin board."))
+        response = self.link.execute(self.client, '%post', ["Alice", "2024-12-02 16:38:44", "Subject", "Hi"])
+        self.assertEqual(response, "Message ID: 3, Sender: Alice, Post Date: 2024-12-02 16:38:44, Subject: Subject")
+        self.assertEqual(self.replica.get_message_content(3), "Alice on 2024-12-02 16:38:44: Hi")
+        self.assertIn("Alice", self.public_board.users)
+
+    def test_forwarded_errors_are_raised(self):
+        """Test that an exception from a forwarded command is raised on the worker, as in one process."""
+        with self.assertRaises(ValueError):
+            self.link.execute(self.client, '%grouppost', ["Alice", "2024-12-02 16:38:44", "not-a-number", "Subject", "Hi"])
+
+    def test_sessions_reach_every_worker(self):
+        """Test that a session's username is relayed back to the workers."""
+        self.link.publish_session(self.client, "Alice")
+        self.wait_for(lambda: self.link.session_users.get("token-a") == "Alice")
+        self.link.publish_session(self.client, None)
+        self.wait_for(lambda: "token-a" not in self.link.session_users)
+
+if __name__ == '__main__':
+    unittest.main()
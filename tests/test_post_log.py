@@ -0,0 +1,94 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from post_log import PostLog, replay_log
+
+class TestPostLog(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an empty data directory for each test."""
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'posts.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_append_and_commit(self):
+        """Test that appended records get increasing sequence numbers and are written on commit."""
+        log = PostLog(self.path)
+        first = log.append({'type': 'join', 'user': 'Alice'})
+        second = log.append({'type': 'join', 'user': 'Bob'})
+        self.assertEqual((first, second), (1, 2))
+        self.assertTrue(log.wait_committed(second))
+        log.close()
+        with open(self.path, 'rb') as log_file:
+            self.assertEqual(len(log_file.readlines()), 2)
+
+    def test_group_commit(self):
+        """Test that records appended concurrently share commits."""
+        log = PostLog(self.path)
+        def poster():
+            for _ in range(50):
+                log.wait_committed(log.append({'type': 'join', 'user': 'Alice'}))
+        threads = [threading.Thread(target=poster) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log.close()
+        self.assertEqual(log.committed_seq, 400)
+        self.assertLess(log.commits, 400)
+
+    def test_wait_committed_async(self):
+        """Test that asyncio callers are woken by the commit thread."""
+        log = PostLog(self.path, durable=False)
+        async def append_and_wait():
+            return await log.wait_committed_async(log.append({'type': 'join', 'user': 'Alice'}))
+        self.assertTrue(asyncio.run(append_and_wait()))
+        log.close()
+
+    def test_replay_restores_boards(self):
+        """Test that replaying the log rebuilds posts, users and groups with their original IDs."""
+        log = PostLog(self.path)
+        public_board = BulletinBoard(log=log)
+        private_boards = GroupRegistry(log=log)
+        public_board.add_user("Alice")
+        public_board.add_post("Alice", "2024-12-02 16:38:44", "Hello", "First post")
+        group = private_boards.create_group("Group Zeta")
+        group.join_group("Alice", group.group_id)
+        group.post_to_group("Alice", "2024-12-02 16:38:44", "Secret", "Group post")
+        log.close()
+
+        restored_public = BulletinBoard()
+        restored_groups = GroupRegistry()
+        last_seq = replay_log(self.path, restored_public, restored_groups)
+        self.assertEqual(last_seq, log.last_seq)
+        self.assertEqual(restored_public.list_users(), ["Alice"])
+        self.assertEqual(restored_public.get_message_content(3), "Alice on 2024-12-02 16:38:44: First post")
+        restored_group = restored_groups.get(group.group_id)
+        self.assertEqual(restored_group.group_name, "Group Zeta")
+        self.assertEqual(restored_group.members, {"Alice"})
+        self.assertEqual(restored_group.get_group_message(group.group_id, 3), "Alice on 2024-12-02 16:38:44: Group post")
+        # New posts continue numbering after the restored ones
+        self.assertEqual(restored_public.add_post("Bob", "2024-12-02 16:40:00", "Hi", "Next"), 4)
+
+    def test_replay_truncates_torn_record(self):
+        """Test that a record cut off by a crash is dropped and removed from the file."""
+        log = PostLog(self.path)
+        log.append({'type': 'join', 'user': 'Alice'})
+        log.close()
+        with open(self.path, 'ab') as log_file:
+            log_file.write(b'{"type": "join", "user": "Bo')
+        public_board = BulletinBoard()
+        self.assertEqual(replay_log(self.path, public_board, GroupRegistry()), 1)
+        self.assertEqual(public_board.list_users(), ["Alice"])
+        with open(self.path, 'rb') as log_file:
+            self.assertTrue(log_file.read().endswith(b"\n"))
+
+if __name__ == '__main__':
+    unittest.main()
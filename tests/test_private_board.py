@@ -81,5 +81,11 @@ class TestPrivateBoard(unittest.TestCase):
         response = self.board.get_group_message("group1", 999)
         self.assertEqual(response, "Message 999 not found in group group1.")
 
+    def test_get_group_message_uses_index(self):
+        """Test that every posted group message can be looked up by its ID."""
+        ids = [self.board.post_to_group("Alice", "2024-10-01", f"Subject {i}", f"Content {i}") for i in range(100)]
+        self.assertEqual(self.board.get_group_message(1, ids[42]), "Alice on 2024-10-01: Content 42")
+        self.assertEqual(self.board.get_group_message(1, str(ids[0])), "Alice on 2024-10-01: Content 0")
+
 if __name__ == '__main__':
     unittest.main()
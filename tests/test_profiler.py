@@ -0,0 +1,86 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+import profiler
+from metrics import MetricsRegistry
+from profiler import Profiler, StackSampler, span_end, span_start
+
+def wait_here(event):
+    event.wait()
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, profiler, 'spans_enabled', profiler.spans_enabled)
+        self.registry = MetricsRegistry()
+        original = profiler.metrics
+        profiler.metrics = self.registry
+        self.addCleanup(setattr, profiler, 'metrics', original)
+
+    def test_spans_off(self):
+        """Test that a span does nothing while spans are off."""
+        profiler.spans_enabled = False
+        started = span_start()
+        span_end('parse', started)
+        self.assertIsNone(started)
+        self.assertEqual(self.registry.spans, {})
+
+    def test_spans_on(self):
+        """Test that spans are recorded under their names and reported by %stats."""
+        profiler.spans_enabled = True
+        for _ in range(3):
+            span_end('board.add_post', span_start())
+        self.assertEqual(self.registry.spans['board.add_post'].count, 3)
+        self.assertIn("span board.add_post count=3", self.registry.report())
+
+    def test_sampler_sees_other_threads(self):
+        """Test that the sampler records the stacks of other threads under their names."""
+        release = threading.Event()
+        waiter = threading.Thread(target=wait_here, args=(release,), name='waiter')
+        waiter.start()
+        self.addCleanup(waiter.join)
+        self.addCleanup(release.set)
+
+        sampler = StackSampler(0, os.path.join(tempfile.mkdtemp(), 'profile.folded'))
+        sampler.sample()
+        sampler.sample()
+        stack = next(stack for stack in sampler.stacks if stack.startswith('waiter;'))
+        self.assertIn(";wait_here (test_profiler.py:", stack)
+        self.assertEqual(sampler.stacks[stack], 2)
+
+        sampler.write()
+        with open(sampler.path, encoding='utf-8') as profile_file:
+            self.assertIn(f"{stack} 2\n", profile_file.read())
+
+    def test_profile_window(self):
+        """Test that a window turns spans on, refuses a second window and writes its profile when it ends."""
+        window = Profiler()
+        window.profile_dir = tempfile.mkdtemp()
+        profiler.spans_enabled = False
+
+        response = window.start(1)
+        self.assertTrue(response.startswith("Profiling for 1 seconds"))
+        self.assertTrue(profiler.spans_enabled)
+        self.assertTrue(window.start(1).startswith("Error: A profile is already being written"))
+
+        deadline = time.monotonic() + 10
+        while window.sampler is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertIsNone(window.sampler)
+        self.assertFalse(profiler.spans_enabled)
+        profiles = os.listdir(window.profile_dir)
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].endswith('.folded'))
+
+    def test_keep_spans(self):
+        """Test that --spans keeps spans on after a window ends."""
+        window = Profiler()
+        window.keep_spans(True)
+        self.assertTrue(profiler.spans_enabled)
+        window.keep_spans(False)
+        self.assertFalse(profiler.spans_enabled)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import socket
+import time
+import unittest
+import socket_server
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from replication import REPLICATION_PORT_OFFSET, Follower, ReplicationLeader
+from replication import pack_replication_message, read_replication_messages
+
+class TestReplicationMessages(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Test that replies keep bytes responses and forwarded errors across the JSON framing."""
+        left, right = socket.socketpair()
+        message = ('reply', 1, b"Alice joined.", ValueError("bad ID"), {'type': 'post', 'id': 3})
+        left.sendall(pack_replication_message(message))
+        left.close()
+        received = next(read_replication_messages(right))
+        right.close()
+        self.assertEqual(received[:3], ['reply', 1, b"Alice joined."])
+        self.assertIsInstance(received[3], ValueError)
+        self.assertEqual(str(received[3]), "bad ID")
+        self.assertEqual(received[4], {'type': 'post', 'id': 3})
+
+class TestReplication(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a leader on localhost and one follower synced from it, both in this process."""
+        self.public_board = BulletinBoard()
+        self.private_boards = GroupRegistry(["Group Alpha"])
+        self.leader = ReplicationLeader(self.public_board, self.private_boards)
+        self.public_board.log = self.leader
+        self.private_boards.attach_log(self.leader)
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.leader.start(self.listener)
+        # Followers are given the leader's client address; the replication port is REPLICATION_PORT_OFFSET above
+        self.follower = Follower(f"127.0.0.1:{self.listener.getsockname()[1] - REPLICATION_PORT_OFFSET}")
+        self.replica, self.replica_groups = self.follower.sync()
+        self.client = object()
+        socket_server.client_sessions[self.client] = {'username': "Alice"}
+
+    def tearDown(self):
+        socket_server.client_sessions.pop(self.client, None)
+        self.follower.sock.close()
+        self.listener.close()
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out waiting for the follower")
+            time.sleep(0.01)
+
+    def test_replica_starts_from_snapshot(self):
+        """Test that a follower's replica holds the leader's boards at sync time."""
+        self.assertIsNotNone(self.replica_groups.get_by_name("Group Alpha"))
+        self.assertEqual(self.replica.get_message_content(2), self.public_board.get_message_content(2))
+
+    def test_changes_stream_and_lag_is_reported(self):
+        """Test that the leader's changes reach the replica and the follower reports what it applied."""
+        self.public_board.add_user("Bob")
+        message_id = self.public_board.add_post("Bob", "2024-12-02 16:38:44", "Subject", "Hello")
+        self.wait_for(lambda: self.follower.applied_seq == self.leader.seq)
+        self.assertEqual(self.replica.get_message_content(message_id), "Bob on 2024-12-02 16:38:44: Hello")
+        # The follower answers the next heartbeat with the change it applied
+        self.wait_for(lambda: self.leader.links[0].applied_seq == self.leader.seq)
+        self.assertIn("0 change(s) behind", self.leader.status())
+        self.assertIn(f"applied change {self.leader.seq} of {self.leader.seq} (0 behind)", self.follower.status())
+
+    def test_writes_are_forwarded(self):
+        """Test that writes run on the leader and are on the replica by the time the reply arrives."""
+        response = self.follower.execute(self.client, '%join', [])
+        self.assertTrue(response.startswith(b"Alice joined the public bulletin board."))
+        response = self.follower.execute(self.client, '%post', ["Alice", "2024-12-02 16:38:44", "Subject", "Hi"])
+        self.assertEqual(response, "Message ID: 3, Sender: Alice, Post Date: 2024-12-02 16:38:44, Subject: Subject")
+        self.assertEqual(self.replica.get_message_content(3), "Alice on 2024-12-02 16:38:44: Hi")
+        with self.assertRaises(ValueError):
+            self.follower.execute(self.client, '%grouppost', ["Alice", "2024-12-02 16:38:44", "not-a-number", "Subject", "Hi"])
+
+    def test_writes_fail_without_the_leader(self):
+        """Test that a follower that lost its leader still answers reads but refuses writes."""
+        self.follower._disconnected()
+        self.assertEqual(self.follower.execute(self.client, '%join', []), "Error: The leader is unavailable.")
+        self.assertIn("(disconnected)", self.follower.status())
+
+if __name__ == '__main__':
+    unittest.main()
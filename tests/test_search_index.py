@@ -0,0 +1,46 @@
+import unittest
+from bulletin_board import BulletinBoard
+from search_index import SearchIndex, tokenize
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an index with a few posts."""
+        self.index = SearchIndex()
+        self.index.add(1, "Deploy notes", "Build 1 is out")
+        self.index.add(2, "Lunch", "Anyone for lunch?")
+        self.index.add(3, "Deploy rollback", "Build 2 rolled back, urgent")
+        self.index.add(4, "Deploy notes", "Build 3 is out")
+
+    def test_tokenize(self):
+        """Test that words are lowercased, deduplicated and stripped of punctuation."""
+        self.assertEqual(tokenize("Deploy, deploy NOW!"), {"deploy", "now"})
+
+    def test_every_term_must_match(self):
+        """Test that only posts containing every term match, newest first."""
+        self.assertEqual(self.index.search("deploy notes", 0, 10), ([4, 1], 0))
+        self.assertEqual(self.index.search("DEPLOY urgent", 0, 10), ([3], 0))
+        self.assertEqual(self.index.search("deploy missing", 0, 10), ([], 0))
+        self.assertEqual(self.index.search("", 0, 10), ([], 0))
+
+    def test_pagination(self):
+        """Test that pages continue where the previous one stopped."""
+        self.assertEqual(self.index.search("deploy", 0, 2), ([4, 3], 2))
+        self.assertEqual(self.index.search("deploy", 2, 2), ([1], 0))
+
+    def test_out_of_order_ids(self):
+        """Test that posts indexed out of ID order are still returned newest first."""
+        self.index.add(6, "Deploy", "later")
+        self.index.add(5, "Deploy", "earlier")
+        self.assertEqual(self.index.search("deploy", 0, 3), ([6, 5, 4], 3))
+
+    def test_board_search(self):
+        """Test that posts are searchable as soon as they are made."""
+        board = BulletinBoard()
+        message_id = board.add_post("Alice", "2024-12-02 16:38:44", "Deploy", "Build 7 is out")
+        messages, next_offset = board.search_messages("build deploy", 0, 10)
+        self.assertEqual([message['id'] for message in messages], [message_id])
+        self.assertEqual(next_offset, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import asyncio
+import socket
+import time
+import unittest
+from unittest.mock import MagicMock
+from signal_outbox import AsyncSignalOutbox, BoundedOutbox, SignalOutbox, SubscriberIndex, send_frames
+from signal_outbox import COALESCE, DISCONNECT, DROP_OLDEST, MultiplexedSocket
+from socket_protocol import RESPONSE_CHANNEL, SIGNAL_CHANNEL, ChannelFrameDecoder, encode_frame
+
+class TestSignalOutbox(unittest.TestCase):
+
+    def test_writer_thread_sends_in_order(self):
+        """Test that queued frames are written to the socket in order."""
+        server_side, client_side = socket.socketpair()
+        outbox = SignalOutbox(server_side)
+        outbox.put(b"first ")
+        outbox.put(b"second")
+        outbox.close()
+        outbox.writer_thread.join(timeout=2)
+        self.assertEqual(client_side.recv(1024), b"first second")
+        server_side.close()
+        client_side.close()
+
+    def test_put_does_not_block_on_slow_client(self):
+        """Test that put() returns immediately even when the socket is stuck."""
+        slow_socket = MagicMock(spec=['sendall'])
+        slow_socket.sendall.side_effect = lambda data: time.sleep(0.5)
+        outbox = SignalOutbox(slow_socket)
+        for _ in range(1000):
+            outbox.put(b"signal")
+        self.assertGreater(len(outbox), 0)
+        outbox.close()
+
+    def test_send_frames_partial_sends(self):
+        """Test that partial sendmsg() writes resume where they stopped."""
+        sock = MagicMock()
+        written = bytearray()
+        def sendmsg(buffers):
+            # Accept at most 3 bytes per call
+            data = b"".join(bytes(buffer) for buffer in buffers)[:3]
+            written.extend(data)
+            return len(data)
+        sock.sendmsg.side_effect = sendmsg
+        send_frames(sock, [b"abcd", b"ef", b"ghijk"])
+        self.assertEqual(bytes(written), b"abcdefghijk")
+
+    def test_put_after_close(self):
+        """Test that a closed outbox rejects new frames."""
+        outbox = SignalOutbox(MagicMock())
+        outbox.close()
+        self.assertFalse(outbox.put(b"late"))
+
+    def test_multiplexed_socket_tags_channels(self):
+        """Test that responses and signals written to one connection arrive whole and tagged with their channel."""
+        server_side, client_side = socket.socketpair()
+        connection = MultiplexedSocket(server_side)
+        outbox = SignalOutbox(connection)
+        for index in range(50):
+            outbox.put(encode_frame(f"POST_SIGNAL {index}"))
+            connection.sendall(encode_frame(f"Response {index}"))
+        outbox.close()
+        outbox.writer_thread.join(timeout=2)
+        server_side.close()
+        received = []
+        decoder = ChannelFrameDecoder()
+        while data := client_side.recv(65536):
+            received.extend(decoder.feed(data))
+        client_side.close()
+        self.assertEqual([payload for channel, payload in received if channel == RESPONSE_CHANNEL],
+                         [f"Response {index}".encode() for index in range(50)])
+        self.assertEqual([payload for channel, payload in received if channel == SIGNAL_CHANNEL],
+                         [f"POST_SIGNAL {index}".encode() for index in range(50)])
+
+class TestBoundedOutbox(unittest.TestCase):
+
+    def queued(self, outbox):
+        return [payload for _, payload in outbox.queue]
+
+    def test_drop_oldest(self):
+        """Test that a full outbox discards its oldest signals."""
+        outbox = BoundedOutbox(max_queued=3, overflow_policy=DROP_OLDEST)
+        for index in range(5):
+            self.assertTrue(outbox._enqueue(f"signal {index}".encode(), None))
+        self.assertEqual(self.queued(outbox), [b"signal 2", b"signal 3", b"signal 4"])
+        self.assertEqual(outbox.dropped, 2)
+
+    def test_coalesce(self):
+        """Test that signals with the same key replace the queued one, keeping its position."""
+        outbox = BoundedOutbox(max_queued=3, overflow_policy=COALESCE)
+        outbox._enqueue(b"JOIN_SIGNAL Alice", ('presence', 'Alice'))
+        outbox._enqueue(b"POST_SIGNAL 1", None)
+        outbox._enqueue(b"LEAVE_SIGNAL Alice", ('presence', 'Alice'))
+        self.assertEqual(self.queued(outbox), [b"LEAVE_SIGNAL Alice", b"POST_SIGNAL 1"])
+        self.assertEqual(outbox.coalesced, 1)
+
+    def test_coalesce_falls_back_to_drop_oldest(self):
+        """Test that a full outbox drops the oldest signal when nothing can be merged."""
+        outbox = BoundedOutbox(max_queued=2, overflow_policy=COALESCE)
+        outbox._enqueue(b"JOIN_SIGNAL Alice", ('presence', 'Alice'))
+        outbox._enqueue(b"POST_SIGNAL 1", None)
+        outbox._enqueue(b"POST_SIGNAL 2", None)
+        self.assertEqual(self.queued(outbox), [b"POST_SIGNAL 1", b"POST_SIGNAL 2"])
+        self.assertEqual(outbox.queued_by_key, {})
+        self.assertEqual(outbox.dropped, 1)
+
+    def test_disconnect(self):
+        """Test that the disconnect policy drops the client when its outbox is full."""
+        sock = MagicMock(spec=['sendall', 'shutdown'])
+        outbox = SignalOutbox(sock, max_queued=0, overflow_policy=DISCONNECT)
+        self.assertFalse(outbox.put(b"signal"))
+        self.assertTrue(outbox.closed)
+        sock.shutdown.assert_called_once()
+
+    def test_unknown_policy(self):
+        """Test that an unknown overflow policy is rejected."""
+        with self.assertRaises(ValueError):
+            BoundedOutbox(overflow_policy="ignore")
+
+class TestAsyncSignalOutbox(unittest.IsolatedAsyncioTestCase):
+
+    async def test_writer_task_drains_queue(self):
+        """Test that the writer task writes queued frames and drains the stream."""
+        writer = MagicMock()
+        writer.drain = MagicMock(side_effect=lambda: asyncio.sleep(0))
+        outbox = AsyncSignalOutbox(writer)
+        outbox.put(b"one")
+        outbox.put(b"two")
+        outbox.close()
+        await outbox.writer_task
+        written = [frame for call in writer.writelines.call_args_list for frame in call.args[0]]
+        self.assertEqual(written, [b"one", b"two"])
+
+    async def test_writer_task_tags_channel(self):
+        """Test that an outbox on a multiplexed connection tags every signal with its channel."""
+        writer = MagicMock()
+        writer.drain = MagicMock(side_effect=lambda: asyncio.sleep(0))
+        outbox = AsyncSignalOutbox(writer, channel=SIGNAL_CHANNEL)
+        outbox.put(b"one")
+        outbox.close()
+        await outbox.writer_task
+        self.assertEqual(writer.writelines.call_args.args[0], [SIGNAL_CHANNEL, b"one"])
+
+class TestSubscriberIndex(unittest.TestCase):
+
+    def test_outboxes_for_members_only(self):
+        """Test that only outboxes of the given users are returned."""
+        index = SubscriberIndex()
+        alice, bob, carol = object(), object(), object()
+        index.subscribe("Alice", alice)
+        index.subscribe("Bob", bob)
+        index.subscribe("Carol", carol)
+        self.assertCountEqual(index.outboxes_for({"Alice", "Carol", "Dave"}), [alice, carol])
+
+    def test_unsubscribe(self):
+        """Test that unsubscribed outboxes no longer receive signals."""
+        index = SubscriberIndex()
+        outbox = object()
+        index.subscribe("Alice", outbox)
+        index.unsubscribe("Alice", outbox)
+        self.assertEqual(index.outboxes_for({"Alice"}), [])
+        self.assertEqual(index.outboxes_by_user, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+from post_log import PostLog, replay_log
+from snapshot import Snapshotter, load_snapshot, read_snapshot_seq, write_snapshot
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        """Set up boards with a user, posts and a group, logged to an empty data directory."""
+        self.data_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.data_dir, 'posts.log')
+        self.snapshot_path = os.path.join(self.data_dir, 'boards.snapshot')
+        self.log = PostLog(self.log_path, durable=False)
+        self.public_board = BulletinBoard(log=self.log)
+        self.private_boards = GroupRegistry(log=self.log)
+        self.public_board.add_user("Alice")
+        self.public_board.add_post("Alice", "2024-12-02 16:38:44", "Grüße", "First post ✓")
+        self.group = self.private_boards.create_group("Group Zeta")
+        self.group.join_group("Alice", self.group.group_id)
+        self.group.post_to_group("Alice", "2024-12-02 16:38:44", "Secret", "Group post")
+
+    def tearDown(self):
+        self.log.close()
+        shutil.rmtree(self.data_dir)
+
+    def test_round_trip(self):
+        """Test that loading a snapshot restores users, posts, groups and members."""
+        write_snapshot(self.snapshot_path, self.public_board, self.private_boards, 5)
+        public_board = BulletinBoard()
+        private_boards = GroupRegistry()
+        self.assertEqual(load_snapshot(self.snapshot_path, public_board, private_boards), 5)
+        self.assertEqual(read_snapshot_seq(self.snapshot_path), 5)
+        self.assertEqual(public_board.list_users(), ["Alice"])
+        self.assertEqual(public_board.get_message_content(3), "Alice on 2024-12-02 16:38:44: First post ✓")
+        group = private_boards.get(self.group.group_id)
+        self.assertEqual(group.group_name, "Group Zeta")
+        self.assertEqual(group.members, {"Alice"})
+        self.assertEqual(group.get_group_message(group.group_id, 3), "Alice on 2024-12-02 16:38:44: Group post")
+
+    def test_snapshot_truncates_log(self):
+        """Test that a snapshot drops the log records it covers and only the tail is replayed."""
+        snapshotter = Snapshotter(self.data_dir, self.public_board, self.private_boards, self.log)
+        seq = snapshotter.take_snapshot()
+        self.public_board.add_post("Alice", "2024-12-02 16:40:00", "Later", "After the snapshot")
+        self.log.wait_committed(self.log.last_seq)
+        with open(self.log_path, 'rb') as log_file:
+            self.assertEqual(len(log_file.readlines()), 1)
+
+        public_board = BulletinBoard()
+        private_boards = GroupRegistry()
+        snapshot_seq = load_snapshot(self.snapshot_path, public_board, private_boards)
+        self.assertEqual(snapshot_seq, seq)
+        self.assertEqual(replay_log(self.log_path, public_board, private_boards, after_seq=snapshot_seq), seq + 1)
+        self.assertEqual(public_board.get_message_content(4), "Alice on 2024-12-02 16:40:00: After the snapshot")
+        self.assertEqual(private_boards.get(self.group.group_id).members, {"Alice"})
+
+    def test_snapshotter_survives_errors(self):
+        """Test that an unexpected error in one snapshot doesn't stop the snapshot thread."""
+        snapshotter = Snapshotter(self.data_dir, self.public_board, self.private_boards, self.log, interval=0.01,
+                                  min_changes=1)
+        attempts = []
+        retried = threading.Event()
+        def take_snapshot():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise AttributeError("'NoneType' object has no attribute 'encode'")
+            retried.set()
+        snapshotter.take_snapshot = take_snapshot
+        snapshotter.start()
+        self.addCleanup(snapshotter.stop)
+        self.assertTrue(retried.wait(5))
+
+    def test_not_a_snapshot(self):
+        """Test that a file in another format is rejected."""
+        with open(self.snapshot_path, 'wb') as snapshot_file:
+            snapshot_file.write(b"not a snapshot at all")
+        with self.assertRaises(ValueError):
+            load_snapshot(self.snapshot_path, BulletinBoard(), GroupRegistry())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
+import asyncio
 import unittest
 from unittest.mock import patch, MagicMock
 import socket_client
+from socket_protocol import RESPONSE_CHANNEL, SIGNAL_CHANNEL, FrameDecoder, encode_channel_frame
 
 class TestSocketClient(unittest.TestCase):
 
@@ -75,5 +77,67 @@ class TestSocketClient(unittest.TestCase):
         self.assertIsNotNone(client_socket)  # Invalid command shouldn't close the socket
 
 
+class TestServerConnection(unittest.IsolatedAsyncioTestCase):
+
+    async def start_server(self, handle):
+        """Starts a stand-in multiplexed server that passes each received command to handle(command, writer)."""
+        async def serve(reader, writer):
+            decoder = FrameDecoder()
+            while data := await reader.read(1024):
+                for frame in decoder.feed(data):
+                    handle(frame.decode('utf-8').strip(), writer)
+            writer.close()
+        server = await asyncio.start_server(serve, '127.0.0.1', 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        return server.sockets[0].getsockname()[1]
+
+    async def test_pipelined_commands_get_their_own_responses(self):
+        """Test that commands sent back to back are answered in order while signals are dispatched in between."""
+        def handle(command, writer):
+            writer.write(encode_channel_frame(SIGNAL_CHANNEL, f"POST_SIGNAL before {command}"))
+            writer.write(encode_channel_frame(RESPONSE_CHANNEL, f"answer to {command}"))
+        port = await self.start_server(handle)
+        connection = await socket_client.connect_to_server('127.0.0.1', port, multiplexed=True)
+        self.addCleanup(connection.close)
+        with patch('socket_client.show_signal') as show_signal:
+            for command in ('%users', '%groups', '%message 1'):
+                socket_client.send_command(connection, command)
+            responses = [await socket_client.receive_response(connection) for _ in range(3)]
+        self.assertEqual(responses, ["answer to %users", "answer to %groups", "answer to %message 1"])
+        self.assertEqual(show_signal.call_count, 3)
+        show_signal.assert_any_call("POST_SIGNAL before %groups")
+
+    async def test_cached_post_keeps_response_order(self):
+        """Test that a post read again comes from the cache, after the responses to commands sent before it."""
+        received = []
+        def handle(command, writer):
+            received.append(command)
+            writer.write(encode_channel_frame(RESPONSE_CHANNEL, f"answer to {command}"))
+        port = await self.start_server(handle)
+        connection = await socket_client.connect_to_server('127.0.0.1', port, multiplexed=True)
+        self.addCleanup(connection.close)
+        first = await socket_client.request_post(connection, (None, '1'), '%message', '1')
+        order = []
+        async def record(request):
+            order.append(await request)
+        await asyncio.gather(record(socket_client.request_listing(connection, 'users', '%users')),
+                             record(socket_client.request_post(connection, (None, '1'), '%message', '1')))
+        self.assertEqual(first, "answer to %message 1")
+        self.assertEqual(order, ["answer to %users @", "answer to %message 1"])
+        self.assertEqual(received, ["%message 1", "%users @"])
+
+    async def test_closed_connection_answers_none(self):
+        """Test that commands waiting when the server closes the connection get None instead of hanging."""
+        def handle(command, writer):
+            writer.close()
+        port = await self.start_server(handle)
+        connection = await socket_client.connect_to_server('127.0.0.1', port, multiplexed=True)
+        self.addCleanup(connection.close)
+        socket_client.send_command(connection, '%users')
+        self.assertIsNone(await asyncio.wait_for(socket_client.receive_response(connection), 5))
+        socket_client.send_command(connection, '%groups')
+        self.assertIsNone(await socket_client.receive_response(connection))
+
 if __name__ == '__main__':
     unittest.main()
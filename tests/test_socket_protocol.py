@@ -1,5 +1,13 @@
 import unittest
 from socket_protocol import format_bulletin_message, format_client_command, parse_client_command, parse_bulletin_message
+from socket_protocol import FrameDecoder, encode_frame, encode_response, MAX_FRAME_SIZE
+from socket_protocol import MAX_PAGE_BYTES, format_message_page, format_search_page, parse_message_page
+from socket_protocol import format_listing, format_not_modified, parse_listing
+from socket_protocol import RESPONSE_CHANNEL, SIGNAL_CHANNEL, ChannelFrameDecoder, encode_channel_frame, tag_frames
+
+def make_message(message_id, content="Hello"):
+    return {'id': message_id, 'sender': "Alice", 'date': "2024-12-02 16:38:44", 'subject': f"Subject {message_id}",
+            'content': content}
 
 class TestSocketProtocol(unittest.TestCase):
 
@@ -36,6 +44,58 @@ class TestSocketProtocol(unittest.TestCase):
         self.assertEqual(command, "%connect")
         self.assertEqual(params, [])
 
+    def test_parse_listing_version(self):
+        """Test that %users and %groupusers keep a trailing @<version> and drop anything else."""
+        self.assertEqual(parse_client_command("%users @a1.4"), ("%users", ["@a1.4"]))
+        self.assertEqual(parse_client_command("%groups extra"), ("%groups", []))
+        self.assertEqual(parse_client_command("%groupusers 3 @"), ("%groupusers", ["3", "@"]))
+        self.assertEqual(parse_client_command("%groupusers 3 extra"), ("%groupusers", ["3"]))
+
+    def test_listing_round_trip(self):
+        """Test that versioned listings and NOT_MODIFIED replies parse back, and other responses don't."""
+        self.assertEqual(parse_listing(format_listing("a1.4", "Alice\nBob")), ("a1.4", "Alice\nBob"))
+        self.assertEqual(parse_listing(format_listing("a1.5", "")), ("a1.5", ""))
+        self.assertEqual(parse_listing(format_not_modified("a1.4")), ("a1.4", None))
+        self.assertIsNone(parse_listing("Alice\nBob"))
+        self.assertIsNone(parse_listing("Error: Group '9' does not exist."))
+
+    def test_message_page_round_trip(self):
+        """Test that a page of messages parses back into its lines and the ID the next page starts at."""
+        messages = [make_message(message_id) for message_id in (3, 4, 6)]
+        lines, next_id = parse_message_page(format_message_page(messages, 7))
+        self.assertEqual(lines, ["3 Alice on 2024-12-02 16:38:44: Subject 3 | Hello",
+                                 "4 Alice on 2024-12-02 16:38:44: Subject 4 | Hello",
+                                 "6 Alice on 2024-12-02 16:38:44: Subject 6 | Hello"])
+        self.assertEqual(next_id, 7)
+        self.assertEqual(parse_message_page(format_message_page([], 0)), ([], 0))
+
+    def test_message_page_size_limit(self):
+        """Test that a page stops before MAX_PAGE_BYTES (in UTF-8 bytes) and continues at the first message left out."""
+        content = "é" * (MAX_PAGE_BYTES // 6)  # Two bytes per character: a third of a page each, so only two fit
+        messages = [make_message(message_id, content) for message_id in range(1, 6)]
+        page = format_message_page(messages, 0)
+        lines, next_id = parse_message_page(page)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(next_id, 3)
+        self.assertLessEqual(len(page.encode('utf-8')) - len(page.partition("\n")[0]), MAX_PAGE_BYTES)
+        # A single message larger than a page is still sent, so paging always moves on
+        lines, next_id = parse_message_page(format_message_page([make_message(1, "x" * MAX_PAGE_BYTES)], 0))
+        self.assertEqual((len(lines), next_id), (1, 0))
+
+    def test_search_page_size_limit(self):
+        """Test that a page of search results stops before MAX_PAGE_BYTES and continues at the first result left out."""
+        messages = [make_message(message_id) for message_id in range(5, 0, -1)]
+        for message in messages:
+            message['subject'] = "é" * (MAX_PAGE_BYTES // 6)
+        lines, next_offset = parse_message_page(format_search_page(messages, 20, 0))
+        self.assertEqual([line.split()[0] for line in lines], ["5", "4"])
+        self.assertEqual(next_offset, 22)
+
+    def test_parse_message_page_rejects_other_responses(self):
+        """Test that responses that aren't pages parse as None."""
+        for response in ("Error: Group '9' does not exist.", "PAGE x 1\nline", "PAGE 1", "PAGE 1 2 3", ""):
+            self.assertIsNone(parse_message_page(response), response)
+
     def test_parse_bulletin_message(self):
         """Test parsing a bulletin message."""
         message = "1 Alice 2024-10-01 Hello World"
@@ -72,5 +132,69 @@ class TestSocketProtocol(unittest.TestCase):
         parsed_message = parse_bulletin_message(message)
         self.assertIsNone(parsed_message)
 
+    def test_encode_frame(self):
+        """Test that a frame is the payload length followed by the UTF-8 payload."""
+        self.assertEqual(encode_frame("%users"), b"\x00\x00\x00\x06%users")
+
+    def test_decoder_partial_buffers(self):
+        """Test that a frame split across several reads is returned once complete."""
+        decoder = FrameDecoder()
+        frame = encode_frame("%post Alice 2024-10-01 12:00 Subject|Content")
+        self.assertEqual(decoder.feed(frame[:3]), [])
+        self.assertEqual(decoder.feed(frame[3:10]), [])
+        self.assertEqual(decoder.feed(frame[10:]), [b"%post Alice 2024-10-01 12:00 Subject|Content"])
+
+    def test_decoder_pipelined_frames(self):
+        """Test that frames arriving in one read are returned separately and in order."""
+        decoder = FrameDecoder()
+        data = encode_frame("%users") + encode_frame("%groups") + encode_frame("%exit")[:2]
+        self.assertEqual(decoder.feed(data), [b"%users", b"%groups"])
+        self.assertEqual(decoder.feed(encode_frame("%exit")[2:]), [b"%exit"])
+
+    def test_large_frame(self):
+        """Test that payloads well over 1 KB survive the round trip."""
+        content = "x" * 100000
+        self.assertEqual(FrameDecoder().feed(encode_frame(content)), [content.encode("utf-8")])
+
+    def test_oversized_frame_rejected(self):
+        """Test that frames over the size limit are rejected."""
+        with self.assertRaises(ValueError):
+            encode_frame(b"x" * (MAX_FRAME_SIZE + 1))
+        with self.assertRaises(ValueError):
+            FrameDecoder().feed((MAX_FRAME_SIZE + 1).to_bytes(4, "big"))
+
+    def test_oversized_response_truncated(self):
+        """Test that a response over the frame limit is cut after its last whole line and says so."""
+        listing = "\n".join(f"user{number:07d}" for number in range(MAX_FRAME_SIZE // 10))
+        (payload,) = FrameDecoder().feed(encode_response(listing))
+        lines = payload.decode('utf-8').split("\n")
+        self.assertTrue(lines[-1].startswith("[Truncated: the response was"))
+        self.assertEqual(lines[-2], f"user{len(lines) - 2:07d}")
+        self.assertEqual(encode_response("No users in the group."), encode_frame("No users in the group."))
+
+    def test_oversized_line_truncated_on_character(self):
+        """Test that a single line over the frame limit is never cut inside a UTF-8 character."""
+        (payload,) = FrameDecoder().feed(encode_response("é" * MAX_FRAME_SIZE))
+        self.assertIn("[Truncated:", payload.decode('utf-8'))
+
+    def test_channel_decoder_splits_channels(self):
+        """Test that tagged frames come out with their channel, including one split across reads."""
+        decoder = ChannelFrameDecoder()
+        data = encode_channel_frame(SIGNAL_CHANNEL, "JOIN_SIGNAL Bob") + encode_channel_frame(RESPONSE_CHANNEL, "Bob joined.")
+        self.assertEqual(decoder.feed(data[:20]), [(SIGNAL_CHANNEL, b"JOIN_SIGNAL Bob")])
+        self.assertEqual(decoder.feed(data[20:]), [(RESPONSE_CHANNEL, b"Bob joined.")])
+
+    def test_tag_frames_shares_frames(self):
+        """Test that tagging puts the channel in a buffer of its own and leaves the frame as it is."""
+        frame = encode_frame("POST_SIGNAL hello")
+        buffers = tag_frames(SIGNAL_CHANNEL, [frame, frame])
+        self.assertEqual(buffers, [SIGNAL_CHANNEL, frame, SIGNAL_CHANNEL, frame])
+        self.assertIs(buffers[1], frame)
+
+    def test_channel_decoder_rejects_plain_frames(self):
+        """Test that untagged frames (a server not running with --multiplex) are rejected."""
+        with self.assertRaises(ValueError):
+            ChannelFrameDecoder().feed(encode_frame("Session 1234."))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
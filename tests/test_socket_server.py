@@ -1,6 +1,16 @@
+import socket
+import threading
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 import socket_server
+from socket_protocol import MAX_FRAME_SIZE, MAX_PAGE_SIZE, encode_frame, parse_listing, parse_message_page
+from socket_protocol import RESPONSE_CHANNEL, SIGNAL_CHANNEL, ChannelFrameDecoder, read_frames
+from bulletin_board import BulletinBoard
+from group_registry import GroupRegistry
+
+def parse_frame(data):
+    return data[4:].decode('utf-8')
 
 class TestSocketServer(unittest.TestCase):
 
@@ -10,8 +20,8 @@ class TestSocketServer(unittest.TestCase):
         mock_client_socket = MagicMock()
         private_boards = MagicMock()  # Mock for private_boards
         mock_client_socket.recv.side_effect = [
-            b'%join username',  # Simulate the join command from the client
-            b'%exit'           # Simulate the exit command
+            encode_frame('%join username'),  # Simulate the join command from the client
+            encode_frame('%exit')           # Simulate the exit command
         ]
 
         # Set up the mock to respond as expected
@@ -24,8 +34,8 @@ class TestSocketServer(unittest.TestCase):
         mock_bulletin_board.add_user.assert_called_once_with('username')
 
         # Check that the correct message was sent to the client
-        mock_client_socket.send.assert_any_call(b'username has joined the bulletin board.\r\n')
-        mock_client_socket.send.assert_called_with(b'Goodbye!\r\n')  # Ensure the exit message is also checked
+        mock_client_socket.sendall.assert_any_call(encode_frame('username has joined the bulletin board.'))
+        mock_client_socket.sendall.assert_called_with(encode_frame('Goodbye!'))  # Ensure the exit message is also checked
 
     @patch('socket_server.BulletinBoard')
     def test_post_message(self, MockBulletinBoard):
@@ -33,9 +43,9 @@ class TestSocketServer(unittest.TestCase):
         mock_client_socket = MagicMock()
         private_boards = MagicMock()  # Mock for private_boards
         mock_client_socket.recv.side_effect = [
-            b'%join username',  # First command to join
-            b'%post Alice 2024-10-28 12:00 Subject | Content',  # Post command after user joins
-            b'%exit'  # Exit command to end the client session
+            encode_frame('%join username'),  # First command to join
+            encode_frame('%post Alice 2024-10-28 12:00 Subject | Content'),  # Post command after user joins
+            encode_frame('%exit')  # Exit command to end the client session
         ]
 
         # Set up the mock to return a message ID when add_post is called
@@ -49,32 +59,200 @@ class TestSocketServer(unittest.TestCase):
         mock_bulletin_board.add_post.assert_called_once_with('Alice', '2024-10-28 12:00', 'Subject', 'Content')
 
         # Assert that the send call with the expected message was made
-        mock_client_socket.send.assert_any_call(b'Message posted with ID 1.\r\n')  # Allow for other calls, too
-        mock_client_socket.send.assert_called_with(b'Goodbye!\r\n')  # Verify the exit message
+        mock_client_socket.sendall.assert_any_call(encode_frame('Message posted with ID 1.'))  # Allow for other calls, too
+        mock_client_socket.sendall.assert_called_with(encode_frame('Goodbye!'))  # Verify the exit message
 
     def test_exit_command(self):
         mock_client_socket = MagicMock()
         mock_bulletin_board = MagicMock()
         private_boards = MagicMock()  # Mock for private_boards
-        mock_client_socket.recv.return_value = b'%exit'
+        mock_client_socket.recv.return_value = encode_frame('%exit')
 
         socket_server.handle_client(mock_client_socket, mock_bulletin_board, private_boards)
 
-        mock_client_socket.send.assert_called_with(b'Goodbye!\r\n')
+        mock_client_socket.sendall.assert_called_with(encode_frame('Goodbye!'))
+
+    def enable_admin(self, token):
+        patcher = patch.dict(socket_server.admin_settings, {'token': token})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stats_refused_to_normal_client(self):
+        """Test that %stats is refused without %admin, with a wrong token, and on a server without a token."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': 'alice'}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        board, groups = BulletinBoard(), GroupRegistry()
+
+        response = socket_server.execute_command(client_socket, '%admin', ['s3cret'], board, groups)
+        self.assertTrue(response.startswith("Error: This server has no admin token"))
+        self.enable_admin('s3cret')
+        response = socket_server.execute_command(client_socket, '%stats', [], board, groups)
+        self.assertTrue(response.startswith("Error: %stats is an admin command"))
+        response = socket_server.execute_command(client_socket, '%admin', ['guess'], board, groups)
+        self.assertEqual(response, "Error: Wrong admin token.")
+        response = socket_server.execute_command(client_socket, '%stats', [], board, groups)
+        self.assertTrue(response.startswith("Error: %stats is an admin command"))
+
+    def test_commands_are_measured(self):
+        """Test that answered commands are counted with their traffic and reported by %stats."""
+        before = socket_server.metrics.commands.get('%users')
+        before = before.count if before else 0
+        self.enable_admin('s3cret')
+        mock_client_socket = MagicMock()
+        mock_client_socket.recv.side_effect = [encode_frame('%users'), encode_frame('%admin s3cret'),
+                                               encode_frame('%stats'), encode_frame('%exit')]
+
+        socket_server.handle_client(mock_client_socket, BulletinBoard(), GroupRegistry())
+
+        self.assertEqual(socket_server.metrics.commands['%users'].count, before + 1)
+        self.assertEqual(parse_frame(mock_client_socket.sendall.call_args_list[1].args[0]), "Admin commands enabled.")
+        report = parse_frame(mock_client_socket.sendall.call_args_list[2].args[0])
+        self.assertIn("command %users count=", report)
+        self.assertTrue(report.startswith("uptime_seconds "))
+
+    def test_profile_window_is_bounded(self):
+        """Test that %profile only accepts a window of 1 to MAX_PROFILE_SECONDS seconds."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': None, 'admin': True}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        for params in ([], ['0'], ['soon'], [str(socket_server.MAX_PROFILE_SECONDS + 1)]):
+            response = socket_server.execute_command(client_socket, '%profile', params, BulletinBoard(), GroupRegistry())
+            self.assertTrue(response.startswith("Error: %profile requires"), params)
+
+    def test_profile_refused_to_normal_client(self):
+        """Test that %profile without %admin is refused and starts no profile."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': 'alice'}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        self.enable_admin('s3cret')
+        with patch.object(socket_server.profiler, 'start') as start:
+            response = socket_server.execute_command(client_socket, '%profile', ['5'], BulletinBoard(), GroupRegistry())
+        self.assertTrue(response.startswith("Error: %profile is an admin command"))
+        start.assert_not_called()
+
+    def search_session(self):
+        """Returns a session for Alice, a board with five posts and a group holding two, which Alice joined."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': 'Alice'}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        board, groups = BulletinBoard(), GroupRegistry(["Group Zeta"])
+        for number in range(5):
+            board.add_post("Alice", "2024-12-02 16:38:44", f"Deploy {number}", "deploy notes")
+        group = groups.get_by_name("Group Zeta")
+        group.post_to_group("Bob", "2024-12-02 16:38:44", "Deploy plan", "deploy tonight")
+        group.post_to_group("Bob", "2024-12-02 16:38:44", "Lunch", "deploy later")
+        group.join_group("Alice", group.group_id)
+        return client_socket, board, groups, group
+
+    def test_search_pages(self):
+        """Test that %search answers a page of matches, newest first, continuing at the offset it names."""
+        client_socket, board, groups, _ = self.search_session()
+        response = socket_server.execute_command(client_socket, '%search', ['0', '2', 'deploy'], board, groups)
+        self.assertEqual(parse_message_page(response), (["7 Alice on 2024-12-02 16:38:44: Deploy 4",
+                                                         "6 Alice on 2024-12-02 16:38:44: Deploy 3"], 2))
+        response = socket_server.execute_command(client_socket, '%search', ['4', '2', 'DEPLOY notes'], board, groups)
+        self.assertEqual(parse_message_page(response), (["3 Alice on 2024-12-02 16:38:44: Deploy 0"], 0))
+        response = socket_server.execute_command(client_socket, '%search', ['0', '2', 'missing'], board, groups)
+        self.assertEqual(parse_message_page(response), ([], 0))
+
+    def test_search_page_size_is_capped(self):
+        """Test that a search asks the board for at most MAX_PAGE_SIZE matches, whatever count the client sends."""
+        client_socket, board, groups, group = self.search_session()
+        with patch.object(board, 'search_messages', return_value=([], 0)) as search:
+            socket_server.execute_command(client_socket, '%search', ['0', '100000', 'deploy'], board, groups)
+        search.assert_called_once_with('deploy', 0, MAX_PAGE_SIZE)
+        with patch.object(group, 'search_group_messages', return_value=([], 0)) as search:
+            socket_server.execute_command(client_socket, '%groupsearch', [str(group.group_id), '5', '100000', 'deploy'],
+                                          board, groups)
+        search.assert_called_once_with('deploy', 5, MAX_PAGE_SIZE)
+
+    def test_search_params(self):
+        """Test that missing or non-numeric offsets and counts are refused."""
+        client_socket, board, groups, group = self.search_session()
+        for params in ([], ['0', '2'], ['x', '2', 'deploy'], ['0', '-2', 'deploy']):
+            response = socket_server.execute_command(client_socket, '%search', params, board, groups)
+            self.assertEqual(response, "Error: %search requires an offset, a count and search terms.", params)
+        for params in ([], [str(group.group_id), '0', '2'], ['zeta', '0', '2', 'deploy'], [str(group.group_id), 'x', '2', 'deploy']):
+            response = socket_server.execute_command(client_socket, '%groupsearch', params, board, groups)
+            self.assertEqual(response, "Error: %groupsearch requires a group ID, an offset, a count and search terms.",
+                             params)
+
+    def test_groupsearch(self):
+        """Test that %groupsearch pages a member's group, and refuses unknown groups and non-members."""
+        client_socket, board, groups, group = self.search_session()
+        group_id = str(group.group_id)
+        response = socket_server.execute_command(client_socket, '%groupsearch', [group_id, '0', '1', 'deploy'], board, groups)
+        self.assertEqual(parse_message_page(response), (["4 Bob on 2024-12-02 16:38:44: Lunch"], 1))
+        response = socket_server.execute_command(client_socket, '%groupsearch', [group_id, '1', '5', 'deploy'], board, groups)
+        self.assertEqual(parse_message_page(response), (["3 Bob on 2024-12-02 16:38:44: Deploy plan"], 0))
+
+        response = socket_server.execute_command(client_socket, '%groupsearch', ['999', '0', '5', 'deploy'], board, groups)
+        self.assertEqual(response, "Error: Group '999' does not exist.")
+        group.remove_member("Alice")
+        response = socket_server.execute_command(client_socket, '%groupsearch', [group_id, '0', '5', 'deploy'], board, groups)
+        self.assertEqual(response, f"Error: Alice is not a member of group '{group_id}'.")
+
+    def test_groupcreate_existing_name(self):
+        """Test that creating a group whose name is taken returns an error rather than raising."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': 'alice'}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        groups = GroupRegistry(["Group Zeta"])
+        response = socket_server.execute_command(client_socket, '%groupcreate', ["Group Zeta"], BulletinBoard(), groups)
+        self.assertEqual(response, "Error: Group 'Group Zeta' already exists.")
+        self.assertEqual(len(groups), 1)
+
+    def test_groupremove_non_numeric_id(self):
+        """Test that %groupremove with a non-numeric ID returns an error rather than raising."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': 'alice'}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        groups = GroupRegistry(["Group Zeta"])
+        for params in (["zeta"], ["-1"], []):
+            response = socket_server.execute_command(client_socket, '%groupremove', params, BulletinBoard(), groups)
+            self.assertEqual(response, "Error: %groupremove requires a numeric group ID.", params)
+        self.assertEqual(len(groups), 1)
+
+    def test_oversized_response_keeps_connection(self):
+        """Test that a listing too large for one frame is sent truncated instead of ending the connection."""
+        board = BulletinBoard()
+        for number in range(MAX_FRAME_SIZE // 10):
+            board.users[f"user{number:07d}"] = {'groups': set()}
+        mock_client_socket = MagicMock()
+        mock_client_socket.recv.side_effect = [encode_frame('%users'), encode_frame('%exit')]
+
+        socket_server.handle_client(mock_client_socket, board, GroupRegistry())
+
+        self.assertIn("[Truncated:", parse_frame(mock_client_socket.sendall.call_args_list[0].args[0]))
+        mock_client_socket.sendall.assert_called_with(encode_frame('Goodbye!'))
+
+    def test_join_requires_username(self):
+        """Test that %join and %groupjoin before %connect are refused and leave the boards unchanged."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': None}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        board, groups = BulletinBoard(), GroupRegistry()
+        group = groups.create_group("Group Zeta")
+        for command, params in (('%join', []), ('%groupjoin', [str(group.group_id)])):
+            response = socket_server.execute_command(client_socket, command, params, board, groups)
+            self.assertTrue(response.startswith("Error: You must connect"), command)
+        self.assertEqual(board.list_users(), [])
+        self.assertEqual(group.members, set())
 
     def test_unknown_command(self):
         mock_client_socket = MagicMock()
         mock_bulletin_board = MagicMock()
         private_boards = MagicMock()  # Mock for private_boards
         mock_client_socket.recv.side_effect = [
-            b'%unknown',
-            b'%exit'
+            encode_frame('%unknown'),
+            encode_frame('%exit')
         ]
 
         socket_server.handle_client(mock_client_socket, mock_bulletin_board, private_boards)
 
-        mock_client_socket.send.assert_any_call(b'Unknown command.\r\n')
-        mock_client_socket.send.assert_called_with(b'Goodbye!\r\n')
+        mock_client_socket.sendall.assert_any_call(encode_frame('Unknown command.'))
+        mock_client_socket.sendall.assert_called_with(encode_frame('Goodbye!'))
 
     @patch('socket_server.PrivateBoard')
     @patch('socket_server.client_sessions')
@@ -88,9 +266,9 @@ class TestSocketServer(unittest.TestCase):
         
         # Set up the mock client commands
         mock_client_socket.recv.side_effect = [
-            b'%join username',  # Simulate joining the public board with a username
-            b'%groupjoin 1',    # Simulate a private group join command (group_id = 1)
-            b'%exit'            # Simulate exit after the commands
+            encode_frame('%join username'),  # Simulate joining the public board with a username
+            encode_frame('%groupjoin 1'),    # Simulate a private group join command (group_id = 1)
+            encode_frame('%exit')            # Simulate exit after the commands
         ]
         
         # Set the username for the mock client in client_sessions
@@ -106,10 +284,158 @@ class TestSocketServer(unittest.TestCase):
         mock_private_board.join_group.assert_called_once_with('username', 1)  # Group ID is 1
         
         # Check if the correct response is sent to the client
-        mock_client_socket.send.assert_any_call(b'username joined group 1.\r\n')
+        mock_client_socket.sendall.assert_any_call(encode_frame('username joined group 1.'))
         
         # Ensure the exit message is also sent
-        mock_client_socket.send.assert_called_with(b'Goodbye!\r\n')
+        mock_client_socket.sendall.assert_called_with(encode_frame('Goodbye!'))
+
+    def test_broadcast_encodes_once(self):
+        """Test that a broadcast queues one shared frame for every member except the sender."""
+        board = BulletinBoard()
+        clients = {}
+        for name in ['Alice', 'Bob', 'Carol']:
+            client_socket, outbox = MagicMock(), MagicMock()
+            socket_server.client_sessions[client_socket] = {'username': None}
+            socket_server.register_signal_session(client_socket, outbox)
+            socket_server.set_session_username(client_socket, name)
+            board.add_user(name)
+            clients[name] = (client_socket, outbox)
+        self.addCleanup(self.drop_clients, clients)
+
+        socket_server.broadcast_message(clients['Alice'][0], 'POST_SIGNAL', target_board=board, post_summary='hello')
+
+        clients['Alice'][1].put.assert_not_called()
+        bob_payload = clients['Bob'][1].put.call_args.args[0]
+        self.assertEqual(bob_payload, encode_frame('POST_SIGNAL hello'))
+        self.assertIs(clients['Carol'][1].put.call_args.args[0], bob_payload)
+
+    def test_messages_page_is_capped(self):
+        """Test that %messages returns at most MAX_PAGE_SIZE messages and where to continue."""
+        board = BulletinBoard()
+        for index in range(MAX_PAGE_SIZE + 10):
+            board.add_post("Alice", "2024-12-02 16:38:44", f"Subject {index}", "Hello")
+        client_socket = MagicMock()
+        socket_server.client_sessions[client_socket] = {'username': 'Alice'}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+
+        response = socket_server.execute_command(client_socket, '%messages', ['1', '100000'], board, None)
+        lines, next_id = parse_message_page(response)
+        self.assertEqual(len(lines), MAX_PAGE_SIZE)
+        self.assertEqual(next_id, MAX_PAGE_SIZE + 1)
+        self.assertEqual(socket_server.execute_command(client_socket, '%messages', ['x', '5'], board, None),
+                         "Error: %messages requires a starting message ID and a count.")
+
+    def test_listing_revalidation(self):
+        """Test that a listing sent with its current version is answered NOT_MODIFIED until it changes."""
+        board = BulletinBoard()
+        groups = GroupRegistry(["Group Alpha"])
+        client_socket = MagicMock()
+        socket_server.client_sessions[client_socket] = {'username': 'Alice'}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket)
+        board.add_user("Alice")
+
+        self.assertEqual(socket_server.execute_command(client_socket, '%users', [], board, groups), "Alice")
+        version, listing = parse_listing(socket_server.execute_command(client_socket, '%users', ['@'], board, groups))
+        self.assertEqual(listing, "Alice")
+        self.assertEqual(parse_listing(socket_server.execute_command(client_socket, '%users', [f'@{version}'], board, groups)),
+                         (version, None))
+        board.add_user("Bob")
+        new_version, listing = parse_listing(socket_server.execute_command(client_socket, '%users', [f'@{version}'], board, groups))
+        self.assertNotEqual(new_version, version)
+        self.assertEqual(sorted(listing.split("\n")), ["Alice", "Bob"])
+
+        group = groups.get_by_name("Group Alpha")
+        version, _ = parse_listing(socket_server.execute_command(client_socket, '%groups', ['@'], board, groups))
+        group.join_group("Alice", group.group_id)
+        # Joining a group changes its members, not the list of groups
+        self.assertEqual(parse_listing(socket_server.execute_command(client_socket, '%groups', [f'@{version}'], board, groups)),
+                         (version, None))
+        _, listing = parse_listing(socket_server.execute_command(client_socket, '%groupusers', [str(group.group_id), '@'], board, groups))
+        self.assertEqual(listing, "Alice")
+
+    def test_multiplexed_client(self):
+        """Test that a multiplexed connection gets its responses and its signals on the one connection."""
+        board = BulletinBoard()
+        server_side, client_side = socket.socketpair()
+        client_socket = socket_server.register_multiplexed_client(server_side)
+        handler = threading.Thread(target=socket_server.handle_client, args=(client_socket, board, None))
+        handler.start()
+        frames = read_frames(client_side, ChannelFrameDecoder())
+        client_side.sendall(encode_frame("%connect localhost 5000 Alice"))
+        self.assertEqual(next(frames), (RESPONSE_CHANNEL, b"Connected to the bulletin board server at localhost:5000."))
+        board.add_user("Alice")
+        socket_server.broadcast_message(None, 'POST_SIGNAL', target_board=board, post_summary='hello')
+        client_side.sendall(encode_frame("%exit"))
+        self.assertEqual(next(frames), (SIGNAL_CHANNEL, b"POST_SIGNAL hello"))
+        self.assertEqual(next(frames), (RESPONSE_CHANNEL, b"Goodbye!"))
+        handler.join(timeout=2)
+        client_side.close()
+        self.assertNotIn(client_socket, socket_server.signal_sessions)
+
+    def pair(self, token, signal_first):
+        """Pairs a command connection and a signal connection named token, in either order."""
+        client_socket = object()
+        socket_server.client_sessions[client_socket] = {'username': None, 'token': token}
+        self.addCleanup(socket_server.client_sessions.pop, client_socket, None)
+        server_side, client_side = socket.socketpair()
+        self.addCleanup(client_side.close)
+        client_side.sendall(encode_frame(f"SESSION {token}"))
+        handler = threading.Thread(target=socket_server.handle_signal_connection, args=(server_side,), daemon=True)
+        if signal_first:
+            handler.start()
+            deadline = time.monotonic() + 2
+            while token not in socket_server.pending_signals and time.monotonic() < deadline:
+                time.sleep(0.01)
+            socket_server.pair_session(token, client_socket)
+        else:
+            socket_server.pair_session(token, client_socket)
+            handler.start()
+        deadline = time.monotonic() + 2
+        while client_socket not in socket_server.signal_sessions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return client_socket, client_side, handler
+
+    def test_signal_connection_before_session(self):
+        """Test that a signal connection accepted before its %session waits for it and is paired by token."""
+        client_socket, client_side, handler = self.pair('tok-a', signal_first=True)
+        self.assertIn(client_socket, socket_server.signal_sessions)
+        client_side.close()
+        handler.join(timeout=2)
+        self.assertNotIn(client_socket, socket_server.signal_sessions)
+        self.assertEqual((socket_server.sessions_by_token, socket_server.pending_signals), ({}, {}))
+
+    def test_crossed_connections_pair_by_token(self):
+        """Test that two clients whose connections are accepted in crossed order each get their own."""
+        first, first_signal, _ = self.pair('tok-b', signal_first=False)
+        second, second_signal, _ = self.pair('tok-c', signal_first=True)
+        self.addCleanup(socket_server.drop_signal_session, first)
+        self.addCleanup(socket_server.drop_signal_session, second)
+        socket_server.signal_sessions[first].put(encode_frame("POST_SIGNAL first"))
+        socket_server.signal_sessions[second].put(encode_frame("POST_SIGNAL second"))
+        self.assertEqual(next(read_frames(first_signal)), b"POST_SIGNAL first")
+        self.assertEqual(next(read_frames(second_signal)), b"POST_SIGNAL second")
+
+    def test_unpaired_signal_connection_closed(self):
+        """Test that a signal connection without a token, or whose token no session sends, is closed."""
+        for hello in (b"", encode_frame("HELLO")):
+            server_side, client_side = socket.socketpair()
+            client_side.sendall(hello)
+            client_side.shutdown(socket.SHUT_WR)
+            socket_server.handle_signal_connection(server_side)
+            self.assertEqual(client_side.recv(1), b"")
+            client_side.close()
+        server_side, client_side = socket.socketpair()
+        client_side.sendall(encode_frame("SESSION tok-d"))
+        with patch('socket_server.SESSION_PAIR_TIMEOUT', 0.05):
+            socket_server.handle_signal_connection(server_side)
+        self.assertEqual(client_side.recv(1), b"")
+        self.assertEqual(socket_server.pending_signals, {})
+        client_side.close()
+
+    def drop_clients(self, clients):
+        for client_socket, _ in clients.values():
+            socket_server.drop_signal_session(client_socket)
+            del socket_server.client_sessions[client_socket]
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from bulletin_board import BulletinBoard
+from private_board import PrivateBoard
+from welcome_cache import WelcomeCache
+
+class TestWelcomeCache(unittest.TestCase):
+
+    def test_served_from_cache_until_invalidated(self):
+        """Test that the payload is built once per version and returned as the same bytes object."""
+        texts = iter(["first", "second"])
+        cache = WelcomeCache(lambda: next(texts))
+        payload = cache.get()
+        self.assertEqual(payload, b"first")
+        self.assertIs(cache.get(), payload)
+        self.assertEqual(cache.builds, 1)
+        cache.invalidate()
+        self.assertEqual(cache.get(), b"second")
+        self.assertEqual(cache.builds, 2)
+
+    def test_public_board_invalidation(self):
+        """Test that joins, leaves and posts change the public welcome payload, and rejoins don't."""
+        board = BulletinBoard()
+        board.add_user("Alice")
+        payload = board.welcome.get()
+        self.assertEqual(payload, b" Users active on this board: ['Alice']\n"
+                                  b"user2 on 2024-12-02 16:46:45: hello world again\n"
+                                  b"user1 on 2024-12-02 16:38:44: hello world")
+        board.add_user("Alice")
+        self.assertIs(board.welcome.get(), payload)
+        board.add_user("Bob")
+        self.assertIn(b"['Alice', 'Bob']", board.welcome.get())
+        board.add_post("Bob", "2024-12-02 16:50:00", "Subject", "newest")
+        self.assertIn(b"Bob on 2024-12-02 16:50:00: newest", board.welcome.get())
+        board.remove_user("Bob")
+        self.assertIn(b"['Alice']", board.welcome.get())
+
+    def test_private_board_invalidation(self):
+        """Test that group joins, leaves and posts change the group welcome payload."""
+        board = PrivateBoard("Group")
+        board.join_group("Alice", board.group_id)
+        self.assertIn(f" Users active in group {board.group_id}: {{'Alice'}}".encode(), board.welcome.get())
+        payload = board.welcome.get()
+        board.join_group("Alice", board.group_id)
+        self.assertIs(board.welcome.get(), payload)
+        board.post_to_group("Alice", "2024-12-02 16:50:00", "Subject", "newest")
+        self.assertIn(b"Alice on 2024-12-02 16:50:00: newest", board.welcome.get())
+        board.remove_member("Alice")
+        self.assertIn(f"group {board.group_id}: set()".encode(), board.welcome.get())
+
+if __name__ == '__main__':
+    unittest.main()
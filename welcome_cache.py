@@ -0,0 +1,36 @@
+import threading
+
+class WelcomeCache:
+    """
+    Pre-serialized welcome payload for a board (the users list and latest messages sent after %join or
+    %groupjoin). The board bumps the version on every change that affects the payload; the payload is rebuilt
+    by build() on the first request after a change and otherwise served as the same bytes object.
+    """
+    def __init__(self, build):
+        self.build = build  # Returns the payload text for the board's current state
+        self.version = 0  # Bumped by invalidate()
+        self.cached_version = -1  # Version the cached payload was built at
+        self.payload = b""
+        self.builds = 0  # Times the payload was rebuilt
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Marks the cached payload stale after a join, leave or post.
+        """
+        with self.lock:
+            self.version += 1
+
+    def get(self):
+        """
+        Returns the welcome payload as UTF-8 bytes, rebuilding it if the board changed since it was built.
+        """
+        if self.cached_version == self.version:
+            return self.payload
+        with self.lock:
+            # Another joiner may have rebuilt it while this one waited for the lock
+            if self.cached_version != self.version:
+                self.payload = self.build().encode('utf-8')
+                self.cached_version = self.version
+                self.builds += 1
+            return self.payload